@@ -1,5 +1,9 @@
-from math import pow
+from cube import *
 
+# The rows of a truth table are kept as packed cubes (see cube.py) in
+#  self.ones and self.zeros. ttInputs_ones and ttInputs_zeros give the
+#  same rows as lists of "0", "1" and "-" characters for code that still
+#  wants them.
 class TruthTable:
     def __init__(self, names, truthTableRows, blif=None):
         if names is not None and len(names) is 0:
@@ -9,145 +13,96 @@ class TruthTable:
 
         self.blif = blif
 
-        self.ttInputs_ones = []
-        self.ttInputs_zeros = []
+        self.ones = []
+        self.zeros = []
 
         for row in truthTableRows:
             self.addTruthTableLine(row[0], row[1])
 
-        self.ttInputs_ones.sort()
-        self.ttInputs_zeros.sort()
+        self.ones.sort()
+        self.zeros.sort()
+
+    # Makes a truth table straight from lists of packed cubes
+    @staticmethod
+    def fromCubes(names, ones, zeros, blif=None):
+        tt = TruthTable(names, [], blif)
+        tt.ones = sorted(ones)
+        tt.zeros = sorted(zeros)
+        return tt
+
+    def width(self):
+        return len(self.names) - 1
+
+    @property
+    def ttInputs_ones(self):
+        width = self.width()
+        return [cubeToRow(value, mask, width) for value, mask in self.ones]
+
+    @ttInputs_ones.setter
+    def ttInputs_ones(self, rows):
+        self.ones = [rowToCube(row) for row in rows]
+
+    @property
+    def ttInputs_zeros(self):
+        width = self.width()
+        return [cubeToRow(value, mask, width) for value, mask in self.zeros]
+
+    @ttInputs_zeros.setter
+    def ttInputs_zeros(self, rows):
+        self.zeros = [rowToCube(row) for row in rows]
 
     def addTruthTableLine(self, ttInputs, ttOutput):
         assert (len(ttOutput) == 1)
-        if ttOutput is "1":
-            self.ttInputs_ones.append(ttInputs)
-        elif ttOutput is "0":
-            self.ttInputs_zeros.append(ttInputs)
-
-    # Replace don't cares with two equivalent statements.
-    def eliminateDontCares(self):
-        # Define a function we can use on both one and zero outputs
-        def eliminateDCs(rows):
-            currentRows = rows
-            newRows = []
-
-            while True:
-                for row in currentRows:
-                    if "-" in row:
-                        # Replace the don't-care term with two terms.
-                        idx = row.index("-")
-                        c0 = list(row)
-                        c0[idx] = "0"
-                        c1 = list(row)
-                        c1[idx] = "1"
-                        # Eliminate duplicates
-                        if c0 not in newRows:
-                            newRows.append(c0)
-                        if c1 not in newRows:
-                            newRows.append(c1)
-                    else:
-                        # Term has no don't-cares
-                        if row not in newRows:
-                            newRows.append(row)
-
-                if currentRows == newRows:
-                    break
-                else:
-                    currentRows = newRows
-                    newRows = []
-                    continue
-
-            return newRows
-
-        self.ttInputs_ones = eliminateDCs(self.ttInputs_ones)
-        self.ttInputs_zeros = eliminateDCs(self.ttInputs_zeros)
-
-        self.ttInputs_ones.sort()
-        self.ttInputs_zeros.sort()
+        if ttOutput == "1":
+            self.ones.append(rowToCube(ttInputs))
+        elif ttOutput == "0":
+            self.zeros.append(rowToCube(ttInputs))
 
     # Some truth tables output to other truth tables which rely on "0"
     #  outputs. We need our truth tables to cover those.
-    # This method will fill in the "0" outputs
+    # This method will fill in the "0" outputs with a cover of the
+    #  complement of the "1" rows, or the other way around for a table
+    #  that only lists its "0" rows.
     def exhaustOutputs(self):
-        if len(self.ttInputs_ones) is 0:
+        if len(self.ones) == 0 and len(self.zeros) > 0:
+            self.ones = complementCubes(self.zeros)
+        else:
+            self.zeros = complementCubes(self.ones)
+
+        self.ones.sort()
+        self.zeros.sort()
+
+    # Collapses the table into a function of the BLIF's primary inputs by
+    #  substituting every internal signal with its own collapsed cover.
+    # collapsed is shared between calls (see collapseSignal) so a node
+    #  that is reached through several paths is only collapsed once.
+    # Every table in the BLIF needs its "0" rows (see exhaustOutputs).
+    def mergeChildren(self, collapsed=None):
+        if self.blif is None:
+            raise Exception("blif cannot be None to call mergeChildren.")
+
+        inputNames = self.blif.inputNames
+        primary = set(inputNames)
+        if all(name in primary for name in self.getInputNames()):
+            # Nothing to merge
             return
 
-        width = len(self.ttInputs_ones[0])
-        size = int( pow(2, len(self.ttInputs_ones[0])) )
-        for x in range(0, size):
-            binList = list( bin(x)[2:].zfill(width) )
-            if binList not in self.ttInputs_ones:
-                self.addTruthTableLine(binList, "0")
+        if collapsed is None:
+            collapsed = {}
+        ones, zeros = collapseSignal(self.blif, self.getOutputName(), collapsed)
 
-    def mergeChildren(self):
-        if self.blif is None:
-            raise Exception("blif cannot be None to call mergeChildren.")
+        # Only keep the inputs the collapsed covers actually use, in the
+        #  same order as the BLIF's inputs
+        support = 0
+        for v, m in ones:
+            support |= m
+        for v, m in zeros:
+            support |= m
+        bits = [i for i in range(0, len(inputNames)) if support >> i & 1]
 
-        # Find child truth tables that can be merged
-        for name in self.getInputNames():
-            if name not in self.blif.inputNames:
-                # The name isn't a top level input so it can be merged
-                # Tell the truth table to merge its children before we merge it
-                child = self.blif.ttLookup[name]
-                child.mergeChildren()
-                # Get the index of the child tt in our names
-                # (Index will be the same for the input values list)
-                nameIndex = self.names.index(name)
-                # Remove the name (guaranteed to be unique because BLIF)
-                self.names.remove(name)
-                # Insert the child truth table to the name list
-                # Fancy syntax will merge list inside another list
-                self.names[nameIndex:nameIndex] = child.getInputNames()
-                # Merge the truth table values
-                # The new row will most likely become multiple new rows
-                newttInputs_ones = []
-                for parentRow in self.ttInputs_ones:
-                    if parentRow[nameIndex] is "1":
-                        for childRow in child.ttInputs_ones:
-                            # Copy the parent row
-                            copiedRow = list(parentRow)
-                            # Delete the old, single value
-                            del copiedRow[nameIndex]
-                            # Insert the multiple values
-                            copiedRow[nameIndex:nameIndex] = childRow
-                            newttInputs_ones.append(copiedRow)
-                    elif parentRow[nameIndex] is "0":
-                        for childRow in child.ttInputs_zeros:
-                            # Copy the parent row
-                            copiedRow = list(parentRow)
-                            # Delete the old, single value
-                            del copiedRow[nameIndex]
-                            # Insert the multiple values
-                            copiedRow[nameIndex:nameIndex] = childRow
-                            newttInputs_ones.append(copiedRow)
-                self.ttInputs_ones = newttInputs_ones
-
-                newttInputs_zeros = []
-                for parentRow in self.ttInputs_zeros:
-                    if parentRow[nameIndex] is "1":
-                        for childRow in child.ttInputs_ones:
-                            # Copy the parent row
-                            copiedRow = list(parentRow)
-                            # Delete the old, single value
-                            del copiedRow[nameIndex]
-                            # Insert the multiple values
-                            copiedRow[nameIndex:nameIndex] = childRow
-                            newttInputs_zeros.append(copiedRow)
-                    elif parentRow[nameIndex] is "0":
-                        for childRow in child.ttInputs_zeros:
-                            # Copy the parent row
-                            copiedRow = list(parentRow)
-                            # Delete the old, single value
-                            del copiedRow[nameIndex]
-                            # Insert the multiple values
-                            copiedRow[nameIndex:nameIndex] = childRow
-                            newttInputs_zeros.append(copiedRow)
-
-                self.ttInputs_zeros = newttInputs_zeros
-
-                self.ttInputs_ones.sort()
-                self.ttInputs_zeros.sort()
+        self.names = [inputNames[i] for i in bits] + [self.getOutputName()]
+        self.ones = sorted(gatherBits(ones, bits))
+        self.zeros = sorted(gatherBits(zeros, bits))
 
     def getInputNames(self):
         return self.names[0:len(self.names)-1]
@@ -156,7 +111,7 @@ class TruthTable:
         return self.names[len(self.names)-1]
 
     def __str__(self):
-        return "TruthTable {} names and {} table lines.".format(len(self.names), len(self.ttInputs_zeros) + len(self.ttInputs_ones))
+        return "TruthTable {} names and {} table lines.".format(len(self.names), len(self.zeros) + len(self.ones))
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -164,17 +119,13 @@ class TruthTable:
     def __eq__(self, other):
         if len(self.names) != len(other.names):
             return False
-        if len(self.ttInputs_ones) != len(other.ttInputs_ones):
+        if len(self.ones) != len(other.ones):
             return False
-        #if len(self.ttInputs_zeros) != len(other.ttInputs_zeros):
+        #if len(self.zeros) != len(other.zeros):
         #    return False
 
-        self.ttInputs_ones.sort()
-        other.ttInputs_ones.sort()
-
-        for i, row in enumerate(self.ttInputs_ones):
-            if str(row) != str(other.ttInputs_ones[i]):
-                return False
+        if sorted(self.ones) != sorted(other.ones):
+            return False
 
         for i, name in enumerate(self.names):
             if name != other.names[i]:
@@ -191,13 +142,68 @@ class TruthTable:
             if name != last:
                 lines.append(" ")
         lines.append("\n")
-        for row in self.ttInputs_ones:
-            lines.append("".join(row))
-            lines.append(" ")
+        width = self.width()
+        # A constant has no input plane, so its rows are just the output
+        separator = " " if width > 0 else ""
+        for value, mask in self.ones:
+            lines.append(cubeToString(value, mask, width))
+            lines.append(separator)
             lines.append("1\n")
         if includeZeroOutputs:
-            for row in self.ttInputs_zeros:
-                lines.append("".join(row))
-                lines.append(" ")
+            for value, mask in self.zeros:
+                lines.append(cubeToString(value, mask, width))
+                lines.append(separator)
                 lines.append("0\n")
-        return "".join(lines)
\ No newline at end of file
+        return "".join(lines)
+
+# Returns the (ones, zeros) covers of a signal as functions of the BLIF's
+#  primary inputs, where bit i of a cube is blif.inputNames[i].
+# Each table is collapsed by substituting the collapsed covers of its
+#  inputs into its own rows (see composeCover). Results are kept in
+#  collapsed, keyed by signal name.
+def collapseSignal(blif, name, collapsed):
+    if len(collapsed) == 0:
+        for i, inputName in enumerate(blif.inputNames):
+            collapsed[inputName] = ([(1 << i, 1 << i)], [(0, 1 << i)])
+
+    # Depth first without recursion so deep networks are fine
+    expanded = set()
+    stack = [name]
+    while len(stack) > 0:
+        signal = stack[-1]
+        if signal in collapsed:
+            stack.pop()
+            continue
+
+        tt = blif.ttLookup.get(signal)
+        if tt is None:
+            raise Exception("Signal {} is never driven.".format(signal))
+
+        missing = [n for n in tt.getInputNames() if n not in collapsed]
+        if len(missing) > 0:
+            if signal in expanded:
+                raise Exception("Combinational loop through {}.".format(signal))
+            expanded.add(signal)
+            stack.extend(missing)
+            continue
+
+        inputs = [collapsed[n] for n in tt.getInputNames()]
+        collapsed[signal] = (composeCover(tt.ones, inputs), composeCover(tt.zeros, inputs))
+        stack.pop()
+
+    return collapsed[name]
+
+# Moves the given bits of each cube down to positions 0, 1, ... with
+#  bits[0] ending up as the left most column
+def gatherBits(cubes, bits):
+    top = len(bits) - 1
+    result = []
+    for v, m in cubes:
+        value = 0
+        mask = 0
+        for k, i in enumerate(bits):
+            if m >> i & 1:
+                mask |= 1 << (top - k)
+                value |= (v >> i & 1) << (top - k)
+        result.append((value, mask))
+    return result
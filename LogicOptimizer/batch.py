@@ -0,0 +1,229 @@
+from argparse import *
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pipeline import *
+
+# Optimizes many BLIFs in one run, so starting Python, importing
+#  everything and starting the -j worker processes are only paid for
+#  once. Each worker takes whole files, the biggest first, and keeps a
+#  MemoryCache (see cache.py) for as long as it runs, so a table that
+#  turns up again in a later file it gets is read from the cache.
+#  --cache-dir puts a ResultCache on disk behind those, which the workers
+#  share with each other and with other runs.
+#
+#   python batch.py ../designs/*.blif -o ../optimized
+#   python batch.py ../designs -o ../optimized -j 4 -v
+#
+# Inputs can be files, directories (every .blif in them) or glob
+#  patterns, which is handy when the shell would expand one into too
+#  many arguments. A file that fails is reported and the rest carry on.
+#  Each optimized BLIF is written to the output directory under its own
+#  name as soon as it's done, and summary.json there has the status,
+#  time and row and byte counts of every file.
+
+# The cache of the worker process this is running in
+workerCache = None
+
+def startWorker(cacheEntries, cacheDir, cacheBytes):
+    global workerCache
+    backing = None
+    if cacheDir is not None:
+        backing = ResultCache(cacheDir, maxBytes=cacheBytes)
+    workerCache = MemoryCache(cacheEntries, backing=backing)
+
+# Expands the inputs into a list of files, without repeats
+def findInputFiles(inputs):
+    paths = []
+    seen = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            found = glob.glob(os.path.join(pattern, "*.blif"))
+        elif os.path.isfile(pattern):
+            found = [pattern]
+        else:
+            found = glob.glob(pattern)
+            if len(found) == 0:
+                raise Exception("{} is not a file or directory and matches no files.".format(pattern))
+        for path in sorted(found):
+            if os.path.isfile(path) and os.path.abspath(path) not in seen:
+                seen.add(os.path.abspath(path))
+                paths.append(path)
+    return paths
+
+# Where each file's optimized BLIF goes. Files from different directories
+#  with the same name would overwrite each other, so that's an error.
+def outputPaths(paths, outputDirectory):
+    outputs = {}
+    for path in paths:
+        output = os.path.join(outputDirectory, os.path.basename(path))
+        if output in outputs.values():
+            clash = [p for p in outputs if outputs[p] == output][0]
+            raise Exception("{} and {} would both be written to {}.".format(clash, path, output))
+        outputs[path] = output
+    return outputs
+
+# Runs in a worker process (or this one, without -j). Optimizes one file
+#  and returns its result. options are passed on to optimizeFile.
+def optimizeOne(path, output, options):
+    result = {"file": path, "output": output, "bytesBefore": os.path.getsize(path)}
+    started = time.perf_counter()
+    hits, misses = workerCache.hits, workerCache.misses
+    try:
+        outcome = optimizeFile(path, output, cache=workerCache, **options)
+        result["status"] = "pass"
+        result["cutShort"] = outcome["cutShort"]
+        result["rowsBefore"] = outcome["rowsBefore"]
+        result["rowsAfter"] = outcome["rowsAfter"]
+        result["bytesAfter"] = os.path.getsize(output)
+        if "counterexample" in outcome and outcome["counterexample"] is not None:
+            result["status"] = "fail"
+            result["message"] = "Output {} differs.".format(outcome["counterexample"]["output"])
+    except MemoryError:
+        result["status"] = "memory"
+        result["message"] = "Ran out of memory."
+    except Exception as e:
+        result["status"] = "error"
+        result["message"] = "".join(traceback.format_exception_only(type(e), e)).strip()
+    result["seconds"] = time.perf_counter() - started
+    result["cacheHits"] = workerCache.hits - hits
+    result["cacheMisses"] = workerCache.misses - misses
+
+    # Don't leave half a BLIF behind for a file that failed
+    if result["status"] in ("error", "memory") and os.path.exists(output):
+        os.remove(output)
+    return result
+
+# Optimizes the files, biggest first, on a pool of jobs worker processes
+#  (see startWorker for the cache arguments). options are passed on to
+#  optimizeFile.
+# Returns the result of every file, in the order they finished.
+def runBatch(paths, outputDirectory, jobs=1, cacheEntries=DEFAULT_MEMORY_CACHE_ENTRIES, cacheDir=None,
+             cacheBytes=DEFAULT_CACHE_BYTES, options=None, verbose=True):
+    outputs = outputPaths(paths, outputDirectory)
+    order = sorted(paths, key=lambda path: -os.path.getsize(path))
+    options = options or {}
+    results = []
+
+    def finish(result):
+        results.append(result)
+        if verbose:
+            print(formatResult(result))
+            sys.stdout.flush()
+
+    if jobs <= 1:
+        startWorker(cacheEntries, cacheDir, cacheBytes)
+        for path in order:
+            finish(optimizeOne(path, outputs[path], options))
+        return results
+
+    def newPool():
+        return ProcessPoolExecutor(max_workers=jobs, initializer=startWorker,
+                                   initargs=(cacheEntries, cacheDir, cacheBytes))
+
+    pool = newPool()
+    try:
+        # The pool hands the files out in the order they were submitted
+        futures = dict((pool.submit(optimizeOne, path, outputs[path], options), path) for path in order)
+        broken = []
+        for future in as_completed(futures):
+            try:
+                finish(future.result())
+            except BrokenProcessPool:
+                broken.append(futures[future])
+
+        # A worker died (out of memory, say) and took every file that hadn't
+        #  finished with it. Run those again one at a time, so only the file
+        #  that kills its worker is reported as crashed.
+        poolBroken = len(broken) > 0
+        for path in sorted(broken, key=lambda path: -os.path.getsize(path)):
+            if poolBroken:
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = newPool()
+                poolBroken = False
+            started = time.perf_counter()
+            try:
+                finish(pool.submit(optimizeOne, path, outputs[path], options).result())
+                continue
+            except BrokenProcessPool:
+                poolBroken = True
+            if os.path.exists(outputs[path]):
+                os.remove(outputs[path])
+            finish({"file": path, "output": outputs[path], "bytesBefore": os.path.getsize(path), "status": "crashed",
+                    "seconds": time.perf_counter() - started, "message": "The worker process died."})
+    finally:
+        pool.shutdown(cancel_futures=True)
+    return results
+
+def formatResult(result):
+    if "rowsAfter" in result:
+        return "{}: {} in {:.2f}s, {} -> {} rows, {} -> {} bytes{}".format(
+            result["file"], result["status"], result["seconds"], result["rowsBefore"], result["rowsAfter"],
+            result["bytesBefore"], result["bytesAfter"], " ({})".format(result["message"]) if "message" in result else "")
+    return "{}: {} in {:.2f}s ({})".format(result["file"], result["status"], result["seconds"], result["message"])
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Optimize many BLIFs in one run, with one pool of worker processes for all of them.")
+    parser.add_argument("inputs", help="BLIFs to optimize: files, directories (every .blif in them) or glob patterns.", nargs="+")
+    parser.add_argument("-o", dest="outputDirectory", help="Where the optimized BLIFs and the summary go.", default="./optimized")
+    parser.add_argument("-v", dest="verifyBLIF", help="Verify each optimized BLIF against its original.", action='store_const', default=False, const=True)
+    parser.add_argument("-j", dest="jobs", help="Number of files to optimize at once, each in one of a pool of worker processes.", type=int, default=1)
+    parser.add_argument("--summary", dest="summaryFile", help="Where to write the summary (JSON). Defaults to summary.json in the output directory.", default=None)
+    parser.add_argument("--verify-engine", dest="verifyEngine", help="How -v checks the results: sim, bdd or sat (see main.py).", choices=["sim", "bdd", "sat"], default="sim")
+    parser.add_argument("--engine", dest="engine", help="Minimization engine (see main.py).", choices=["qm", "espresso", "cofactor"], default="qm")
+    parser.add_argument("--npn-max-inputs", dest="npnMaxInputs", help="See main.py.", type=int, default=NPN_MAX_INPUTS)
+    parser.add_argument("--multi-output", dest="multiOutput", help="See main.py.", action='store_const', default=False, const=True)
+    parser.add_argument("--cache-entries", dest="cacheEntries", help="Covers each worker keeps in memory for the files it gets after.", type=int, default=DEFAULT_MEMORY_CACHE_ENTRIES)
+    parser.add_argument("--cache-dir", dest="cacheDir", help="Directory of a result cache on disk, shared by the workers and other runs, behind the ones in memory.", default=None)
+    parser.add_argument("--cache-size", dest="cacheSize", help="Megabytes the result cache on disk may use.", type=float, default=DEFAULT_CACHE_BYTES / (1024 * 1024))
+    parser.add_argument("--time-limit", dest="timeLimit", help="Seconds each table may take (see main.py).", type=float, default=None)
+    parser.add_argument("--run-time-limit", dest="runTimeLimit", help="Seconds each file may take (see main.py).", type=float, default=None)
+    parser.add_argument("--mem-limit", dest="memLimit", help="Megabytes of memory optimizing a table may add to its worker (see main.py).", type=float, default=None)
+    parser.add_argument("--cover-time", dest="coverTimeLimit", help="Seconds to spend searching for a minimum cover before settling for the best found.", type=float, default=10.0)
+    args = parser.parse_args()
+
+    paths = findInputFiles(args.inputs)
+    if not os.path.isdir(args.outputDirectory):
+        os.makedirs(args.outputDirectory)
+    summaryFile = args.summaryFile
+    if summaryFile is None:
+        summaryFile = os.path.join(args.outputDirectory, "summary.json")
+
+    options = {"verifyEngine": args.verifyEngine if args.verifyBLIF else None, "engine": args.engine,
+               "coverTimeLimit": args.coverTimeLimit, "npnMaxInputs": args.npnMaxInputs,
+               "multiOutput": args.multiOutput, "timeLimit": args.timeLimit, "runTimeLimit": args.runTimeLimit,
+               "memLimit": None if args.memLimit is None else int(args.memLimit * 1024 * 1024)}
+
+    started = time.perf_counter()
+    files = runBatch(paths, args.outputDirectory, jobs=args.jobs, cacheEntries=args.cacheEntries, cacheDir=args.cacheDir,
+                     cacheBytes=int(args.cacheSize * 1024 * 1024), options=options)
+
+    counts = {}
+    for result in files:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    finished = [result for result in files if "rowsAfter" in result]
+    totals = {}
+    for name in ("rowsBefore", "rowsAfter", "bytesBefore", "bytesAfter"):
+        totals[name] = sum(result[name] for result in finished)
+    summary = {"files": files, "counts": counts, "totals": totals, "seconds": time.perf_counter() - started,
+               "cache": {"hits": sum(result.get("cacheHits", 0) for result in files),
+                         "misses": sum(result.get("cacheMisses", 0) for result in files)}}
+
+    with open(summaryFile, "w") as f:
+        json.dump(summary, f, indent=2, sort_keys=True)
+
+    print("")
+    print("{} files in {:.2f}s: {}".format(len(files), summary["seconds"],
+                                           ", ".join("{} {}".format(counts[status], status) for status in sorted(counts))))
+    if len(finished) > 0:
+        print("{} -> {} rows, {} -> {} bytes over the {} files that finished.".format(
+            totals["rowsBefore"], totals["rowsAfter"], totals["bytesBefore"], totals["bytesAfter"], len(finished)))
+    print("Caches: {} hits, {} misses.".format(summary["cache"]["hits"], summary["cache"]["misses"]))
+    print("Summary written to {}.".format(summaryFile))
+
+    sys.exit(1 if any(result["status"] != "pass" for result in files) else 0)
@@ -0,0 +1,387 @@
+from cube import *
+
+# Number of slots in the ITE computed table. The table is direct mapped,
+#  so a new result simply replaces whatever was in its slot.
+DEFAULT_CACHE_SIZE = 1 << 18
+
+# Reduced ordered binary decision diagrams.
+#
+# Nodes are ints that index into the var/low/high lists. Node 0 is the
+#  constant 0 and node 1 is the constant 1. Every node is made through
+#  mk(), which looks it up in the unique table first, so two nodes are
+#  the same function exactly when they are the same int.
+class BDD:
+    FALSE = 0
+    TRUE = 1
+
+    def __init__(self, cacheSize=DEFAULT_CACHE_SIZE):
+        # Terminals have no variable
+        self.var = [-1, -1]
+        self.low = [0, 1]
+        self.high = [0, 1]
+        # Number of parents (and roots while sifting) that use each node
+        self.refs = [1, 1]
+
+        self.unique = {}
+        # Live nodes for each variable, used when swapping levels
+        self.varNodes = []
+        # The variable order. Level 0 is the top of the diagram.
+        self.var2level = []
+        self.level2var = []
+
+        self.cacheSize = cacheSize
+        self.cache = [None] * cacheSize
+
+    def varCount(self):
+        return len(self.var2level)
+
+    # Adds a new variable below all the existing ones and returns its index
+    def addVar(self):
+        v = len(self.var2level)
+        self.var2level.append(v)
+        self.level2var.append(v)
+        self.varNodes.append(set())
+        return v
+
+    def level(self, n):
+        if n <= 1:
+            return len(self.level2var)
+        return self.var2level[self.var[n]]
+
+    def mk(self, v, low, high):
+        if low == high:
+            return low
+
+        key = (v, low, high)
+        n = self.unique.get(key)
+        if n is not None:
+            return n
+
+        n = len(self.var)
+        self.var.append(v)
+        self.low.append(low)
+        self.high.append(high)
+        self.refs.append(0)
+        self.refs[low] += 1
+        self.refs[high] += 1
+        self.unique[key] = n
+        self.varNodes[v].add(n)
+        return n
+
+    # The node for a single variable (or its complement)
+    def literal(self, v, positive=True):
+        if positive:
+            return self.mk(v, self.FALSE, self.TRUE)
+        return self.mk(v, self.TRUE, self.FALSE)
+
+    # If-then-else: f ? g : h. Every other operation is built from this.
+    def ite(self, f, g, h):
+        if f == self.TRUE:
+            return g
+        if f == self.FALSE:
+            return h
+        if g == h:
+            return g
+        if g == self.TRUE and h == self.FALSE:
+            return f
+
+        key = (f, g, h)
+        slot = hash(key) % self.cacheSize
+        entry = self.cache[slot]
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        top = min(self.level(f), self.level(g), self.level(h))
+        v = self.level2var[top]
+        f0, f1 = self.cofactors(f, top)
+        g0, g1 = self.cofactors(g, top)
+        h0, h1 = self.cofactors(h, top)
+
+        result = self.mk(v, self.ite(f0, g0, h0), self.ite(f1, g1, h1))
+        self.cache[slot] = (key, result)
+        return result
+
+    def cofactors(self, n, top):
+        if self.level(n) == top:
+            return self.low[n], self.high[n]
+        return n, n
+
+    def AND(self, f, g):
+        return self.ite(f, g, self.FALSE)
+
+    def OR(self, f, g):
+        return self.ite(f, self.TRUE, g)
+
+    def NOT(self, f):
+        return self.ite(f, self.FALSE, self.TRUE)
+
+    def XOR(self, f, g):
+        return self.ite(f, self.NOT(g), g)
+
+    # Builds the OR of the given cubes, where inputs holds the node for
+    #  each column (inputs[0] is the highest bit of a cube).
+    def fromCubes(self, cubes, inputs):
+        top = len(inputs) - 1
+        result = self.FALSE
+        for value, mask in cubes:
+            # AND the literals from the bottom of the order up, so each
+            #  step only puts one node on top
+            literals = [(self.level(inputs[top - bit]), top - bit, value >> bit & 1) for bit in iterBits(mask)]
+            literals.sort(reverse=True)
+            term = self.TRUE
+            for level, i, positive in literals:
+                if positive:
+                    term = self.AND(inputs[i], term)
+                else:
+                    term = self.AND(self.NOT(inputs[i]), term)
+            result = self.OR(result, term)
+        return result
+
+    # A table with only "0" rows lists its OFF-set, same as simulate.py
+    def fromTruthTable(self, tt, inputs):
+        if len(tt.ones) > 0 or len(tt.zeros) == 0:
+            return self.fromCubes(tt.ones, inputs)
+        return self.NOT(self.fromCubes(tt.zeros, inputs))
+
+    # Builds a node for every output of a (multi-level) BLIF network.
+    # inputVars maps input names to variables; any input that isn't in it
+    #  gets a new variable (and is added to it). Returns a dict of
+    #  output name -> node.
+    def fromBLIF(self, blif, inputVars=None):
+        if inputVars is None:
+            inputVars = {}
+        for name in blif.inputNames:
+            if name not in inputVars:
+                inputVars[name] = self.addVar()
+
+        values = {}
+        for name, v in inputVars.items():
+            values[name] = self.literal(v)
+
+        expanded = set()
+        for output in blif.outputNames:
+            stack = [output]
+            while len(stack) > 0:
+                name = stack[-1]
+                if name in values:
+                    stack.pop()
+                    continue
+
+                tt = blif.ttLookup.get(name)
+                if tt is None:
+                    raise Exception("Signal {} is never driven.".format(name))
+
+                missing = [n for n in tt.getInputNames() if n not in values]
+                if len(missing) > 0:
+                    if name in expanded:
+                        raise Exception("Combinational loop through {}.".format(name))
+                    expanded.add(name)
+                    stack.extend(missing)
+                    continue
+
+                values[name] = self.fromTruthTable(tt, [values[n] for n in tt.getInputNames()])
+                stack.pop()
+
+        outputs = {}
+        for output in blif.outputNames:
+            outputs[output] = values[output]
+        return outputs
+
+    # Returns a dict of variable -> 0/1 that makes f true, or None if f is
+    #  the constant 0. Variables that don't matter are left out.
+    def satisfyingAssignment(self, f):
+        if f == self.FALSE:
+            return None
+        assignment = {}
+        while f != self.TRUE:
+            if self.high[f] != self.FALSE:
+                assignment[self.var[f]] = 1
+                f = self.high[f]
+            else:
+                assignment[self.var[f]] = 0
+                f = self.low[f]
+        return assignment
+
+    # Number of distinct nodes (not counting terminals) under the roots
+    def size(self, roots):
+        seen = set()
+        stack = [r for r in roots if r > 1]
+        while len(stack) > 0:
+            n = stack.pop()
+            if n in seen:
+                continue
+            seen.add(n)
+            for child in (self.low[n], self.high[n]):
+                if child > 1:
+                    stack.append(child)
+        return len(seen)
+
+    # Forgets every node that can't be reached from roots and recounts
+    #  the references of the rest. Nodes that were forgotten must not be
+    #  used again.
+    def collectGarbage(self, roots):
+        live = set()
+        stack = [r for r in roots if r > 1]
+        while len(stack) > 0:
+            n = stack.pop()
+            if n in live:
+                continue
+            live.add(n)
+            for child in (self.low[n], self.high[n]):
+                if child > 1:
+                    stack.append(child)
+
+        for nodes in self.varNodes:
+            for n in nodes - live:
+                del self.unique[(self.var[n], self.low[n], self.high[n])]
+            nodes &= live
+
+        for n in range(2, len(self.refs)):
+            self.refs[n] = 0
+        for n in live:
+            self.refs[self.low[n]] += 1
+            self.refs[self.high[n]] += 1
+        for r in roots:
+            self.refs[r] += 1
+
+        self.cache = [None] * self.cacheSize
+
+    def liveNodeCount(self):
+        return sum(len(nodes) for nodes in self.varNodes)
+
+    def deref(self, n):
+        stack = [n]
+        while len(stack) > 0:
+            n = stack.pop()
+            self.refs[n] -= 1
+            if n > 1 and self.refs[n] == 0:
+                del self.unique[(self.var[n], self.low[n], self.high[n])]
+                self.varNodes[self.var[n]].discard(n)
+                stack.append(self.low[n])
+                stack.append(self.high[n])
+
+    # Swaps the variables at level and level + 1 in place. Nodes keep
+    #  their ids and still compute the same functions.
+    def swapLevels(self, level):
+        x = self.level2var[level]
+        y = self.level2var[level + 1]
+
+        for f in list(self.varNodes[x]):
+            f0 = self.low[f]
+            f1 = self.high[f]
+            f0y = self.var[f0] == y
+            f1y = self.var[f1] == y
+            if not f0y and not f1y:
+                # Doesn't depend on y, so it just moves down a level
+                continue
+
+            f00, f01 = (self.low[f0], self.high[f0]) if f0y else (f0, f0)
+            f10, f11 = (self.low[f1], self.high[f1]) if f1y else (f1, f1)
+
+            # f = y ? (x ? f11 : f01) : (x ? f10 : f00)
+            newLow = self.mk(x, f00, f10)
+            newHigh = self.mk(x, f01, f11)
+            self.refs[newLow] += 1
+            self.refs[newHigh] += 1
+
+            del self.unique[(x, f0, f1)]
+            self.varNodes[x].discard(f)
+            self.var[f] = y
+            self.low[f] = newLow
+            self.high[f] = newHigh
+            self.unique[(y, newLow, newHigh)] = f
+            self.varNodes[y].add(f)
+
+            self.deref(f0)
+            self.deref(f1)
+
+        self.level2var[level] = y
+        self.level2var[level + 1] = x
+        self.var2level[x] = level + 1
+        self.var2level[y] = level
+
+    # Rudell's sifting: move each variable through every level and leave
+    #  it where the diagram was smallest. Only the nodes in roots (and
+    #  what they point to) are kept; other nodes must not be used after.
+    def sift(self, roots):
+        self.collectGarbage(roots)
+        count = len(self.level2var)
+
+        order = sorted(range(0, count), key=lambda v: -len(self.varNodes[v]))
+        for v in order:
+            level = self.var2level[v]
+            bestSize = self.liveNodeCount()
+            bestLevel = level
+
+            # Go to the closer end first
+            if level < count - 1 - level:
+                directions = [-1, 1]
+            else:
+                directions = [1, -1]
+
+            for direction in directions:
+                while 0 <= level + direction < count:
+                    if direction > 0:
+                        self.swapLevels(level)
+                    else:
+                        self.swapLevels(level - 1)
+                    level += direction
+                    size = self.liveNodeCount()
+                    if size < bestSize:
+                        bestSize = size
+                        bestLevel = level
+
+            while level < bestLevel:
+                self.swapLevels(level)
+                level += 1
+            while level > bestLevel:
+                self.swapLevels(level - 1)
+                level -= 1
+
+        self.cache = [None] * self.cacheSize
+
+# Builds both networks in one BDD manager and compares each output by
+#  node identity. Returns None if they are equivalent, otherwise a
+#  counterexample in the same form as simulate.findCounterexample.
+def bddCounterexample(original, optimized, reorder=False, cacheSize=DEFAULT_CACHE_SIZE):
+    if sorted(original.outputNames) != sorted(optimized.outputNames):
+        raise Exception("The BLIFs have different outputs.")
+
+    manager = BDD(cacheSize=cacheSize)
+    inputVars = {}
+    originalOutputs = manager.fromBLIF(original, inputVars)
+    if reorder:
+        roots = list(originalOutputs.values())
+        manager.sift(roots)
+    optimizedOutputs = manager.fromBLIF(optimized, inputVars)
+
+    for output in original.outputNames:
+        a = originalOutputs[output]
+        b = optimizedOutputs[output]
+        if a == b:
+            continue
+
+        assignment = manager.satisfyingAssignment(manager.XOR(a, b))
+        inputs = {}
+        for name in original.inputNames:
+            inputs[name] = assignment.get(inputVars[name], 0)
+        return {
+            "output": output,
+            "inputs": inputs,
+            "original": evaluate(manager, a, inputs, inputVars),
+            "optimized": evaluate(manager, b, inputs, inputVars),
+        }
+
+    return None
+
+# Follows a node down to a terminal for the given input values
+def evaluate(manager, f, inputs, inputVars):
+    values = {}
+    for name, v in inputVars.items():
+        values[v] = inputs.get(name, 0)
+    while f > 1:
+        if values[manager.var[f]]:
+            f = manager.high[f]
+        else:
+            f = manager.low[f]
+    return f
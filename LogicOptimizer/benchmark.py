@@ -0,0 +1,253 @@
+from argparse import *
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from blif import *
+from optimize import *
+from generate import *
+from stats import *
+
+# Times each phase of optimizing generated functions, and compares the
+#  times against a stored baseline:
+#
+#   python benchmark.py -o results.json
+#   python benchmark.py -o new.json --baseline results.json
+#   python benchmark.py -o benchmarkBaseline.json --no-baseline
+#
+# The phases are read_blif, mergeAllIntoTopLevel, qmColumns (finding the
+#  prime implicants), cover and write_blif, with every table minimized by
+#  quineMcCluskey.
+#
+# benchmarkBaseline.json, next to this file, is the baseline of the full
+#  suite, and every run is compared against it unless --baseline names
+#  another file. Times depend on the machine, so record a new one (the
+#  last example) on the machine that does the checking.
+
+RESULTS_VERSION = 1
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarkBaseline.json")
+
+PHASES = ["read_blif", "mergeAllIntoTopLevel", "qmColumns", "cover", "write_blif"]
+
+# (family, width, density) of every case. The widths go up in steps so
+#  the results show how each family scales.
+SUITE = [
+    ("random", 8, 0.3),
+    ("random", 12, 0.3),
+    ("random", 14, 0.3),
+    ("symmetric", 8, 0.5),
+    ("symmetric", 10, 0.5),
+    ("symmetric", 16, 0.2),
+    ("threshold", 8, 0.5),
+    ("threshold", 12, 0.3),
+    ("threshold", 16, 0.3),
+    ("parity", 8, None),
+    ("parity", 12, None),
+    ("parity", 16, None),
+    ("adder", 8, None),
+    ("adder", 12, None),
+    ("adder", 14, None),
+    ("mux", 3, None),
+    ("mux", 6, None),
+    ("mux", 11, None),
+]
+
+# A phase only counts as slower (or bigger) if it changed by more than
+#  the threshold and by more than this much, so tiny phases don't fail
+#  on noise
+MIN_SECONDS_CHANGE = 0.02
+MIN_BYTES_CHANGE = 64 * 1024
+
+def caseName(family, width, density):
+    if density is None:
+        return "{}-{}".format(family, width)
+    return "{}-{}-{}".format(family, width, density)
+
+# Stats that also record, while tracemalloc is tracing, the most memory
+#  each phase allocated on top of what was live when it started. The
+#  phases are timed by the optimizer's own code (see stats.py), so this
+#  measures what a real run does.
+class PhaseStats(Stats):
+    def __init__(self):
+        Stats.__init__(self)
+        self.peakBytes = {}
+
+    def start(self):
+        current = None
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+        return Stats.start(self) + (current,)
+
+    def stop(self, name, started):
+        Stats.stop(self, name, started[:2])
+        if started[2] is not None:
+            peak = tracemalloc.get_traced_memory()[1] - started[2]
+            self.peakBytes[name] = max(self.peakBytes.get(name, 0), peak)
+
+# Runs every phase once on a generated BLIF, with each table minimized by
+#  quineMcCluskey. Returns the PhaseStats and the sizes of what was
+#  optimized.
+def runPhases(path, outPath, coverTimeLimit):
+    stats = PhaseStats()
+    blif = read_blif(path, createTopLevelMerged=False, stats=stats)
+    mergeAllIntoTopLevel(blif, stats=stats)
+    for key, tt in list(blif.ttLookup.items()):
+        rows = quineMcCluskey(tt, coverTimeLimit=coverTimeLimit, stats=stats)
+        blif.ttLookup[key] = TruthTable(tt.names, rows, blif=blif)
+    with timedPhase(stats, "write_blif"):
+        with open(outPath, "w") as f:
+            write_blif(blif, f)
+
+    sizes = {
+        "tables": len(blif.ttLookup),
+        "terms": stats.counters.get("terms", 0),
+        "primes": stats.counters.get("primes", 0),
+        "cover": sum(len(tt.ones) for tt in blif.ttLookup.values()),
+    }
+    return stats, sizes
+
+# Times are the fastest of repeat runs. Memory is measured on a run of
+#  its own, because tracemalloc slows everything down.
+def runCase(family, width, density, seed, directory, repeat=1, measureMemory=True, coverTimeLimit=None):
+    name = caseName(family, width, density)
+    path = os.path.join(directory, name + ".blif")
+    outPath = os.path.join(directory, name + ".out.blif")
+    inputs, outputs, tables = generate(family, width, 0.5 if density is None else density, seed)
+    with open(path, "w") as f:
+        writeGenerated(f, inputs, outputs, tables)
+
+    # Like timeit, garbage collection is off while timing, or a collection
+    #  of the last phase's garbage lands on whichever phase comes next
+    seconds = {}
+    for i in range(0, repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            stats, sizes = runPhases(path, outPath, coverTimeLimit)
+        finally:
+            gc.enable()
+        for phase in PHASES:
+            # A constant table never reaches the QM phases
+            wall = stats.phases.get(phase, {"wall": 0.0})["wall"]
+            if phase not in seconds or wall < seconds[phase]:
+                seconds[phase] = wall
+
+    peakBytes = {}
+    if measureMemory:
+        tracemalloc.start()
+        try:
+            stats, sizes = runPhases(path, outPath, coverTimeLimit)
+        finally:
+            tracemalloc.stop()
+        peakBytes = stats.peakBytes
+
+    phases = {}
+    for phase in PHASES:
+        phases[phase] = {"seconds": seconds[phase]}
+        if phase in peakBytes:
+            phases[phase]["peakBytes"] = peakBytes[phase]
+
+    result = {"family": family, "width": width, "density": density, "seed": seed, "inputs": len(inputs),
+              "phases": phases}
+    result.update(sizes)
+    return name, result
+
+def runSuite(suite, seed=0, repeat=1, measureMemory=True, coverTimeLimit=None, verbose=True):
+    results = {
+        "version": RESULTS_VERSION,
+        "python": platform.python_version(),
+        "numpy": numpy is not None,
+        "seed": seed,
+        "repeat": repeat,
+        "cases": {},
+    }
+    directory = tempfile.mkdtemp(prefix="logicopt-bench-")
+    try:
+        for family, width, density in suite:
+            name, result = runCase(family, width, density, seed, directory, repeat=repeat,
+                                   measureMemory=measureMemory, coverTimeLimit=coverTimeLimit)
+            results["cases"][name] = result
+            if verbose:
+                print(formatCase(name, result))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+def formatCase(name, result):
+    parts = []
+    for phase in PHASES:
+        timing = result["phases"][phase]
+        part = "{} {}".format(phase, formatMeasure("seconds", timing["seconds"]))
+        if "peakBytes" in timing:
+            part += " " + formatMeasure("peakBytes", timing["peakBytes"])
+        parts.append(part)
+    return "{:<20} {} terms, {} primes, cover {}: {}".format(name, result["terms"], result["primes"],
+                                                            result["cover"], ", ".join(parts))
+
+def formatMeasure(measure, value):
+    if measure == "seconds":
+        return "{:.3f}s".format(value)
+    return "{:.1f}MB".format(value / (1024 * 1024))
+
+# Every phase of every case in both results that got slower or used
+#  more memory by more than threshold (a fraction) is listed
+def compareResults(results, baseline, threshold):
+    regressions = []
+    for name, result in sorted(results["cases"].items()):
+        if name not in baseline["cases"]:
+            continue
+        old = baseline["cases"][name]["phases"]
+        for phase in PHASES:
+            if phase not in old or phase not in result["phases"]:
+                continue
+            for measure, minimum in (("seconds", MIN_SECONDS_CHANGE), ("peakBytes", MIN_BYTES_CHANGE)):
+                if measure not in old[phase] or measure not in result["phases"][phase]:
+                    continue
+                before = old[phase][measure]
+                after = result["phases"][phase][measure]
+                if after > before * (1 + threshold) and after - before > minimum:
+                    regressions.append("{} {} {}: {} -> {} ({:+.0%})".format(
+                        name, phase, measure, formatMeasure(measure, before), formatMeasure(measure, after),
+                        (after - before) / before if before > 0 else 1))
+    return regressions
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the optimizer on generated functions.")
+    parser.add_argument("-o", dest="outputFile", help="Where to write the results (JSON).", default="./benchmark.json")
+    parser.add_argument("--baseline", dest="baselineFile", help="Results of an earlier run to compare against. Exits with 1 if a phase regressed. Defaults to benchmarkBaseline.json.", default=BASELINE_FILE)
+    parser.add_argument("--no-baseline", dest="baselineFile", help="Don't compare against a baseline.", action='store_const', const=None)
+    parser.add_argument("--threshold", dest="threshold", help="How much slower (or bigger) a phase may get before it counts as a regression, as a fraction.", type=float, default=0.25)
+    parser.add_argument("--family", dest="families", help="Only run cases of this family (can be given more than once).", choices=sorted(FAMILIES), action='append', default=None)
+    parser.add_argument("--repeat", dest="repeat", help="Number of timed runs of each case; the fastest is kept.", type=int, default=3)
+    parser.add_argument("--seed", dest="seed", type=int, default=0)
+    parser.add_argument("--no-memory", dest="measureMemory", help="Don't measure peak memory with tracemalloc.", action='store_const', default=True, const=False)
+    parser.add_argument("--cover-time", dest="coverTimeLimit", help="Seconds to spend searching for a minimum cover before settling for the best found.", type=float, default=10.0)
+    args = parser.parse_args()
+
+    suite = SUITE
+    if args.families is not None:
+        suite = [case for case in SUITE if case[0] in args.families]
+
+    results = runSuite(suite, seed=args.seed, repeat=args.repeat, measureMemory=args.measureMemory,
+                       coverTimeLimit=args.coverTimeLimit)
+    with open(args.outputFile, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print("Results written to {}.".format(args.outputFile))
+
+    if args.baselineFile is not None:
+        with open(args.baselineFile, "r") as f:
+            baseline = json.load(f)
+        regressions = compareResults(results, baseline, args.threshold)
+        if len(regressions) > 0:
+            print("{} phase measurements regressed by more than {:.0%}:".format(len(regressions), args.threshold))
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print("No phase regressed by more than {:.0%}.".format(args.threshold))
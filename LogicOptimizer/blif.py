@@ -1,15 +1,12 @@
+import gzip
+import io
+import lzma
+import mmap
+import os
 import random
+from contextlib import contextmanager
 from TruthTable import TruthTable
 
-# Removes ".name" in front of a line
-# and deletes any whitespace around all the names
-def getNames(line):
-    names = line.split(" ")
-    newNames = []
-    for n in names[1:len(names)]:
-        newNames.append(n.strip())
-    return newNames
-
 class BLIF:
     def __init__(self):
         self.prefix = ""
@@ -27,17 +24,23 @@ class BLIF:
         return "".join(s)
 
 
-def mergeAllIntoTopLevel(blif, debug=False):
-    # Expand the don't care cases of each truth table
-    for tt in blif.ttLookup.values():
-        tt.eliminateDontCares()
+# If stats are given (see stats.py) the time it takes, the rows
+#  exhaustOutputs adds and the rows the merged tables end up with are
+#  added to them.
+def mergeAllIntoTopLevel(blif, debug=False, stats=None):
+    started = stats.start() if stats is not None else None
 
     # Exhaust the list of outputs (for zeros)
     if len(blif.ttLookup.values()) > 1:
         for tt in blif.ttLookup.values():
+            rows = len(tt.ones) + len(tt.zeros)
             tt.exhaustOutputs()
+            if stats is not None:
+                stats.count("exhaustOutputsRows", len(tt.ones) + len(tt.zeros) - rows)
 
-    # Merge truth tables to make one big truth table
+    # Merge truth tables to make one big truth table. Every table is
+    #  only collapsed once, however many outputs it feeds.
+    collapsed = {}
     blif.topLevelMerged = []
     for tt in blif.ttLookup.values():
         # Only collapse the truth tables that are at the very highest level
@@ -47,82 +50,200 @@ def mergeAllIntoTopLevel(blif, debug=False):
         if tt.getOutputName() in blif.outputNames:
             if debug:
                 print("Merging tt with output {}".format(tt.getOutputName()))
-            tt.mergeChildren()
+            tt.mergeChildren(collapsed)
             blif.topLevelMerged.append(tt)
+            if stats is not None:
+                stats.count("mergeChildrenRows", len(tt.ones) + len(tt.zeros))
 
     # Replace all the TT's with the top level one(s)
     blif.ttLookup = {}
     for tt in blif.topLevelMerged:
         blif.ttLookup[tt.getOutputName()] = tt
 
+    if stats is not None:
+        stats.stop("mergeAllIntoTopLevel", started)
+
+
+
+
+# Size of the reads used for compressed files, and for anything that
+#  can't be memory mapped
+READ_BUFFER_SIZE = 1 << 20
+
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+
+# Directives that change the logic in ways this optimizer doesn't model.
+#  Anything else that isn't understood (timing info and so on) is skipped.
+UNSUPPORTED_DIRECTIVES = set([b".latch", b".mlatch", b".subckt", b".gate", b".exdc", b".search"])
+
+# Turn the input plane of a row ("1-0") into the binary digits of its
+#  cube's value ("100") and mask ("101")
+VALUE_DIGITS = bytes.maketrans(b"-", b"0")
+MASK_DIGITS = bytes.maketrans(b"01-", b"110")
+
+# Opens a BLIF for reading bytes. f can be a path or an open file (text or
+#  binary). gzip and xz files are recognized by their first bytes and
+#  decompressed as they are read, plain files are memory mapped.
+@contextmanager
+def openBLIF(f):
+    opened = []
+    try:
+        if isinstance(f, str):
+            raw = open(f, "rb")
+            opened.append(raw)
+        else:
+            f.seek(0)
+            # Read text files through their binary buffer
+            raw = getattr(f, "buffer", f)
+            raw.seek(0)
+            if isinstance(raw.read(0), str):
+                # A text stream with no buffer under it (io.StringIO)
+                raw = io.BytesIO(raw.read().encode())
+
+        magic = raw.read(len(XZ_MAGIC))
+        raw.seek(0)
+        if magic.startswith(GZIP_MAGIC):
+            stream = io.BufferedReader(gzip.GzipFile(fileobj=raw, mode="rb"), READ_BUFFER_SIZE)
+            opened.append(stream)
+        elif magic.startswith(XZ_MAGIC):
+            stream = io.BufferedReader(lzma.LZMAFile(raw, mode="rb"), READ_BUFFER_SIZE)
+            opened.append(stream)
+        else:
+            try:
+                stream = mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+                opened.append(stream)
+            except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+                # Empty files and streams without a file descriptor
+                stream = raw
+
+        yield stream
+    finally:
+        for stream in reversed(opened):
+            stream.close()
+
+# Splits a BLIF into lines of tokens. Comments are dropped, a line ending
+#  in a backslash is joined to the next one and tokens are split on any
+#  run of whitespace. Blank lines come out as empty lists because they
+#  end a block of truth table rows.
+def blifTokens(stream):
+    pending = None
+    for line in iter(stream.readline, b""):
+        if b"#" in line:
+            line = line[:line.index(b"#")]
+        if pending is not None:
+            line = pending + line.lstrip()
+            pending = None
+
+        line = line.rstrip()
+        if line.endswith(b"\\"):
+            pending = line[:-1]
+            continue
+        yield line.split()
 
+    if pending is not None:
+        yield pending.split()
 
+def addTruthTables(blif, nameRows, ones, zeros):
+    for names in nameRows:
+        tt = TruthTable.fromCubes(names, ones, zeros, blif)
+        blif.ttLookup[tt.getOutputName()] = tt
 
-# Reads a blif file and returns a single, collapsed TruthTable object.
-def read_blif(f, createTopLevelMerged=True, debug=0):
-    f.seek(0)
+# Reads a blif file. f can be a path or an open file, and may be gzip or
+#  xz compressed. Rows are packed into cubes as they are read, without
+#  holding the file or its lines in memory.
+# If stats are given (see stats.py) the time it takes to read the file
+#  and to merge it (see mergeAllIntoTopLevel) are added to them.
+def read_blif(f, createTopLevelMerged=True, debug=0, stats=None):
+    started = stats.start() if stats is not None else None
 
     # Cheap-o way to make a generic object.
     blif = BLIF()
+    blif.inputNames = []
+    blif.outputNames = []
 
     # Multiple .name lines can appear in a row
     #  with the following truth table line(s) applying to all
     #  of them.
     nameRows = []
-    truthTableRows = []
-
-    # Read the blif file and create truth table objects
-    previousLine = ""
-    for line in f:
-        # Account for lines being split with backslashes
-        line = line.strip()
-        if line.endswith("\\"):
-            line = line[0:-1]
-            previousLine = previousLine + line
-            continue
-        else:
-            line = previousLine + line
-            previousLine = ""
+    ones = []
+    zeros = []
+    width = 0
+
+    with openBLIF(f) as stream:
+        for tokens in blifTokens(stream):
+            if len(tokens) == 0 or tokens[0].startswith(b"."):
+                # Anything but another .names line right after the last one
+                #  ends the rows of the tables we have
+                directive = tokens[0] if len(tokens) > 0 else None
+                if directive != b".names" or len(ones) > 0 or len(zeros) > 0:
+                    addTruthTables(blif, nameRows, ones, zeros)
+                    nameRows = []
+                    ones = []
+                    zeros = []
+
+                if directive is None:
+                    continue
+
+                names = [t.decode() for t in tokens[1:]]
+                if directive == b".names":
+                    # A table without inputs is a constant: a single "1"
+                    #  row makes it 1, no rows at all make it 0. A constant
+                    #  0 has nothing to share, so it ends the tables before it
+                    #  and the next .names starts afresh.
+                    if len(nameRows) > 0 and (len(names) == 1 or len(nameRows[0]) == 1):
+                        addTruthTables(blif, nameRows, ones, zeros)
+                        nameRows = []
+                    if len(nameRows) > 0 and len(names) != len(nameRows[0]):
+                        raise Exception("Names lines sharing rows have different widths: {}".format(" ".join(names)))
+                    nameRows.append(names)
+                    width = len(names) - 1
+                elif directive == b".model":
+                    blif.modelName = names[0] if len(names) > 0 else ""
+                elif directive == b".inputs":
+                    blif.inputNames.extend(names)
+                elif directive == b".outputs":
+                    blif.outputNames.extend(names)
+                elif directive == b".end":
+                    break
+                elif directive in UNSUPPORTED_DIRECTIVES:
+                    raise Exception("BLIF {} is not supported.".format(directive.decode()))
+                continue
 
-        if line.startswith(".name"):
-            names = getNames(line)
-            if len(names) is 1:
+            if len(nameRows) == 0:
+                # Rows that don't belong to any table
                 continue
-            nameRows.append(getNames(line))
-        elif line.startswith(".model"):
-            modelName = getNames(line)[0]
-            blif.modelName = modelName
-        elif line.startswith(".inputs"):
-            blif.inputNames = getNames(line)
-        elif line.startswith(".outputs"):
-            blif.outputNames = getNames(line)
-        elif line.startswith(".end"):
-            break
-        elif len(line) <= 2:
-            # Blank space line or a line we don't care about
-
-            # Process what we've accumulated
-            for nameRow in nameRows:
-                #print("Name row: {}".format(nameRow))
-                tt = TruthTable(nameRow, truthTableRows, blif)
-                blif.ttLookup[tt.getOutputName()] = tt
-                #print("Added truth table: {}".format(tt))
-            # Clear for next time
-            nameRows = []
-            truthTableRows = []
-        else:
-            #Truth table line
-            #print("Truth table line: {}, {}".format(line, len(line)))
-            ttInputs, ttOutput = line.split(" ")
-            ttInputs = list(ttInputs)
-            ttOutput = ttOutput.strip()
-            truthTableRows.append( [ttInputs, ttOutput] )
+
+            # Truth table line
+            if width == 0 and len(tokens) == 1:
+                plane, output = b"", tokens[0]
+            elif len(tokens) != 2:
+                raise Exception("Bad truth table line: {}".format(b" ".join(tokens).decode()))
+            else:
+                plane, output = tokens
+            if len(plane) != width or len(plane.translate(None, b"01-")) > 0:
+                raise Exception("Bad truth table row {} for {} inputs.".format(plane.decode(), width))
+
+            if width == 0:
+                cube = (0, 0)
+            else:
+                cube = (int(plane.translate(VALUE_DIGITS), 2), int(plane.translate(MASK_DIGITS), 2))
+            if output == b"1":
+                ones.append(cube)
+            elif output == b"0":
+                zeros.append(cube)
+            else:
+                raise Exception("Bad truth table output: {}".format(output.decode()))
+
+    addTruthTables(blif, nameRows, ones, zeros)
+
+    if stats is not None:
+        stats.stop("read_blif", started)
+        stats.count("tablesRead", len(blif.ttLookup))
 
     blif.topLevelMerged = None
-    # Calculating the logical complement does NOT work for large
-    #  numbers of bits.
-    if createTopLevelMerged is True and len(blif.inputNames) <= 8:
-        mergeAllIntoTopLevel(blif, debug=debug)
+    if createTopLevelMerged is True:
+        mergeAllIntoTopLevel(blif, debug=debug, stats=stats)
 
 
     # Print debug info?
@@ -188,8 +309,10 @@ def blifs_equal(blif0, blif1):
 
     return True
 
-# Should we test the BLIF importer/exporter?
-def runBLIFTests():
+# Writes random tables of 2 to 27 inputs, and a BLIF with constant
+#  outputs, out and reads them back in. The files go in directory. Returns True if every one came back the same.
+def runBLIFTests(directory="."):
+    passed = True
     for bits in range(2, 28):
         mintermCount = bits * 2
         print("Testing export/import with {} bit input and {} minterms.".format(bits, mintermCount))
@@ -231,7 +354,7 @@ def runBLIFTests():
         #print(tt.ttString())
 
         print("Writing out...")
-        testOutName = "./test{}minterms.blif".format(bits)
+        testOutName = os.path.join(directory, "test{}minterms.blif".format(bits))
         with open(testOutName, "w") as f:
             write_blif(originalBlif, f)
 
@@ -240,12 +363,46 @@ def runBLIFTests():
         with open(testOutName, "r") as f:
             rereadBlif = read_blif(f, createTopLevelMerged=False)
 
+        # The same through a text stream that has no file behind it
+        stringFile = io.StringIO()
+        write_blif(originalBlif, stringFile)
+        stringBlif = read_blif(stringFile, createTopLevelMerged=False)
+
         if blifs_equal(originalBlif, rereadBlif) is not True:
             print("Error, blifs not equal. The exporter/importer isn't working!")
             print("Failed with {} bits.".format(bits))
+            passed = False
+        elif blifs_equal(originalBlif, stringBlif) is not True:
+            print("Error, blifs not equal. Reading from a StringIO isn't working!")
+            print("Failed with {} bits.".format(bits))
+            passed = False
         else:
             print("Success with {} bits.".format(bits))
 
+    # Outputs that are always 1 or always 0 are tables without inputs
+    print("Testing export/import of constant outputs.")
+    constantBlif = BLIF()
+    constantBlif.modelName = "ModelConstants"
+    constantBlif.inputNames = ["inp0", "inp1"]
+    constantBlif.outputNames = ["one", "zero", "out1"]
+    for names, rows in [(["one"], [[[], "1"]]), (["zero"], []), (["inp0", "inp1", "out1"], [[["1", "-"], "1"]])]:
+        tt = TruthTable(names, rows, blif=constantBlif)
+        constantBlif.ttLookup[tt.getOutputName()] = tt
+
+    testOutName = os.path.join(directory, "testConstants.blif")
+    with open(testOutName, "w") as f:
+        write_blif(constantBlif, f)
+    with open(testOutName, "r") as f:
+        rereadBlif = read_blif(f, createTopLevelMerged=False)
+
+    if blifs_equal(constantBlif, rereadBlif) is not True:
+        print("Error, blifs not equal. Constant outputs aren't read back!")
+        passed = False
+    else:
+        print("Success with constant outputs.")
+
+    return passed
+
 
 
 
@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Reading the memory use isn't free, so it is only looked at this often
+#  (seconds) however often check() is called
+MEMORY_CHECK_INTERVAL = 0.05
+
+class BudgetExceeded(Exception):
+    pass
+
+# Limits on how long and how much memory one table (or group of tables)
+#  may take to optimize.
+#
+# timeLimit (seconds) counts from when the budget is made; runDeadline is
+#  an absolute time.time() shared by every table in a run, so a table
+#  started late gets less. memLimit (bytes) is checked against how much
+#  the resident size of the process doing the work has grown since the
+#  budget was made, so a worker that optimized a big table earlier (in a
+#  batch or the server) doesn't cut short every table after it. Where
+#  there is no /proc that growth is of the peak size, which only counts
+#  what the table takes past the biggest table before it.
+#
+# The optimizers call check() between phases (QM columns, espresso
+#  passes, cofactor splits) and while covering. It raises BudgetExceeded
+#  once a limit is hit, and the caller keeps the best cover it has.
+class Budget:
+    def __init__(self, timeLimit=None, memLimit=None, runDeadline=None):
+        self.deadline = runDeadline
+        if timeLimit is not None:
+            deadline = time.time() + timeLimit
+            if self.deadline is None or deadline < self.deadline:
+                self.deadline = deadline
+        self.memLimit = memLimit
+        self.baseBytes = residentBytes() if memLimit is not None else 0
+        self.lastMemoryCheck = 0
+        # Which limit was hit, if any
+        self.exceeded = None
+
+    def check(self):
+        if self.exceeded is not None:
+            raise BudgetExceeded(self.exceeded)
+
+        now = time.time()
+        if self.deadline is not None and now > self.deadline:
+            self.exceeded = "time"
+        elif self.memLimit is not None and now - self.lastMemoryCheck >= MEMORY_CHECK_INTERVAL:
+            self.lastMemoryCheck = now
+            if residentBytes() - self.baseBytes > self.memLimit:
+                self.exceeded = "memory"
+
+        if self.exceeded is not None:
+            raise BudgetExceeded(self.exceeded)
+
+    # Like check(), but returns True instead of raising
+    def spent(self):
+        try:
+            self.check()
+        except BudgetExceeded:
+            return True
+        return False
+
+    # Seconds left before the deadline, or None if there isn't one
+    def remaining(self):
+        if self.deadline is None:
+            return None
+        return max(0, self.deadline - time.time())
+
+# Resident size of this process in bytes. Falls back to the peak size
+#  where /proc isn't there.
+def residentBytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Bytes on macOS, kilobytes everywhere else
+        if sys.platform == "darwin":
+            return peak
+        return peak * 1024
+    return 0
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import OrderedDict
+
+# Bump this when the optimizers change in a way that should make old
+#  cached covers stale
+CACHE_FORMAT = 2
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+# When the cache is over its size it is trimmed down to this fraction of
+#  it, so that it isn't rescanned on every store
+CACHE_LOW_WATER = 0.9
+# Covers a MemoryCache keeps before dropping the least recently used
+DEFAULT_MEMORY_CACHE_ENTRIES = 100000
+
+# Options that change the cover a table gets. Anything else (debug
+#  output, the worker pool) is left out of the key. "group" is the
+#  groupKey of the multi-output group a table was minimized in.
+CACHE_KEY_OPTIONS = ["engine", "coverTimeLimit", "multiOutput", "group"]
+
+# Content-addressed store of optimized covers on disk.
+#
+# Each entry is a JSON file named after the hash of the table it came
+#  from (see tableKey), so the same .names block gets the same entry in
+#  any design and any run. Files are written to a temporary name and
+#  renamed into place, so other processes using the same directory only
+#  ever see whole entries. A file's modification time is its last use;
+#  when the directory grows past maxBytes the least recently used
+#  entries are removed.
+class ResultCache:
+    def __init__(self, directory, maxBytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        # Estimate of the directory size, filled in on the first store
+        self.totalBytes = None
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        # Two levels so no single directory gets too big
+        return os.path.join(self.directory, key[0:2], key + ".json")
+
+    # Returns the cached cover (packed cubes) for the table, or None
+    def lookup(self, tt, options):
+        key = tableKey(tt, options)
+        path = self.path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if entry.get("key") != key or entry.get("width") != tt.width():
+            self.misses += 1
+            return None
+
+        try:
+            # Mark it as recently used
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return [(int(v, 16), int(m, 16)) for v, m in entry["cover"]]
+
+    def store(self, tt, options, cover):
+        key = tableKey(tt, options)
+        path = self.path(key)
+        entry = {
+            "key": key,
+            "width": tt.width(),
+            "cover": [["{:x}".format(v), "{:x}".format(m)] for v, m in cover],
+        }
+
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # Another process made it first
+                pass
+
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "w") as f:
+                json.dump(entry, f)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+        self.stores += 1
+        if self.totalBytes is None:
+            self.totalBytes = self.directorySize()
+        else:
+            self.totalBytes += os.path.getsize(path)
+        if self.totalBytes > self.maxBytes:
+            self.evict()
+
+    # Every entry as (last use, size, path)
+    def entries(self):
+        found = []
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    # Evicted by another process
+                    continue
+                found.append((info.st_mtime, info.st_size, path))
+        return found
+
+    def directorySize(self):
+        return sum(size for used, size, path in self.entries())
+
+    # Removes the least recently used entries until the cache is under
+    #  its low water mark
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for used, size, path in entries)
+        target = self.maxBytes * CACHE_LOW_WATER
+        for used, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            total -= size
+        self.totalBytes = total
+
+    def summary(self):
+        return "Result cache: {} hits, {} misses, {} stored, {} evicted.".format(
+            self.hits, self.misses, self.stores, self.evictions)
+
+# Keeps covers in memory for processes that optimize many BLIFs (the
+#  server and batch modes), with the same lookup and store as
+#  ResultCache. Entries are keyed by tableKey and the least recently used
+#  are dropped past maxEntries. If a ResultCache is given as backing,
+#  misses are looked up in it and stores go to both.
+class MemoryCache:
+    def __init__(self, maxEntries=DEFAULT_MEMORY_CACHE_ENTRIES, backing=None):
+        self.maxEntries = maxEntries
+        self.backing = backing
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def lookup(self, tt, options):
+        key = tableKey(tt, options)
+        cover = self.entries.get(key)
+        if cover is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(cover)
+
+        if self.backing is not None:
+            cover = self.backing.lookup(tt, options)
+        if cover is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.remember(key, cover)
+        return cover
+
+    def store(self, tt, options, cover):
+        self.remember(tableKey(tt, options), cover)
+        self.stores += 1
+        if self.backing is not None:
+            self.backing.store(tt, options, cover)
+
+    def remember(self, key, cover):
+        self.entries[key] = tuple(cover)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def summary(self):
+        return "Memory cache: {} hits, {} misses, {} stored, {} evicted, {} entries.".format(
+            self.hits, self.misses, self.stores, self.evictions, len(self.entries))
+
+# Hash of everything that decides the cover a table gets: its input
+#  count, its sorted cubes and the options that change the result.
+#  Names don't matter, so identical blocks in different designs share
+#  an entry.
+def tableKey(tt, options):
+    h = hashlib.sha256()
+    h.update("format {} width {}\n".format(CACHE_FORMAT, tt.width()).encode())
+    for name in CACHE_KEY_OPTIONS:
+        h.update("{} {!r}\n".format(name, options.get(name)).encode())
+    for label, cubes in (("ones", tt.ones), ("zeros", tt.zeros)):
+        h.update(label.encode())
+        for v, m in sorted(cubes):
+            h.update(" {:x}/{:x}".format(v, m).encode())
+        h.update(b"\n")
+    return h.hexdigest()
+
+# Hash of the tables of a multi-output group, whatever order they come
+#  in. A table's cover depends on the rest of its group, so it goes in
+#  the key of each of them.
+def groupKey(tables):
+    h = hashlib.sha256()
+    for key in sorted(tableKey(tt, {}) for tt in tables):
+        h.update(key.encode())
+    return h.hexdigest()
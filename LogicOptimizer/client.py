@@ -0,0 +1,104 @@
+from argparse import *
+import json
+import os
+import socket
+import sys
+import tempfile
+
+# Sends one BLIF to a running server.py and writes out the result. Takes
+#  the same -i, -o and -v as main.py. Only the standard library is
+#  imported, so it starts quickly.
+#
+#   python server.py &
+#   python client.py -i in.blif -o out.blif -v
+#
+# "-" as -i or -o reads the BLIF from stdin or writes it to stdout.
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "logicopt-{}.sock".format(os.getuid()))
+
+# Sends a request and returns the server's response to it
+def request(connection, reader, message):
+    connection.sendall(json.dumps(message).encode() + b"\n")
+    while True:
+        line = reader.readline()
+        if len(line) == 0:
+            raise Exception("The server closed the connection.")
+        response = json.loads(line)
+        if response.get("id") == message.get("id"):
+            return response
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Optimize a BLIF with a running optimizer server (see server.py).")
+    parser.add_argument("-i", dest="inputFile", help="BLIF to optimize, or - for stdin.", required=True)
+    parser.add_argument("-o", dest="outputFile", help="Where to write the optimized BLIF, or - for stdout.", default="./output.blif")
+    parser.add_argument("-v", dest="verifyBLIF", help="Verify the optimized BLIF against the original.", action='store_const', default=False, const=True)
+    parser.add_argument("--verify-engine", dest="verifyEngine", choices=["sim", "bdd", "sat"], default="sim")
+    parser.add_argument("--engine", dest="engine", choices=["qm", "espresso", "cofactor"], default=None)
+    parser.add_argument("--multi-output", dest="multiOutput", action='store_const', default=None, const=True)
+    parser.add_argument("--cover-time", dest="coverTimeLimit", type=float, default=None)
+    parser.add_argument("--time-limit", dest="timeLimit", type=float, default=None)
+    parser.add_argument("--socket", dest="socketPath", help="Socket the server listens on.", default=DEFAULT_SOCKET)
+    parser.add_argument("--send-text", dest="sendText", help="Send the BLIF's text instead of its path (for a server that can't see this file system).", action='store_const', default=False, const=True)
+    args = parser.parse_args()
+
+    message = {"op": "optimize", "id": "client{}".format(os.getpid()), "verify": args.verifyBLIF,
+               "verifyEngine": args.verifyEngine}
+    for name in ("engine", "multiOutput", "coverTimeLimit", "timeLimit"):
+        if getattr(args, name) is not None:
+            message[name] = getattr(args, name)
+
+    if args.inputFile == "-":
+        message["blif"] = sys.stdin.read()
+    elif args.sendText:
+        with open(args.inputFile, "r") as f:
+            message["blif"] = f.read()
+    else:
+        message["input"] = os.path.abspath(args.inputFile)
+    if args.outputFile != "-" and not args.sendText:
+        message["output"] = os.path.abspath(args.outputFile)
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(args.socketPath)
+    except OSError:
+        print("No optimizer server is listening on {}. Start one with python server.py.".format(args.socketPath),
+              file=sys.stderr)
+        sys.exit(2)
+
+    reader = connection.makefile("rb")
+    try:
+        response = request(connection, reader, message)
+    except KeyboardInterrupt:
+        # Let the server drop the job
+        connection.sendall(json.dumps({"op": "cancel", "id": message["id"]}).encode() + b"\n")
+        sys.exit(130)
+    finally:
+        connection.close()
+
+    if response["status"] != "ok":
+        print("Optimization failed: {}".format(response.get("message", response["status"])), file=sys.stderr)
+        sys.exit(1)
+
+    if "blif" in response:
+        if args.outputFile == "-":
+            sys.stdout.write(response["blif"])
+        else:
+            with open(args.outputFile, "w") as f:
+                f.write(response["blif"])
+
+    # Everything else goes to stderr when the BLIF is on stdout
+    log = sys.stderr if args.outputFile == "-" else sys.stdout
+    for name in sorted(response["cutShort"]):
+        print("Optimization of {} was cut short by the {} limit.".format(name, response["cutShort"][name]), file=log)
+
+    if args.verifyBLIF:
+        counterexample = response["counterexample"]
+        if counterexample is not None:
+            print("Error, blifs not equal. The logic optimizer failed.", file=log)
+            print("Output {} is {} in the original and {} in the optimized BLIF for inputs:".format(
+                counterexample["output"], counterexample["original"], counterexample["optimized"]), file=log)
+            for name in counterexample["inputs"]:
+                print("  {} = {}".format(name, counterexample["inputs"][name]), file=log)
+            sys.exit(1)
+        print(response["verified"], file=log)
+        print("The logic-optimized BLIF is identical to the original when expanded!", file=log)
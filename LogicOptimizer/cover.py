@@ -0,0 +1,346 @@
+import time
+from cube import *
+from budget import *
+
+# Cores with this many rows or fewer are solved with Petrick's method.
+PETRICK_MAX_ROWS = 10
+# How many products Petrick's method may keep before giving up on it.
+PETRICK_MAX_PRODUCTS = 4096
+# Multi-output covers with more (minterm, output) rows than this only get
+#  the output-by-output cover, without the exact search over all of them.
+MULTI_OUTPUT_EXACT_ROWS = 2000
+
+class CoverTimeout(Exception):
+    pass
+
+# Finds a minimum set of prime implicants that covers every minterm in
+#  needToCover.
+#
+# The coverage matrix is kept as bitsets: each row (minterm) is an int
+#  with a bit set for every column (prime implicant) that covers it. The
+#  matrix is reduced by taking essential primes and removing dominated
+#  rows and columns until nothing changes. Whatever is left (the cyclic
+#  core) is solved exactly with Petrick's method if it is small, or with
+#  branch-and-bound otherwise.
+# If timeLimit (seconds) runs out during the search the best cover found
+#  so far is used, which is never worse than a greedy cover.
+# If stats are given (see stats.py) the essential primes, the size of the
+#  cyclic core and any timeout are counted in them.
+def findMinimumCover(primeImplicants, needToCover, timeLimit=None, debug=False, budget=None, stats=None):
+    # Give every distinct minterm a row
+    rowIndex = {}
+    for m in needToCover:
+        if m not in rowIndex:
+            rowIndex[m] = len(rowIndex)
+
+    rows = [0] * len(rowIndex)
+    for col, prime in enumerate(primeImplicants):
+        bit = 1 << col
+        for m in prime.minterms():
+            r = rowIndex.get(m)
+            if r is not None:
+                rows[r] |= bit
+
+    for m, r in rowIndex.items():
+        if rows[r] == 0:
+            raise Exception("Couldn't find a prime implicant to cover minterm {}.".format(m))
+
+    return solveCover(primeImplicants, rows, timeLimit, debug, budget=budget, stats=stats)
+
+# Like findMinimumCover, but for primes shared by several outputs (see
+#  quineMcCluskeyMultiOutput). Every row is a (minterm, output) pair,
+#  and a prime covers it if it implements the minterm and has the output
+#  in its tag. A prime that several outputs use is only counted once.
+#
+# The outputs are first covered one at a time, each one getting the
+#  primes earlier outputs took for free. That is about as fast as
+#  covering them separately. If there are at most MULTI_OUTPUT_EXACT_ROWS
+#  rows, that cover is then the starting point of an exact search.
+def findMultiOutputCover(primeImplicants, needToCover, timeLimit=None, debug=False, budget=None, stats=None):
+    exact = len(needToCover) <= MULTI_OUTPUT_EXACT_ROWS
+    deadline = None
+    if timeLimit is not None:
+        deadline = time.time() + timeLimit
+
+    byOutput = {}
+    for m, output in needToCover:
+        byOutput.setdefault(output, []).append(m)
+
+    chosen = []
+    for output in sorted(byOutput):
+        covered = set()
+        for prime in chosen:
+            if prime.tag >> output & 1:
+                covered.update(prime.minterms())
+        rest = [m for m in byOutput[output] if m not in covered]
+        if len(rest) == 0:
+            continue
+        candidates = [prime for prime in primeImplicants if prime.tag >> output & 1]
+        remaining = None
+        if deadline is not None:
+            remaining = max(0, deadline - time.time())
+        # Only count the cover that is kept
+        for prime in findMinimumCover(candidates, rest, timeLimit=remaining, budget=budget,
+                                      stats=None if exact else stats):
+            if prime not in chosen:
+                chosen.append(prime)
+
+    if not exact:
+        return chosen
+
+    rowIndex = {}
+    for m in needToCover:
+        if m not in rowIndex:
+            rowIndex[m] = len(rowIndex)
+
+    rows = [0] * len(rowIndex)
+    for col, prime in enumerate(primeImplicants):
+        bit = 1 << col
+        for output in iterBits(prime.tag):
+            for m in prime.minterms():
+                r = rowIndex.get((m, output))
+                if r is not None:
+                    rows[r] |= bit
+
+    initial = 0
+    for col, prime in enumerate(primeImplicants):
+        if prime in chosen:
+            initial |= 1 << col
+
+    remaining = None
+    if deadline is not None:
+        remaining = max(0, deadline - time.time())
+    return solveCover(primeImplicants, rows, remaining, debug, initial, budget, stats)
+
+# Solves a coverage matrix whose columns are primeImplicants. initial is
+#  an optional bitset of columns that is already known to cover every
+#  row, used as the first best cover.
+# If the budget (see budget.py) runs out the best cover found so far is
+#  used like with timeLimit. If it is spent before the search starts the
+#  matrix is only reduced as far as it got and the rest covered greedily,
+#  so the cover stage never gives up a table (only finding the primes
+#  does).
+def solveCover(primeImplicants, rows, timeLimit=None, debug=False, initial=None, budget=None, stats=None):
+    # Fewer literals is better when two primes cover the same minterms
+    costs = [popcount(prime.mask) for prime in primeImplicants]
+
+    deadline = None
+    if timeLimit is not None:
+        deadline = time.time() + timeLimit
+
+    solver = CoverSolver(costs, deadline, budget)
+    chosen = solver.solve(rows, initial)
+
+    if debug:
+        print("Cover solver: {} rows, {} columns, {} essential, cyclic core of {} rows{}.".format(
+            len(rows), len(primeImplicants), solver.essentialCount, solver.coreRows,
+            " (timed out, using best found)" if solver.timedOut else ""))
+
+    if stats is not None:
+        stats.count("essentials", solver.essentialCount)
+        stats.count("cyclicCoreRows", solver.coreRows)
+        if solver.timedOut:
+            stats.count("coverTimeouts")
+
+    return [primeImplicants[col] for col in iterBits(chosen)]
+
+class CoverSolver:
+    def __init__(self, costs, deadline=None, budget=None):
+        self.costs = costs
+        self.deadline = deadline
+        self.budget = budget
+        self.essentialCount = 0
+        self.coreRows = 0
+        self.timedOut = False
+        self.best = None
+        self.bestCount = None
+
+    # Returns a bitset of the chosen columns
+    def solve(self, rows, initial=None):
+        core, chosen = self.reduce(rows)
+        self.essentialCount = popcount(chosen)
+        self.coreRows = len(core)
+
+        if len(core) == 0:
+            return chosen
+
+        if self.budget is not None and self.budget.exceeded is not None:
+            # No time or memory left to search, but there is always a
+            #  greedy cover
+            self.timedOut = True
+            if initial is not None:
+                return chosen | (initial & ~chosen)
+            return chosen | greedyCover(core)
+
+        if len(core) <= PETRICK_MAX_ROWS:
+            solution = petrick(core)
+            if solution is not None:
+                return chosen | solution
+
+        # Start with the given cover (less what was already taken) or a
+        #  greedy one, so there is always an answer
+        if initial is not None:
+            self.best = initial & ~chosen
+        else:
+            self.best = greedyCover(core)
+        self.bestCount = popcount(self.best)
+
+        try:
+            self.branch(core, 0)
+        except (CoverTimeout, BudgetExceeded):
+            self.timedOut = True
+
+        return chosen | self.best
+
+    def checkDeadline(self):
+        if self.deadline is not None and time.time() > self.deadline:
+            raise CoverTimeout()
+        if self.budget is not None:
+            self.budget.check()
+
+    def branch(self, rows, chosen):
+        self.checkDeadline()
+
+        rows, taken = self.reduce(rows)
+        chosen |= taken
+        count = popcount(chosen)
+
+        if len(rows) == 0:
+            if count < self.bestCount:
+                self.best = chosen
+                self.bestCount = count
+            return
+
+        if count + independentRowsBound(rows) >= self.bestCount:
+            return
+
+        # Branch on the hardest row to cover, trying the columns that
+        #  cover the most other rows first
+        row = min(rows, key=popcount)
+        columns = list(iterBits(row))
+        columns.sort(key=lambda c: -sum(1 for r in rows if r >> c & 1))
+        for col in columns:
+            bit = 1 << col
+            self.branch([r for r in rows if not (r & bit)], chosen | bit)
+
+    # Takes essential columns and removes dominated rows and columns until
+    #  the matrix stops changing. Returns the reduced rows and a bitset
+    #  of the columns that had to be taken.
+    def reduce(self, rows):
+        chosen = 0
+        while len(rows) > 0:
+            # What is left is still a valid matrix to cover, so stop here
+            #  if the budget is spent
+            if self.budget is not None and self.budget.spent():
+                break
+            # A row with only one column makes that column essential
+            essential = 0
+            for r in rows:
+                if r & (r - 1) == 0:
+                    essential |= r
+            if essential:
+                chosen |= essential
+                rows = [r for r in rows if not (r & essential)]
+                continue
+
+            reduced = removeDominatedColumns(removeDominatedRows(rows), self.costs)
+            if len(reduced) == len(rows) and reduced == rows:
+                break
+            rows = reduced
+
+        return rows, chosen
+
+# Maps each column to a bitset of the rows (by position) it covers
+def columnsOf(rows):
+    columns = {}
+    for i, r in enumerate(rows):
+        bit = 1 << i
+        for col in iterBits(r):
+            columns[col] = columns.get(col, 0) | bit
+    return columns
+
+# A row whose columns are a superset of another row's columns is covered
+#  whenever the other row is, so it can be dropped.
+def removeDominatedRows(rows):
+    columns = columnsOf(rows)
+    removed = 0
+    for i, r in enumerate(rows):
+        if removed >> i & 1:
+            continue
+        # Rows that contain every column of this row
+        supersets = -1
+        for col in iterBits(r):
+            supersets &= columns[col]
+        removed |= supersets & ~(1 << i)
+
+    if removed == 0:
+        return rows
+    return [r for i, r in enumerate(rows) if not (removed >> i & 1)]
+
+# A column that covers a subset of another column's rows is never needed.
+#  When two columns cover the same rows the more expensive one goes.
+def removeDominatedColumns(rows, costs):
+    columns = columnsOf(rows)
+    order = sorted(columns, key=lambda c: (-costs[c], popcount(columns[c]), c))
+
+    removed = 0
+    for col in order:
+        # Columns that cover every row this column covers
+        supersets = -1
+        for i in iterBits(columns[col]):
+            supersets &= rows[i]
+        if supersets & ~removed & ~(1 << col):
+            removed |= 1 << col
+
+    if removed == 0:
+        return rows
+    return [r & ~removed for r in rows]
+
+# Lower bound on how many more columns are needed: rows that share no
+#  columns must each be covered by a different column.
+def independentRowsBound(rows):
+    used = 0
+    count = 0
+    for r in sorted(rows, key=popcount):
+        if not (r & used):
+            used |= r
+            count += 1
+    return count
+
+# Repeatedly takes the column that covers the most uncovered rows
+def greedyCover(rows):
+    chosen = 0
+    while len(rows) > 0:
+        counts = {}
+        for r in rows:
+            for col in iterBits(r):
+                counts[col] = counts.get(col, 0) + 1
+        col = max(counts, key=lambda c: (counts[c], -c))
+        bit = 1 << col
+        chosen |= bit
+        rows = [r for r in rows if not (r & bit)]
+    return chosen
+
+# Petrick's method: multiply out the product of sums (one sum per row)
+#  and keep the smallest product. Returns None if it grows too large.
+def petrick(rows):
+    products = {0}
+    for r in rows:
+        expanded = set()
+        for p in products:
+            if p & r:
+                expanded.add(p)
+            else:
+                for col in iterBits(r):
+                    expanded.add(p | (1 << col))
+
+        # Absorption: X + XY = X
+        products = []
+        for p in sorted(expanded, key=popcount):
+            if not any(q & p == q for q in products):
+                products.append(p)
+
+        if len(products) > PETRICK_MAX_PRODUCTS:
+            return None
+
+    return min(products, key=lambda p: (popcount(p), p))
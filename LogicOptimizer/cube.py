@@ -0,0 +1,359 @@
+from itertools import compress
+
+# Helpers for working with cubes packed into integers.
+#
+# A cube is a (value, mask) pair of Python ints. A bit that is set in
+#  the mask is a cared-about input and its value is the matching bit in
+#  value. A bit that is clear in the mask is a don't-care ("-") and its
+#  value bit is always 0.
+# The left most character of a row is the most significant bit so that
+#  int("".join(row), 2) gives the same number the old code used.
+
+# Counts the number of set bits in an int of any width
+def popcount(x):
+    return bin(x).count("1")
+
+# Converts a row like ['1', '-', '0'] (or the string "1-0") to a cube
+def rowToCube(row):
+    value = 0
+    mask = 0
+    for c in row:
+        value <<= 1
+        mask <<= 1
+        if c == "1":
+            value |= 1
+            mask |= 1
+        elif c == "0":
+            mask |= 1
+        elif c != "-":
+            raise Exception("rowToCube - invalid character {} in row {}".format(c, row))
+    return value, mask
+
+# Converts a cube back into a row of one-character strings
+def cubeToRow(value, mask, width):
+    row = []
+    for i in range(width - 1, -1, -1):
+        bit = 1 << i
+        if not (mask & bit):
+            row.append("-")
+        elif value & bit:
+            row.append("1")
+        else:
+            row.append("0")
+    return row
+
+# The same row as a string
+def cubeToString(value, mask, width):
+    if mask == (1 << width) - 1:
+        return format(value, "0{}b".format(width)) if width > 0 else ""
+    return "".join(cubeToRow(value, mask, width))
+
+# Yields the index of each set bit, lowest first
+def iterBits(x):
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
+# Yields every minterm (as a fully specified value) inside a cube of the
+#  given width, by counting through the subsets of its don't-care bits
+def iterMinterms(value, mask, width):
+    free = ((1 << width) - 1) & ~mask
+    sub = free
+    while True:
+        yield value | sub
+        if sub == 0:
+            break
+        sub = (sub - 1) & free
+
+# Tables this wide or narrower are deduplicated with a bytearray with one
+#  byte per possible minterm instead of a set
+BITMAP_MAX_WIDTH = 20
+
+# Every minterm covered by a list of cubes, sorted and without repeats
+def mintermValues(cubes, width):
+    full = (1 << width) - 1
+    if width <= BITMAP_MAX_WIDTH:
+        seen = bytearray(1 << width)
+        for value, mask in cubes:
+            if mask == full:
+                seen[value] = 1
+            else:
+                for x in iterMinterms(value, mask, width):
+                    seen[x] = 1
+        return list(compress(range(0, 1 << width), seen))
+
+    values = set()
+    for value, mask in cubes:
+        if mask == full:
+            values.add(value)
+        else:
+            values.update(iterMinterms(value, mask, width))
+    return sorted(values)
+
+# The rest of this file works on lists of (value, mask) cubes.
+# The universal cube (all don't-cares) is (0, 0).
+
+# Returns the intersection of two cubes, or None if they don't overlap
+def cubeIntersect(a, b):
+    if (a[0] ^ b[0]) & a[1] & b[1]:
+        return None
+    return a[0] | b[0], a[1] | b[1]
+
+# Does cube a contain cube b?
+def cubeContains(a, b):
+    return (a[1] & b[1]) == a[1] and ((a[0] ^ b[0]) & a[1]) == 0
+
+# Smallest cube containing all the given cubes
+def supercube(cubes):
+    value, mask = cubes[0]
+    diff = 0
+    for v, m in cubes:
+        mask &= m
+        diff |= v ^ value
+    mask &= ~diff
+    return value & mask, mask
+
+# Cofactor of a cover with respect to a cube: the cubes that overlap c
+#  with c's literals removed.
+def cofactor(cubes, c):
+    value, mask = c
+    result = []
+    for v, m in cubes:
+        if (v ^ value) & m & mask:
+            continue
+        result.append((v & ~mask, m & ~mask))
+    return result
+
+# Cofactor with respect to a single variable (bit) being 1 or 0
+def cofactorBit(cubes, bit, positive):
+    want = bit if positive else 0
+    result = []
+    for v, m in cubes:
+        if m & bit:
+            if (v & bit) != want:
+                continue
+            result.append((v & ~bit, m & ~bit))
+        else:
+            result.append((v, m))
+    return result
+
+# Picks the variable to split a cover on. Returns (bit, binate) where
+#  bit is the most binate variable (appears both as 1 and as 0 in the
+#  most cubes). If no variable is binate the most used one is returned.
+def pickSplitBit(cubes):
+    ones = {}
+    zeros = {}
+    for v, m in cubes:
+        for i in iterBits(m & v):
+            ones[i] = ones.get(i, 0) + 1
+        for i in iterBits(m & ~v):
+            zeros[i] = zeros.get(i, 0) + 1
+
+    best = None
+    bestKey = None
+    for i in set(ones) | set(zeros):
+        o = ones.get(i, 0)
+        z = zeros.get(i, 0)
+        key = (min(o, z), o + z, -i)
+        if bestKey is None or key > bestKey:
+            best = i
+            bestKey = key
+
+    if best is None:
+        return None, False
+    return 1 << best, bestKey[0] > 0
+
+# Is the cover true for every input?
+def isTautology(cubes):
+    if len(cubes) == 0:
+        return False
+    for v, m in cubes:
+        if m == 0:
+            return True
+
+    bit, binate = pickSplitBit(cubes)
+    # A unate cover is only a tautology if it has the universal cube
+    if not binate:
+        return False
+
+    return isTautology(cofactorBit(cubes, bit, True)) and isTautology(cofactorBit(cubes, bit, False))
+
+# Computes a cover of the complement (OFF-set) of a cover with the
+#  unate recursive paradigm: literals that every cube shares are pulled
+#  out first, then the cover is split on its most binate variable
+#  (Shannon expansion) until the pieces are trivial. Cubes that end up
+#  contained in another cube are dropped at the end.
+def complementCubes(cubes):
+    return removeContained(complementRecursive(cubes))
+
+def complementRecursive(cubes):
+    if len(cubes) == 0:
+        return [(0, 0)]
+    for v, m in cubes:
+        if m == 0:
+            return []
+
+    if len(cubes) == 1:
+        return flipLiterals(cubes[0])
+
+    # F = c G gives F' = c' + G'
+    common = supercube(cubes)
+    if common[1] != 0:
+        return flipLiterals(common) + complementRecursive(cofactor(cubes, common))
+
+    bit, binate = pickSplitBit(cubes)
+    positive = complementRecursive(cofactorBit(cubes, bit, True))
+    negative = complementRecursive(cofactorBit(cubes, bit, False))
+
+    if not binate:
+        # Unate in this variable, so one cofactor contains the other and
+        #  the other way around for their complements. If the variable
+        #  only shows up as 1 then F0 <= F1 and F' = F1' + x' F0', so the
+        #  cubes of F1' don't need the literal and the cubes of F0' that
+        #  they contain can go.
+        if any(m & bit and v & bit for v, m in cubes):
+            return positive + [(v, m | bit) for v, m in dropContained(negative, positive)]
+        return negative + [(v | bit, m | bit) for v, m in dropContained(positive, negative)]
+
+    # Cubes that show up on both sides don't depend on the variable
+    shared = set(positive) & set(negative)
+    result = list(shared)
+    for v, m in positive:
+        if (v, m) not in shared:
+            result.append((v | bit, m | bit))
+    for v, m in negative:
+        if (v, m) not in shared:
+            result.append((v, m | bit))
+    return result
+
+# Substitutes covers for the inputs of a cover. inputs[k] holds the
+#  (ones, zeros) covers of column k (the left most column is the highest
+#  bit of a cube). Each cube turns into the intersection of the covers
+#  its literals pick, and the result is cleaned up as it goes so it
+#  stays close to the size of the function rather than the product of
+#  the covers.
+def composeCover(cubes, inputs):
+    top = len(inputs) - 1
+    result = []
+    for value, mask in cubes:
+        literals = []
+        for i in iterBits(mask):
+            literals.append(inputs[top - i][0 if value >> i & 1 else 1])
+        # Narrow covers first so the product stays small
+        literals.sort(key=len)
+
+        product = [(0, 0)]
+        for cover in literals:
+            product = intersectCovers(product, cover)
+            if len(product) == 0:
+                break
+        result.extend(product)
+    return simplifyCover(result)
+
+# The AND of two covers
+def intersectCovers(a, b):
+    result = []
+    for x in a:
+        for y in b:
+            c = cubeIntersect(x, y)
+            if c is not None:
+                result.append(c)
+    return simplifyCover(result)
+
+# Cheap cleanup that keeps the same function: merges cubes that only
+#  differ in one literal and drops cubes contained in another one
+def simplifyCover(cubes):
+    if len(cubes) <= 1:
+        return cubes
+    return removeContained(mergeAdjacent(cubes))
+
+# x c + x' c = c, repeated until no such pair is left
+def mergeAdjacent(cubes):
+    cubes = set(cubes)
+    pending = list(cubes)
+    while len(pending) > 0:
+        c = pending.pop()
+        if c not in cubes:
+            continue
+        v, m = c
+        for i in iterBits(m):
+            bit = 1 << i
+            other = (v ^ bit, m)
+            if other in cubes:
+                cubes.discard(c)
+                cubes.discard(other)
+                merged = (v & ~bit, m & ~bit)
+                cubes.add(merged)
+                pending.append(merged)
+                break
+    return list(cubes)
+
+# De Morgan for one cube: one cube per literal, with that literal flipped
+def flipLiterals(c):
+    return [((~c[0]) & bit, bit) for bit in (1 << i for i in iterBits(c[1]))]
+
+# The cubes that no cube of others contains
+def dropContained(cubes, others):
+    if len(cubes) * len(others) <= 256:
+        return [c for c in cubes if not any(cubeContains(o, c) for o in others)]
+    index = CubeIndex(cubes)
+    contained = 0
+    for o in others:
+        contained |= index.containedIn(o)
+    return [c for k, c in enumerate(cubes) if not (contained >> k & 1)]
+
+# Drops cubes that are contained in another cube of the cover
+def removeContained(cover):
+    # Bigger cubes (fewer literals) go first so they remove the small ones
+    cover = sorted(cover, key=lambda c: popcount(c[1]))
+    index = CubeIndex(cover)
+    removed = 0
+    for pos, c in enumerate(cover):
+        if removed >> pos & 1:
+            continue
+        removed |= index.containedIn(c) & ~(1 << pos)
+    return [c for pos, c in enumerate(cover) if not (removed >> pos & 1)]
+
+# Per-variable bitsets over the positions of a list of cubes. Bit p of
+#  ones[i] is set when cube p has a 1 for variable i (zeros[i] likewise),
+#  which turns questions about a whole cover into a few big-int ANDs and
+#  ORs instead of a loop over every cube.
+class CubeIndex:
+    __slots__ = ("cubes", "ones", "zeros", "all")
+
+    def __init__(self, cubes):
+        self.cubes = cubes
+        self.ones = {}
+        self.zeros = {}
+        self.all = (1 << len(cubes)) - 1
+        for pos, (v, m) in enumerate(cubes):
+            bit = 1 << pos
+            for i in iterBits(m & v):
+                self.ones[i] = self.ones.get(i, 0) | bit
+            for i in iterBits(m & ~v):
+                self.zeros[i] = self.zeros.get(i, 0) | bit
+
+    # Cubes that have the opposite literal of c for variable i
+    def opposing(self, c, i):
+        if c[0] >> i & 1:
+            return self.zeros.get(i, 0)
+        return self.ones.get(i, 0)
+
+    # Cubes that overlap cube c
+    def overlapping(self, c):
+        apart = 0
+        for i in iterBits(c[1]):
+            apart |= self.opposing(c, i)
+        return self.all & ~apart
+
+    # Cubes that are contained in cube c
+    def containedIn(self, c):
+        inside = self.all
+        for i in iterBits(c[1]):
+            if c[0] >> i & 1:
+                inside &= self.ones.get(i, 0)
+            else:
+                inside &= self.zeros.get(i, 0)
+        return inside
+
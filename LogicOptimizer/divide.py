@@ -0,0 +1,153 @@
+from cube import *
+from TruthTable import *
+from budget import *
+
+# Covers that depend on this many inputs or fewer are handed to
+#  Quine-McCluskey instead of being split further.
+COFACTOR_LEAF_INPUTS = 8
+
+# Divide-and-conquer minimization for tables too wide for flat QM.
+#
+# The ON-set cover is split on its most binate variable x into the
+#  cofactors F1 (x = 1) and F0 (x = 0), which are minimized on their own
+#  and put back together as x.G1 + x'.G0. Splitting stops once a cover
+#  depends on at most leafInputs inputs; those are given to leafSolver,
+#  which takes a TruthTable and returns the rows of its new cover (the
+#  exact QM path).
+#
+# Every subproblem is first moved down onto the inputs it depends on,
+#  so the same function on different inputs looks the same. Results are
+#  memoized by the leaf's truth table or, above the leaves, by its
+#  sorted cubes; cofactors of structured functions (adders, comparators,
+#  muxes) repeat a lot.
+#
+# The result is made of cubes that are prime within their own cofactor,
+#  so it isn't necessarily minimum.
+class CofactorMinimizer:
+    def __init__(self, leafSolver, leafInputs=COFACTOR_LEAF_INPUTS, budget=None):
+        self.leafSolver = leafSolver
+        self.leafInputs = leafInputs
+        self.budget = budget
+        self.memo = {}
+        self.hits = 0
+        self.leaves = 0
+        self.splits = 0
+
+    # Returns a minimized cover of the cubes
+    def minimize(self, cubes):
+        if len(cubes) == 0:
+            return []
+
+        support = 0
+        for v, m in cubes:
+            if m == 0:
+                # The universal cube covers everything
+                return [(0, 0)]
+            support |= m
+
+        # Move the support down to the low bits, keeping its order
+        bits = sorted(iterBits(support), reverse=True)
+        width = len(bits)
+        gathered = removeContained(list(set(gatherBits(cubes, bits))))
+
+        if width <= self.leafInputs:
+            key = ("leaf", width, functionOf(gathered, width))
+        else:
+            key = ("cover", width, tuple(sorted(gathered)))
+
+        cover = self.memo.get(key)
+        if cover is None:
+            if width <= self.leafInputs:
+                cover = self.minimizeLeaf(gathered, width)
+            else:
+                cover = self.minimizeSplit(gathered)
+            self.memo[key] = cover
+        else:
+            self.hits += 1
+
+        return scatterBits(cover, bits)
+
+    def minimizeLeaf(self, cubes, width):
+        self.leaves += 1
+        names = ["x{}".format(i) for i in range(0, width)] + ["f"]
+        rows = self.leafSolver(TruthTable.fromCubes(names, cubes, []))
+        return [rowToCube(row) for row, output in rows]
+
+    def minimizeSplit(self, cubes):
+        if self.budget is not None:
+            self.budget.check()
+        self.splits += 1
+        bit, binate = pickSplitBit(cubes)
+        positive = cofactorBit(cubes, bit, True)
+        negative = cofactorBit(cubes, bit, False)
+        positiveCover = self.minimize(positive)
+        negativeCover = self.minimize(negative)
+
+        # A cube from one side that is also inside the other cofactor
+        #  doesn't need the split literal, and can then swallow cubes
+        #  from the other side
+        shared = set(positiveCover) & set(negativeCover)
+        merged = list(shared)
+        for cover, other, literal in ((positiveCover, negative, bit), (negativeCover, positive, 0)):
+            index = CubeIndex(other)
+            for v, m in cover:
+                if (v, m) in shared:
+                    continue
+                # Only the cubes that overlap it matter
+                overlapping = [other[pos] for pos in iterBits(index.overlapping((v, m)))]
+                if isTautology(cofactor(overlapping, (v, m))):
+                    merged.append((v, m))
+                else:
+                    merged.append((v | literal, m | bit))
+        return removeContained(merged)
+
+# Minimizes a truth table by splitting it into cofactors (see
+#  CofactorMinimizer) and returns the rows of the new cover. If stats are
+#  given (see stats.py) the splits, leaves and reused subproblems are
+#  counted in them.
+def cofactorTruthTable(tt, leafSolver, leafInputs=COFACTOR_LEAF_INPUTS, debug=False, budget=None, stats=None):
+    width = tt.width()
+    onSet = tt.ones
+    if len(onSet) == 0 and len(tt.zeros) > 0:
+        # Only the OFF-set was given
+        onSet = complementCubes(tt.zeros)
+
+    minimizer = CofactorMinimizer(leafSolver, leafInputs=leafInputs, budget=budget)
+    try:
+        cover = minimizer.minimize(onSet)
+    finally:
+        if stats is not None:
+            stats.count("cofactorSplits", minimizer.splits)
+            stats.count("cofactorLeaves", minimizer.leaves)
+            stats.count("cofactorMemoHits", minimizer.hits)
+
+    if debug:
+        print("Cofactor split {} times into {} leaves ({} memoized subproblems reused).".format(
+            minimizer.splits, minimizer.leaves, minimizer.hits))
+
+    rows = []
+    for value, mask in cover:
+        rows.append([cubeToRow(value, mask, width), "1"])
+    return rows
+
+# The ON-set of a cover as one bit per minterm
+def functionOf(cubes, width):
+    bits = 0
+    for value in mintermValues(cubes, width):
+        bits |= 1 << value
+    return bits
+
+# Undoes gatherBits: moves the low bits of each cube back up to the
+#  given bits, with the left most column going to bits[0]
+def scatterBits(cubes, bits):
+    top = len(bits) - 1
+    result = []
+    for v, m in cubes:
+        value = 0
+        mask = 0
+        for k, i in enumerate(bits):
+            if m >> (top - k) & 1:
+                mask |= 1 << i
+                value |= (v >> (top - k) & 1) << i
+        result.append((value, mask))
+    return result
@@ -0,0 +1,169 @@
+from cube import *
+from budget import *
+
+# How many REDUCE/EXPAND/IRREDUNDANT passes to run at most
+DEFAULT_MAX_PASSES = 8
+
+# Heuristic two-level minimization in the style of Espresso.
+#
+# Works directly on the cubes of the truth table instead of enumerating
+#  minterms and prime implicants, so it handles wide tables that are out
+#  of reach for Quine-McCluskey. The result is a cover that is
+#  irredundant and made of primes, but not necessarily minimum.
+#
+# Returns the rows of the new cover, in the same format TruthTable uses.
+def espressoTruthTable(tt, maxPasses=DEFAULT_MAX_PASSES, debug=False, budget=None):
+    width = len(tt.getInputNames())
+    onSet = tt.ones
+    if len(tt.zeros) > 0:
+        offSet = tt.zeros
+        # A table given only by its "0" rows is on everywhere else
+        if len(onSet) == 0:
+            onSet = complementCubes(offSet)
+    else:
+        offSet = complementCubes(onSet)
+
+    cover = espresso(onSet, offSet, maxPasses=maxPasses, debug=debug, budget=budget)
+
+    rows = []
+    for value, mask in cover:
+        rows.append([cubeToRow(value, mask, width), "1"])
+    return rows
+
+# Every step leaves a valid cover, so if the budget runs out the cover so
+#  far is returned (budget.exceeded says so).
+def espresso(onSet, offSet, maxPasses=DEFAULT_MAX_PASSES, debug=False, budget=None):
+    cover = removeContained(list(set(onSet)))
+    if len(cover) == 0:
+        return cover
+
+    cover = expandCover(cover, offSet, budget)
+    cover = irredundantCover(cover, budget)
+    cost = coverCost(cover)
+    if debug:
+        print("Espresso: {} cubes after first expand (cost {}).".format(len(cover), cost))
+
+    for p in range(0, maxPasses):
+        if budget is not None and budget.spent():
+            break
+
+        candidate = reduceCover(cover, budget)
+        candidate = expandCover(candidate, offSet, budget)
+        candidate = irredundantCover(candidate, budget)
+        candidateCost = coverCost(candidate)
+        if debug:
+            print("Espresso: pass {} gave {} cubes (cost {}).".format(p + 1, len(candidate), candidateCost))
+
+        if candidateCost >= cost:
+            break
+        cover = candidate
+        cost = candidateCost
+
+    return cover
+
+# Number of cubes, then number of literals
+def coverCost(cover):
+    return len(cover), sum(popcount(m) for v, m in cover)
+
+# EXPAND: make each cube as large as possible without touching the
+#  OFF-set, then drop the cubes that the expanded cube now contains.
+def expandCover(cover, offSet, budget=None):
+    # Count how often each variable is 1 or 0 across the cover. Raising a
+    #  literal that the other cubes disagree with is most likely to let
+    #  this cube swallow them.
+    ones = {}
+    zeros = {}
+    for v, m in cover:
+        for i in iterBits(m & v):
+            ones[i] = ones.get(i, 0) + 1
+        for i in iterBits(m & ~v):
+            zeros[i] = zeros.get(i, 0) + 1
+
+    # Expand the smallest cubes first, they are the least likely to be
+    #  covered by something else.
+    order = sorted(cover, key=lambda c: -popcount(c[1]))
+    onIndex = CubeIndex(order)
+    offIndex = CubeIndex(offSet)
+    covered = 0
+    expanded = []
+    for pos, c in enumerate(order):
+        if covered >> pos & 1:
+            continue
+        if budget is not None and budget.spent():
+            # Out of budget, keep the rest as they are
+            expanded.append(c)
+            continue
+
+        value, mask = c
+        # For each literal, the OFF-set cubes it keeps away from this cube.
+        #  Every OFF-set cube has to stay apart on at least one literal.
+        apart = {}
+        for i in iterBits(mask):
+            apart[i] = offIndex.opposing(c, i)
+
+        def score(i):
+            if value >> i & 1:
+                return zeros.get(i, 0)
+            return ones.get(i, 0)
+
+        while True:
+            # Find the OFF-set cubes that only one literal keeps away.
+            #  That literal can't be raised.
+            once = 0
+            twice = 0
+            for s in apart.values():
+                twice |= once & s
+                once |= s
+            onlyOnce = once & ~twice
+
+            candidates = [i for i in apart if not (apart[i] & onlyOnce)]
+            if len(candidates) == 0:
+                break
+
+            i = max(candidates, key=lambda i: (score(i), i))
+            del apart[i]
+            value &= ~(1 << i)
+            mask &= ~(1 << i)
+
+        expanded.append((value, mask))
+        covered |= onIndex.containedIn((value, mask))
+
+    return removeContained(expanded)
+
+# IRREDUNDANT: remove cubes that are covered by the rest of the cover
+def irredundantCover(cover, budget=None):
+    # Try to drop the smallest cubes first
+    cover = sorted(cover, key=lambda c: -popcount(c[1]))
+    index = CubeIndex(cover)
+    kept = index.all
+    for pos, c in enumerate(cover):
+        if budget is not None and budget.spent():
+            break
+        others = index.overlapping(c) & kept & ~(1 << pos)
+        if isTautology(cofactor([cover[p] for p in iterBits(others)], c)):
+            kept &= ~(1 << pos)
+    return [c for pos, c in enumerate(cover) if kept >> pos & 1]
+
+# REDUCE: shrink each cube to the smallest cube that still covers the
+#  part of the function that no other cube covers. This gives EXPAND a
+#  chance to grow it in a different direction next pass.
+def reduceCover(cover, budget=None):
+    # Reduce the largest cubes first
+    cover = sorted(cover, key=lambda c: popcount(c[1]))
+    # Reduced cubes only ever shrink, so anything that overlaps a reduced
+    #  cube also overlaps the original one
+    index = CubeIndex(cover)
+    reduced = list(cover)
+    for pos, c in enumerate(cover):
+        if budget is not None and budget.spent():
+            break
+        c = reduced[pos]
+        others = index.overlapping(c) & ~(1 << pos)
+        uncovered = complementCubes(cofactor([reduced[p] for p in iterBits(others)], c))
+        if len(uncovered) == 0:
+            # Fully covered by the other cubes, leave it for IRREDUNDANT
+            continue
+        smaller = cubeIntersect(c, supercube(uncovered))
+        if smaller is not None:
+            reduced[pos] = smaller
+    return reduced
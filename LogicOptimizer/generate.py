@@ -1,56 +1,183 @@
+from argparse import *
+from itertools import combinations
 import random
 
-filename = "../TestFiles/large2.blif"
-width = 28
-rowCount = 3000
-p1 = 0.9
+# Generators for test BLIFs. Every family takes (width, density, rng) and
+#  returns (inputs, outputs, tables), where each table is (names, rows)
+#  and the rows are "1-0 1" style strings. width is the number of inputs;
+#  density is how much of the function is ON, for the families where that
+#  can be picked (the others ignore it). rng is a random.Random, so the
+#  same seed always makes the same file.
 
-with open(filename, "w") as f:
-    f.write(".model GenericName")
-    f.write("\n\n")
+# Random tables with more rows than this take too long to make and to
+#  optimize
+RANDOM_MAX_ROWS = 4000
 
-    names = []
+# density of the ON-set: each minterm is in it with this probability,
+#  up to RANDOM_MAX_ROWS rows. p1 is how likely each bit of a row is to
+#  be 1; with p1 other than 0.5 the rows are drawn one at a time (this is
+#  how large2.blif was made).
+def randomFunction(width, density, rng, rowCount=None, p1=0.5):
+    if rowCount is None:
+        rowCount = min(RANDOM_MAX_ROWS, max(1, int(density * (1 << width))))
+    if rowCount > (1 << width):
+        raise Exception("Can't make {} distinct rows with {} inputs.".format(rowCount, width))
 
-    f.write(".inputs ")
-    for x in range(0, width):
-        n = "inp{}".format(x)
-        names.append(n)
-        f.write(n)
-        if x != (width-1):
-            f.write(" ")
-    f.write("\n\n")
+    if p1 == 0.5:
+        values = rng.sample(range(0, 1 << width), rowCount)
+    else:
+        values = set()
+        while len(values) < rowCount:
+            value = 0
+            for b in range(0, width):
+                value <<= 1
+                if rng.uniform(0, 1) < p1:
+                    value |= 1
+            values.add(value)
 
-    f.write(".outputs out1")
-    names.append("out1")
-    f.write("\n\n")
+    inputs = inputNames(width)
+    rows = [mintermRow(value, width) + " 1" for value in values]
+    return inputs, ["out1"], [(inputs + ["out1"], sorted(rows))]
 
+# On when the number of 1 inputs is one of a random set of counts. Each
+#  count is picked with probability density.
+def symmetricFunction(width, density, rng):
+    counts = [k for k in range(0, width + 1) if rng.uniform(0, 1) < density]
+    if len(counts) == 0:
+        counts = [rng.randint(0, width)]
 
-    # Write values
-    f.write(".names ")
-    for name in names:
-        f.write(name)
-        if name != names[-1]:
-            f.write(" ")
+    rows = []
+    for k in counts:
+        for ones in combinations(range(0, width), k):
+            row = ["0"] * width
+            for i in ones:
+                row[i] = "1"
+            rows.append("".join(row) + " 1")
 
-    f.write("\n")
+    inputs = inputNames(width)
+    return inputs, ["out1"], [(inputs + ["out1"], sorted(rows))]
 
-    rows = []
-    while len(rows) < rowCount:
-        row = ""
-        for b in range(0,width):
-            if random.uniform(0,1) < p1:
-                row += "1"
-            else:
-                row += "0"
-        row += " 1"
-        if row not in rows:
-            rows.append(row)
-
-    rows.sort()
-    for row in rows:
-        f.write(row)
-        f.write("\n")
+# On when a random weighted sum of the inputs reaches a threshold. The
+#  threshold is picked so about density of the minterms are on.
+def thresholdFunction(width, density, rng):
+    weights = [rng.randint(1, width) for i in range(0, width)]
+    sums = []
+    for value in range(0, 1 << width):
+        total = 0
+        for i in range(0, width):
+            if value >> (width - 1 - i) & 1:
+                total += weights[i]
+        sums.append(total)
 
-    f.write("\n")
+    ordered = sorted(sums)
+    threshold = ordered[min(len(ordered) - 1, int((1 - density) * len(ordered)))]
+    rows = [mintermRow(value, width) + " 1" for value in range(0, 1 << width) if sums[value] >= threshold]
+
+    inputs = inputNames(width)
+    return inputs, ["out1"], [(inputs + ["out1"], rows)]
+
+# On when an odd number of inputs are 1. Has no two adjacent minterms, so
+#  nothing merges.
+def parityFunction(width, density, rng):
+    rows = [mintermRow(value, width) + " 1" for value in range(0, 1 << width) if bin(value).count("1") % 2 == 1]
+
+    inputs = inputNames(width)
+    return inputs, ["out1"], [(inputs + ["out1"], rows)]
+
+# The top slice of a ripple carry adder of width / 2 bits: the last sum
+#  bit and the carry out. The carries are tables of their own, so the
+#  slice has to be merged into one level.
+def adderSlice(width, density, rng):
+    bits = max(1, width // 2)
+    a = ["a{}".format(i) for i in range(0, bits)]
+    b = ["b{}".format(i) for i in range(0, bits)]
+
+    tables = []
+    carry = None
+    for i in range(0, bits):
+        nextCarry = "cout" if i == bits - 1 else "c{}".format(i + 1)
+        if carry is None:
+            if i == bits - 1:
+                tables.append(([a[i], b[i], "s{}".format(i)], ["10 1", "01 1"]))
+            tables.append(([a[i], b[i], nextCarry], ["11 1"]))
+        else:
+            if i == bits - 1:
+                tables.append(([a[i], b[i], carry, "s{}".format(i)], ["100 1", "010 1", "001 1", "111 1"]))
+            tables.append(([a[i], b[i], carry, nextCarry], ["11- 1", "1-1 1", "-11 1"]))
+        carry = nextCarry
+
+    return a + b, ["s{}".format(bits - 1), "cout"], tables
+
+# A tree of 2:1 muxes with as many select bits as fit in width (k select
+#  bits need k + 2^k inputs). Each level of the tree is its own tables.
+def muxFunction(width, density, rng):
+    selects = 0
+    while selects + 1 + (1 << (selects + 1)) <= width:
+        selects += 1
+    selects = max(1, selects)
+
+    s = ["s{}".format(i) for i in range(0, selects)]
+    level = ["d{}".format(i) for i in range(0, 1 << selects)]
+    inputs = s + level
+
+    tables = []
+    for l in range(0, selects):
+        nextLevel = []
+        for j in range(0, len(level) // 2):
+            name = "out1" if len(level) == 2 else "m{}_{}".format(l, j)
+            tables.append(([s[l], level[2 * j], level[2 * j + 1], name], ["01- 1", "1-1 1"]))
+            nextLevel.append(name)
+        level = nextLevel
+
+    return inputs, ["out1"], tables
+
+FAMILIES = {
+    "random": randomFunction,
+    "symmetric": symmetricFunction,
+    "threshold": thresholdFunction,
+    "parity": parityFunction,
+    "adder": adderSlice,
+    "mux": muxFunction,
+}
+
+def inputNames(width):
+    return ["inp{}".format(x) for x in range(0, width)]
+
+# The row of a minterm, with the left most column as its highest bit
+def mintermRow(value, width):
+    return format(value, "0{}b".format(width)) if width > 0 else ""
+
+def generate(family, width, density=0.5, seed=0):
+    if family not in FAMILIES:
+        raise Exception("Unknown function family {}.".format(family))
+    return FAMILIES[family](width, density, random.Random(seed))
+
+def writeGenerated(f, inputs, outputs, tables, modelName="GenericName"):
+    f.write(".model {}\n\n".format(modelName))
+    f.write(".inputs {}\n\n".format(" ".join(inputs)))
+    f.write(".outputs {}\n\n".format(" ".join(outputs)))
+    for names, rows in tables:
+        f.write(".names {}\n".format(" ".join(names)))
+        for row in rows:
+            f.write(row)
+            f.write("\n")
+        f.write("\n")
     f.write(".end\n")
     f.write("\n")
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Generate a test BLIF.")
+    parser.add_argument("family", choices=sorted(FAMILIES))
+    parser.add_argument("-o", dest="outputFile", type=FileType('w'), default="./generated.blif", action='store')
+    parser.add_argument("-w", dest="width", help="Number of inputs.", type=int, default=12)
+    parser.add_argument("--density", dest="density", help="How much of the function is on (random, symmetric and threshold).", type=float, default=0.5)
+    parser.add_argument("--seed", dest="seed", type=int, default=0)
+    parser.add_argument("--rows", dest="rowCount", help="Number of rows (random only, instead of --density).", type=int, default=None)
+    parser.add_argument("--p1", dest="p1", help="How likely each bit of a row is to be 1 (random only).", type=float, default=0.5)
+    args = parser.parse_args()
+
+    if args.family == "random":
+        generated = randomFunction(args.width, args.density, random.Random(args.seed), rowCount=args.rowCount, p1=args.p1)
+    else:
+        generated = generate(args.family, args.width, args.density, args.seed)
+    writeGenerated(args.outputFile, *generated)
@@ -0,0 +1,138 @@
+import os
+from cube import *
+
+# NumPy is optional. Without it Quine-McCluskey stars terms one pair at
+#  a time in Python (see findPrimeImplicants in optimize.py).
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# A term is packed into one uint64 as mask << 32 | value, so the kernel
+#  only handles tables up to 32 inputs wide.
+KERNEL_MAX_WIDTH = 32
+# Output tags are a uint64 too
+KERNEL_MAX_OUTPUTS = 64
+# Smaller batches aren't worth converting to arrays
+KERNEL_MIN_TERMS = 256
+
+MASK_SHIFT = 32
+
+# Columns smaller than this are starred in this process even when a pool
+#  is available, since sending them to the workers costs more than it saves.
+PARALLEL_COLUMN_MIN_TERMS = 20000
+
+# Can the vectorized kernel star this batch?
+def kernelSupports(width, terms, maxTag):
+    return (numpy is not None and width <= KERNEL_MAX_WIDTH and terms >= KERNEL_MIN_TERMS
+            and maxTag < (1 << KERNEL_MAX_OUTPUTS))
+
+# Quine-McCluskey's star phase on NumPy arrays.
+#
+# Each column is a sorted array of packed terms (with a matching array
+#  of output tags). For every bit, the terms that have it as a cared-about
+#  0 look for their partner (the same term with that bit set) with one
+#  binary search over the whole column, so a column costs width vectorized
+#  passes instead of a Python call per pair. The merged terms of all bits
+#  are deduplicated with numpy.unique to make the next column.
+#
+# Tags work like in starAdjacentGroups: terms only merge if they share an
+#  output, and a term only counts as used if the merged term kept all of
+#  its outputs.
+#
+# The bits don't depend on each other, so if a pool is given, columns
+#  with at least PARALLEL_COLUMN_MIN_TERMS terms have their bits split
+#  between its workers (see starColumnBits).
+#
+# Takes the values and tags of the minterms, and returns every prime
+#  implicant as (value, mask, tag). If stats are given (see stats.py)
+#  every column's size and star attempts are added to them.
+def starColumnsVectorized(values, tags, width, debug=False, budget=None, stats=None, pool=None):
+    full = (1 << width) - 1
+    keys = numpy.array(values, dtype=numpy.uint64) | numpy.uint64(full << MASK_SHIFT)
+    tags = numpy.array(tags, dtype=numpy.uint64)
+    keys, first = numpy.unique(keys, return_index=True)
+    tags = tags[first]
+
+    # Every worker gets every chunks-th bit, so the low and high bits are
+    #  spread out between them
+    chunks = min(width, os.cpu_count() or 1)
+
+    primes = []
+    column = 0
+    while len(keys) > 0:
+        if budget is not None:
+            budget.check()
+        if debug:
+            print("Starring {} terms with the vectorized kernel.".format(len(keys)))
+
+        if pool is not None and chunks > 1 and len(keys) >= PARALLEL_COLUMN_MIN_TERMS:
+            futures = [pool.submit(starColumnBits, keys, tags, list(range(k, width, chunks))) for k in range(0, chunks)]
+            results = [future.result() for future in futures]
+        else:
+            results = [starColumnBits(keys, tags, range(0, width))]
+
+        used = numpy.zeros(len(keys), dtype=bool)
+        nextKeys = []
+        nextTags = []
+        attempts = 0
+        for usedIndices, merged, mergedTags, tried in results:
+            used[usedIndices] = True
+            nextKeys.append(merged)
+            nextTags.append(mergedTags)
+            attempts += tried
+
+        if stats is not None:
+            stats.column(column, len(keys), attempts, sum(len(merged) for merged in nextKeys))
+        column += 1
+
+        # Anything that never merged is a prime implicant
+        for key, tag in zip(keys[~used].tolist(), tags[~used].tolist()):
+            primes.append((key & full, key >> MASK_SHIFT, tag))
+
+        keys = numpy.concatenate(nextKeys)
+        if len(keys) == 0:
+            break
+        keys, first = numpy.unique(keys, return_index=True)
+        tags = numpy.concatenate(nextTags)[first]
+
+    return primes
+
+# Stars a column of the vectorized kernel on the given bits only. Returns
+#  the indices of the terms that were used, the merged terms and their
+#  tags, and how many partners were looked for.
+def starColumnBits(keys, tags, bits):
+    zero = numpy.uint64(0)
+    last = len(keys) - 1
+    used = []
+    nextKeys = [numpy.zeros(0, dtype=numpy.uint64)]
+    nextTags = [numpy.zeros(0, dtype=numpy.uint64)]
+    attempts = 0
+    for i in bits:
+        bit = numpy.uint64(1 << i)
+        maskBit = numpy.uint64(1 << (i + MASK_SHIFT))
+
+        # Terms that care about this bit and have it as 0
+        lesser = numpy.nonzero(((keys & maskBit) != zero) & ((keys & bit) == zero))[0]
+        if len(lesser) == 0:
+            continue
+        attempts += len(lesser)
+        partners = keys[lesser] | bit
+        greater = numpy.minimum(numpy.searchsorted(keys, partners), last)
+        found = keys[greater] == partners
+        lesser = lesser[found]
+        greater = greater[found]
+
+        merged = tags[lesser] & tags[greater]
+        shares = merged != zero
+        lesser = lesser[shares]
+        greater = greater[shares]
+        merged = merged[shares]
+
+        used.append(lesser[merged == tags[lesser]])
+        used.append(greater[merged == tags[greater]])
+        nextKeys.append(keys[lesser] & ~maskBit)
+        nextTags.append(merged)
+
+    usedIndices = numpy.concatenate(used) if len(used) > 0 else numpy.zeros(0, dtype=numpy.intp)
+    return usedIndices, numpy.concatenate(nextKeys), numpy.concatenate(nextTags), attempts
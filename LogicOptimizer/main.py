@@ -1,6 +1,5 @@
 from argparse import *
-from blif import *
-from optimize import *
+from pipeline import *
 
 # Get input/output files
 parser = ArgumentParser(description="LogicOpt - The better logic optimizer.")
@@ -10,33 +9,88 @@ parser.add_argument("-o", dest="outputFile", type=FileType('w'), default="./outp
 parser.add_argument("-t", dest="runBLIFTests", help="Run the BLIF import/export tests.", action='store_const', default=False, const=True)
 parser.add_argument("-d", dest="showDebug", help="Show debug info.", action='store_const', default=False, const=True)
 parser.add_argument("-v", dest="verifyBLIF", help="Verify the optimized BLIF against the original.", action='store_const', default=False, const=True)
+parser.add_argument("--verify-engine", dest="verifyEngine", help="How -v checks the result: bit-parallel simulation (sim), a formal BDD proof (bdd) or a SAT miter proof (sat).", choices=["sim", "bdd", "sat"], default="sim")
+parser.add_argument("--bdd-reorder", dest="bddReorder", help="Sift the BDD variable order before checking with --verify-engine bdd.", action='store_const', default=False, const=True)
+parser.add_argument("--engine", dest="engine", help="Minimization engine: exact Quine-McCluskey (qm), heuristic espresso for wide tables, or QM on cofactors for wide structured tables (cofactor).", choices=["qm", "espresso", "cofactor"], default="qm")
+parser.add_argument("-j", dest="jobs", help="Number of worker processes to optimize with.", type=int, default=1)
+parser.add_argument("--npn-max-inputs", dest="npnMaxInputs", help="Tables with up to this many inputs that match up to input permutation and negation are only optimized once (0 turns it off).", type=int, default=NPN_MAX_INPUTS)
+parser.add_argument("--multi-output", dest="multiOutput", help="Minimize tables with the same inputs together so they can share terms (qm engine only).", action='store_const', default=False, const=True)
+parser.add_argument("--cache-dir", dest="cacheDir", help="Directory of a result cache shared between runs. Tables that were optimized before are read from it.", default=None)
+parser.add_argument("--cache-size", dest="cacheSize", help="Megabytes the result cache may use before old entries are removed.", type=float, default=DEFAULT_CACHE_BYTES / (1024 * 1024))
+parser.add_argument("--qm-memory", dest="qmMemory", help="Megabytes of memory QM columns may use before they are kept in temporary files instead (needs NumPy).", type=float, default=None)
+parser.add_argument("--time-limit", dest="timeLimit", help="Seconds each table may take. A table that runs out keeps the best cover found so far, or its original rows.", type=float, default=None)
+parser.add_argument("--run-time-limit", dest="runTimeLimit", help="Seconds the whole optimization may take. Tables still running when it's up are cut short the same way.", type=float, default=None)
+parser.add_argument("--mem-limit", dest="memLimit", help="Megabytes of memory optimizing a table may add to the process doing it before the table is cut short.", type=float, default=None)
+parser.add_argument("--cover-time", dest="coverTimeLimit", help="Seconds to spend searching for a minimum cover before settling for the best found.", type=float, default=10.0)
+parser.add_argument("--stats", dest="stats", help="Time every phase and table, count what QM and the cover solver did, and print it at the end.", choices=["json", "text"], default=None)
+parser.add_argument("--stats-file", dest="statsFile", help="Write the --stats output to this file instead.", type=FileType('w'), default=None)
+parser.add_argument("--profile", dest="profileFile", help="Profile the run with cProfile and save the profile to this file.", default=None)
+parser.add_argument("--sample", dest="sampleFile", help="Sample the stack while running and save the samples as collapsed stacks (for flame graphs) to this file.", default=None)
+parser.add_argument("--sample-interval", dest="sampleInterval", help="Milliseconds between --sample samples.", type=float, default=5.0)
 
 args = parser.parse_args()
 
+stats = None
+if args.stats is not None:
+    stats = Stats()
+profiler = None
+if args.profileFile is not None:
+    profiler = Profiler()
+    profiler.start()
+sampler = None
+if args.sampleFile is not None:
+    sampler = Sampler(args.sampleInterval / 1000.0)
+    sampler.start()
+
 # Should we test the BLIF importer/exporter?
 if args.runBLIFTests:
     runBLIFTests()
 
-# Actually read in the blif
-blif = read_blif(args.inputFile, createTopLevelMerged=True, debug=args.showDebug)
-
 # Optimize
-optimzieBLIF(blif, debug=args.showDebug)
+cache = None
+if args.cacheDir is not None:
+    cache = ResultCache(args.cacheDir, maxBytes=int(args.cacheSize * 1024 * 1024))
+result = optimizeFile(args.inputFile, args.outputFile, debug=args.showDebug,
+                      verifyEngine=args.verifyEngine if args.verifyBLIF else None, bddReorder=args.bddReorder,
+                      stats=stats, coverTimeLimit=args.coverTimeLimit, engine=args.engine, jobs=args.jobs,
+                      cache=cache, npnMaxInputs=args.npnMaxInputs, multiOutput=args.multiOutput,
+                      memoryBudget=None if args.qmMemory is None else int(args.qmMemory * 1024 * 1024),
+                      timeLimit=args.timeLimit, runTimeLimit=args.runTimeLimit,
+                      memLimit=None if args.memLimit is None else int(args.memLimit * 1024 * 1024))
+if cache is not None:
+    print(cache.summary())
+cutShort = result["cutShort"]
+for name in sorted(cutShort):
+    print("Optimization of {} was cut short by the {} limit.".format(name, cutShort[name]))
 
 print("")
 
-# Export the optimized blif
-write_blif(blif, args.outputFile)
-
 if args.verifyBLIF:
     print("Verifying that optimized BLIF implements same logic...")
-    mergeAllIntoTopLevel(blif)
-    originalBlif = read_blif(args.inputFile, createTopLevelMerged=True, debug=args.showDebug)
-
-    if blifs_equal(originalBlif, blif) is not True:
+    counterexample = result["counterexample"]
+    if counterexample is not None:
         print("Error, blifs not equal. The logic optimizer failed.")
-        print(blif.bigString())
-        print(originalBlif.bigString())
+        print("Output {} is {} in the original and {} in the optimized BLIF for inputs:".format(
+            counterexample["output"], counterexample["original"], counterexample["optimized"]))
+        for name in counterexample["inputs"]:
+            print("  {} = {}".format(name, counterexample["inputs"][name]))
     else:
+        print(result["verified"])
         print("The logic-optimized BLIF is identical to the original when expanded!")
 
+if profiler is not None:
+    profiler.stop()
+    profiler.write(args.profileFile)
+if sampler is not None:
+    sampler.stop()
+    sampler.write(args.sampleFile)
+
+if stats is not None:
+    output = stats.toJSON() if args.stats == "json" else stats.summary()
+    if args.statsFile is not None:
+        args.statsFile.write(output)
+        args.statsFile.write("\n")
+        args.statsFile.close()
+    else:
+        print("")
+        print(output)
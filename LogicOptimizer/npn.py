@@ -0,0 +1,152 @@
+from itertools import permutations
+from cube import *
+from TruthTable import *
+
+# Tables with this many inputs or fewer are grouped into NPN classes.
+#  Finding the canonical form tries every input permutation and
+#  negation, which is width! * 2^width truth tables.
+NPN_MAX_INPUTS = 5
+
+# Groups tables that compute the same function up to permuting and
+#  negating inputs (and negating the output) so each class only has to
+#  be minimized once.
+#
+# Here variable j is column j of the table (counting from the left) and
+#  the function of a table is an int with bit x set when the minterm
+#  whose bit j is variable j is in the ON-set.
+#
+# A transform is (perm, neg, phase): the class representative R and the
+#  table's function f are related by R(y) = phase ^ f(x), where bit
+#  perm[j] of x is bit j of y xor bit j of neg. Input permutations and
+#  negations don't change the cost of a cover, so a minimum cover of R
+#  maps straight back to a minimum cover of f. Output negation does
+#  change it, so tables with phase 1 get a minimized cover of the
+#  complement of R instead.
+#
+# Returns (work, mapping): work holds one TruthTable per class and phase
+#  that's needed plus every table that was too wide to group, and
+#  mapping gives (work key, transform) for every grouped table key.
+def npnReduce(tables, maxInputs=NPN_MAX_INPUTS):
+    canonicalForms = {}
+    work = {}
+    mapping = {}
+    for key, tt in tables.items():
+        width = tt.width()
+        if width == 0 or width > maxInputs:
+            work[key] = tt
+            continue
+
+        bits = functionBits(tt)
+        found = canonicalForms.get((width, bits))
+        if found is None:
+            found = npnCanonical(bits, width)
+            canonicalForms[(width, bits)] = found
+        canonical, perm, neg, phase = found
+
+        workKey = ("npn", width, canonical, phase)
+        if workKey not in work:
+            function = canonical
+            if phase:
+                function ^= (1 << (1 << width)) - 1
+            work[workKey] = representativeTable(function, width)
+        mapping[key] = (workKey, (perm, neg, phase))
+
+    return work, mapping
+
+# Turns the cover of a class representative back into a cover of the
+#  table it was grouped from. Covers are packed cubes in column order.
+def npnMapCover(cover, width, transform):
+    perm, neg, phase = transform
+    mapped = []
+    for value, mask in cover:
+        newValue = 0
+        newMask = 0
+        for j in iterBits(reverseBits(mask, width)):
+            b = (reverseBits(value, width) >> j & 1) ^ (neg >> j & 1)
+            newMask |= 1 << perm[j]
+            newValue |= b << perm[j]
+        mapped.append((reverseBits(newValue, width), reverseBits(newMask, width)))
+    return mapped
+
+# The ON-set of a table as one bit per minterm
+def functionBits(tt):
+    width = tt.width()
+    if len(tt.ones) == 0 and len(tt.zeros) > 0:
+        cubes = tt.zeros
+        invert = True
+    else:
+        cubes = tt.ones
+        invert = False
+
+    bits = 0
+    for column in mintermValues(cubes, width):
+        bits |= 1 << reverseBits(column, width)
+    if invert:
+        bits ^= (1 << (1 << width)) - 1
+    return bits
+
+# Cube bits count columns from the right (the left most column is the
+#  highest bit), variables here count from the left
+def reverseBits(x, width):
+    result = 0
+    for i in iterBits(x):
+        result |= 1 << (width - 1 - i)
+    return result
+
+# A table for the function, with made up input names
+def representativeTable(function, width):
+    names = ["y{}".format(j) for j in range(0, width)] + ["f"]
+    full = (1 << width) - 1
+    ones = []
+    for x in range(0, 1 << width):
+        if function >> x & 1:
+            ones.append((reverseBits(x, width), full))
+    return TruthTable.fromCubes(names, ones, [])
+
+# For each variable, the minterm positions where it is 0
+def variableMasks(width):
+    size = 1 << width
+    masks = []
+    for j in range(0, width):
+        m = 0
+        for p in range(0, size):
+            if not (p >> j & 1):
+                m |= 1 << p
+        masks.append(m)
+    return masks
+
+# Tries every input permutation and negation and both output phases and
+#  keeps the smallest function. Returns (canonical, perm, neg, phase).
+def npnCanonical(bits, width):
+    size = 1 << width
+    full = (1 << size) - 1
+    masks = variableMasks(width)
+
+    best = None
+    for perm in permutations(range(0, width)):
+        # g(y) = f(x) where bit perm[j] of x is bit j of y
+        g = 0
+        for y in range(0, size):
+            x = 0
+            for j in range(0, width):
+                if y >> j & 1:
+                    x |= 1 << perm[j]
+            if bits >> x & 1:
+                g |= 1 << y
+
+        # Go through every negation in Gray code order, so each step
+        #  only flips one variable
+        neg = 0
+        for step in range(0, size):
+            if step > 0:
+                j = (step & -step).bit_length() - 1
+                s = 1 << j
+                g = ((g & masks[j]) << s) | ((g >> s) & masks[j])
+                neg ^= s
+
+            for phase in (0, 1):
+                value = g ^ full if phase else g
+                if best is None or value < best[0]:
+                    best = (value, perm, neg, phase)
+
+    return best
@@ -1,55 +1,98 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
 from TruthTable import *
+from cube import *
+from cover import *
+from espresso import *
+from cache import *
+from npn import *
+from divide import *
+from kernel import *
+from spill import *
+from budget import *
+from stats import *
 
 class Minterm:
+    # Cubes are stored packed into ints (see cube.py) so that starring,
+    #  counting and comparing terms are a few bitwise operations and the
+    #  width is not limited to 32 bits.
+    # tag has a bit set for every output the term is an implicant of.
+    #  When a group of tables is minimized together (see
+    #  quineMcCluskeyMultiOutput) terms only star if they share an output;
+    #  a single table just uses 1 everywhere.
+    __slots__ = ("value", "mask", "width", "implements", "tag")
+
     def __init__(self, row=None):
         if row is not None:
-            self.row = row
-            self.implements = []
-            self.implements.append(0xFFFFFFFF & int("".join(row), 2) )
+            self.value, self.mask = rowToCube(row)
+            self.width = len(row)
+            self.implements = [self.value]
         else:
+            self.value = 0
+            self.mask = 0
+            self.width = 0
             self.implements = []
-            self.row = []
+        self.tag = 1
+
+    @staticmethod
+    def fromCube(value, mask, width, implements, tag=1):
+        m = Minterm()
+        m.value = value
+        m.mask = mask
+        m.width = width
+        m.implements = implements
+        m.tag = tag
+        return m
+
+    # The minterms the term covers. Primes from the vectorized and
+    #  out-of-core star phases don't keep a list (implements is None), so
+    #  they work it out from the cube; every minterm inside a prime is one
+    #  of the minterms it was built from.
+    def minterms(self):
+        if self.implements is None:
+            return iterMinterms(self.value, self.mask, self.width)
+        return self.implements
+
+    # The term as a list of "0", "1" and "-" characters
+    @property
+    def row(self):
+        return cubeToRow(self.value, self.mask, self.width)
 
     def star(self, m1):
-        row0 = self.row
-        row1 = m1.row
-
-        diff = 0
-        new = []
-        for i, b0 in enumerate(row0):
-            b1 = row1[i]
-            if b0 != b1:
-                diff += 1
-                if diff > 1:
-                    return None
-                new.append("-")
-            else:
-                new.append(b0)
+        # Terms can only merge if their don't-cares line up
+        if self.mask != m1.mask:
+            return None
 
-        if diff == 0:
+        # ...and exactly one of the cared-about bits differs
+        diff = self.value ^ m1.value
+        if diff == 0 or (diff & (diff - 1)) != 0:
             return None
 
-        m = Minterm()
-        m.row = new
-        m.implements.extend(self.implements)
-        m.implements.extend(m1.implements)
-        m.implements.sort()
+        # The merged term is only an implicant of the outputs both halves are
+        tag = self.tag & m1.tag
+        if tag == 0:
+            return None
 
-        return m
+        implements = self.implements + m1.implements
+        implements.sort()
+
+        return Minterm.fromCube(self.value & ~diff, self.mask & ~diff, self.width, implements, tag)
 
     #   Counts the number of 1's in a minterm
     def countOnes(self):
-        count = 0
-        for m in self.row:
-            if m is "1":
-                count += 1
-        return count
+        return popcount(self.value)
 
     def __eq__(self, other):
-        return self.row == other.row
+        return self.value == other.value and self.mask == other.mask
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.value, self.mask))
 
     def __str__(self):
-        return "Term {} covers {}".format(self.row, self.implements)
+        return "Term {} covers {}".format(self.row, list(self.minterms()))
 
     @staticmethod
     def toMintemrs(rows):
@@ -65,7 +108,7 @@ class Minterm:
             raise Exception("organizeByNumberOfOnes - arrayOfMinterms is None or empty")
 
         # How many bits are we working with?
-        bits = len(arrayOfMinterms[0].row)
+        bits = arrayOfMinterms[0].width
         # Make a list to hold each group of minterms
         currentNumberOfOnes = 0
         maxNumberOfOnes = (max(arrayOfMinterms, key=lambda m: m.countOnes())).countOnes()
@@ -80,6 +123,26 @@ class Minterm:
             mintermsByNumberOfOnes[c].append(minterm)
 
         return mintermsByNumberOfOnes
+    # Like organizeByNumberOfOnes, but each group is a dict keyed by
+    #  don't-care mask, and each of those is a dict of value -> term.
+    # Terms can only star with a term that has the same mask, so this
+    #  lets us find partners with a hash lookup instead of a scan.
+    @staticmethod
+    def organizeByOnesAndMask(arrayOfMinterms):
+        if arrayOfMinterms is None or len(arrayOfMinterms) == 0:
+            raise Exception("organizeByOnesAndMask - arrayOfMinterms is None or empty")
+
+        tabulated = []
+        for minterm in arrayOfMinterms:
+            c = minterm.countOnes()
+            while len(tabulated) <= c:
+                tabulated.append({})
+            group = tabulated[c].setdefault(minterm.mask, {})
+            # Duplicate terms collapse into one
+            group.setdefault(minterm.value, minterm)
+
+        return tabulated
+
     @staticmethod
     def getRowsFromMinterms(minterms):
         rows = []
@@ -87,133 +150,566 @@ class Minterm:
             rows.append([m.row, "1"])
         return rows
 
-def optimzieBLIF(blif, debug=False):
-    # Clear the old tt rows
-    origTTLookup = blif.ttLookup
-    blif.ttLookup = {}
-
-    for key in origTTLookup:
-        tt = origTTLookup[key]
-        print("Performing optimization on {}".format(tt))
-        print(tt.ttString())
-
-        # Convert the rows to minterm objects
-        # Minterms keep track of what outputs they cover.
-        currentBatch = Minterm.toMintemrs(tt.ttInputs_ones)
-        # What minterms do we need to cover?
-        # Get this so we can use it later
-        needToCover = []
-        for m in currentBatch:
-            # Each term should only have one implement at this point
-            needToCover.append(m.implements[0])
-
-        primeImplicants = []
-
-        while True:
-            if debug:
-                print("Tabulating {} rows.".format(len(currentBatch)))
+# Find every pair of terms in group and nextGroup (which has one more 1)
+#  that can be starred. Partners differ in exactly one cared-about bit,
+#  so instead of comparing against every term we flip each 0 bit and
+#  look the result up.
+# The groups only need to map mask -> values (a dict or a set), so this
+#  also runs in worker processes on packed copies of the groups.
+# Returns (value, mask, bit) for each pair, where value is the lesser
+#  term and value ^ bit is the greater one.
+def findStarPairs(group, nextGroup):
+    pairs = []
+    for mask, lesserValues in group.items():
+        greaterValues = nextGroup.get(mask)
+        if greaterValues is None:
+            continue
+
+        for value in lesserValues:
+            zeros = mask & ~value
+            while zeros:
+                bit = zeros & -zeros
+                zeros ^= bit
+                if value ^ bit in greaterValues:
+                    pairs.append((value, mask, bit))
+    return pairs
+
+# Star every term in group with its partners in nextGroup.
+# Terms that merged are added to usedTerms and the merged terms are added
+#  to forNextRound, which is a dict so duplicates are dropped.
+# With output tags a term only counts as used when the merged term is
+#  still an implicant of all of its outputs; otherwise it stays a prime
+#  for the outputs the merged term lost.
+# Returns how many pairs merged.
+def starAdjacentGroups(group, nextGroup, usedTerms, forNextRound, pairs=None):
+    if pairs is None:
+        pairs = findStarPairs(group, nextGroup)
+
+    unshared = 0
+    for value, mask, bit in pairs:
+        lesserTerm = group[mask][value]
+        greaterTerm = nextGroup[mask][value ^ bit]
+        tag = lesserTerm.tag & greaterTerm.tag
+        if tag == 0:
+            unshared += 1
+            continue
+        if tag == lesserTerm.tag:
+            usedTerms.add(lesserTerm)
+        if tag == greaterTerm.tag:
+            usedTerms.add(greaterTerm)
+        key = (value, mask ^ bit)
+        if key not in forNextRound:
+            forNextRound[key] = lesserTerm.star(greaterTerm)
+    return len(pairs) - unshared
+
+# How many partners a column could have: one for every cared-about 0 bit
+#  of every term (the same count starColumnsVectorized uses)
+def countStarAttempts(terms):
+    attempts = 0
+    for m in terms:
+        attempts += popcount(m.mask & ~m.value)
+    return attempts
+
+# Same as calling starAdjacentGroups on every pair of groups, but the
+#  pairs are searched for in the pool. Only the values are sent to the
+#  workers; the terms (and their implements lists) stay here.
+def starColumnInPool(tabulated, pool, usedTerms, forNextRound):
+    futures = []
+    for i in range(0, len(tabulated) - 1):
+        group = tabulated[i]
+        nextGroup = tabulated[i + 1]
+        lesser = {}
+        greater = {}
+        for mask in group:
+            if mask in nextGroup:
+                lesser[mask] = list(group[mask])
+                greater[mask] = set(nextGroup[mask])
+        futures.append(pool.submit(findStarPairs, lesser, greater))
+
+    merged = 0
+    for i, future in enumerate(futures):
+        merged += starAdjacentGroups(tabulated[i], tabulated[i + 1], usedTerms, forNextRound, pairs=future.result())
+    return merged
+
+# Stars currentBatch column by column and returns every term that never
+#  merged (the prime implicants).
+# If memoryBudget (bytes) is given and the columns might not fit in it,
+#  they are kept on disk instead (see spill.py). Otherwise big enough
+#  batches go through the NumPy kernel (see kernel.py) when it is
+#  available. Either way, if a pool is given, columns with at least
+#  PARALLEL_COLUMN_MIN_TERMS terms are starred in it.
+# The budget is checked before every column. If stats are given (see
+#  stats.py) the size and star attempts of every column are added to them.
+def findPrimeImplicants(currentBatch, debug=False, pool=None, memoryBudget=None, budget=None, stats=None):
+    width = currentBatch[0].width
+    maxTag = max(m.tag for m in currentBatch)
+    primes = None
+    if spillNeeded(width, len(currentBatch), maxTag, memoryBudget):
+        primes = starColumnsOutOfCore([m.value for m in currentBatch], [m.tag for m in currentBatch], width,
+                                      memoryBudget, debug=debug, budget=budget, stats=stats)
+    elif kernelSupports(width, len(currentBatch), maxTag):
+        primes = starColumnsVectorized([m.value for m in currentBatch], [m.tag for m in currentBatch], width,
+                                       debug=debug, budget=budget, stats=stats, pool=pool)
+    if primes is not None:
+        return [Minterm.fromCube(value, mask, width, None, tag) for value, mask, tag in primes]
+
+    primeImplicants = []
+
+    column = 0
+    while True:
+        if budget is not None:
+            budget.check()
+        if debug:
+            print("Tabulating {} rows.".format(len(currentBatch)))
 
-            tabulated = Minterm.organizeByNumberOfOnes(currentBatch)
+        tabulated = Minterm.organizeByOnesAndMask(currentBatch)
+        if debug:
             print("Starring {} terms.".format(len(currentBatch)))
 
-            if debug:
-                print("Current batch: ")
-                for m in currentBatch:
-                    print(m)
-                print("")
+        if debug:
+            print("Current batch: ")
+            for m in currentBatch:
+                print(m)
+            print("")
+
+        usedTerms = set()
+        forNextRound = {}
+
+        # Optimize using the table method described in the book.
+        # Each group is only compared with the group that has one more 1.
+        merged = 0
+        if pool is not None and len(currentBatch) >= PARALLEL_COLUMN_MIN_TERMS:
+            merged = starColumnInPool(tabulated, pool, usedTerms, forNextRound)
+        else:
+            for i in range(0, len(tabulated) - 1):
+                merged += starAdjacentGroups(tabulated[i], tabulated[i + 1], usedTerms, forNextRound)
 
-            usedTerms = []
-            forNextRound = []
+        if stats is not None:
+            stats.column(column, len(currentBatch), countStarAttempts(currentBatch), merged)
+        column += 1
 
-            # Optimize using the table method described in the book.
-            for i, group in enumerate(tabulated):
-                if group == tabulated[-1]:
-                    # Last group has nothing to merge with
-                    break
+        # Anything that never merged is a prime implicant
+        for group in tabulated:
+            for terms in group.values():
+                for minterm in terms.values():
+                    if minterm not in usedTerms:
+                        primeImplicants.append(minterm)
+        forNextRound = list(forNextRound.values())
 
-                nextGroup = tabulated[i + 1]
-                # Compare the current group with the next group to find
-                #  pairs that can merge and move on to the next round.
-                for lesserTerm in group:
-                    for greaterTerm in nextGroup:
-                        possibleNext = lesserTerm.star(greaterTerm)
-                        # print("{} * {} is {}".format(lesserTerm, greaterTerm, possibleNext))
-                        if possibleNext is not None:
-                            usedTerms.append(lesserTerm)
-                            usedTerms.append(greaterTerm)
-                        if possibleNext is not None and possibleNext not in forNextRound:
-                            forNextRound.append(possibleNext)
-
-            # We found a bunch of pairs, but now we need to remove them
-            #  so we can find the leftover prime implicants with no matches.
-            for used in usedTerms:
-                if used in tabulated[used.countOnes()]:
-                    tabulated[used.countOnes()].remove(used)
-
-            # Grab all the prime implicants
-            for group in tabulated:
-                # print("{} leftover in group {}".format(len(group), tabulated.index(group)))
-                for minterm in group:
-                    # print("Adding leftover term: {}".format(minterm))
-                    primeImplicants.append(minterm)
-            if debug:
-                print("We found {} contestants who get to move on ({} left over as prime implicants).".format(
-                    len(forNextRound), len(primeImplicants)))
-
-            if len(forNextRound) == 0:
-                # We don't have any for the next round.
-                break
-
-            currentBatch = forNextRound
-
-        # Gather our prime implicants and find minimum cover.
+        if debug:
+            print("We found {} contestants who get to move on ({} left over as prime implicants).".format(
+                len(forNextRound), len(primeImplicants)))
+
+        if len(forNextRound) == 0:
+            # We don't have any for the next round.
+            break
+
+        currentBatch = forNextRound
+
+    return primeImplicants
+
+# Minimizes a single truth table with Quine-McCluskey and returns the
+#  rows of the chosen prime implicants.
+# If a pool is given, columns with at least PARALLEL_COLUMN_MIN_TERMS terms
+#  are starred in it.
+def quineMcCluskey(tt, debug=False, coverTimeLimit=None, pool=None, memoryBudget=None, budget=None, stats=None):
+    # Convert the rows to minterm objects
+    # Minterms keep track of what outputs they cover.
+    # Rows can still have don't-cares (merged tables get them from the
+    #  complemented "0" rows of their children), so start from the
+    #  minterms inside them. A table that only lists its "0" rows is
+    #  covered by their complement.
+    width = tt.width()
+    full = (1 << width) - 1
+    currentBatch = [Minterm.fromCube(value, full, width, [value]) for value in mintermValues(originalCover(tt), width)]
+    if len(currentBatch) == 0:
+        # Always 0, so there is nothing to cover
+        return []
+    # What minterms do we need to cover?
+    # Get this so we can use it later
+    needToCover = []
+    for m in currentBatch:
+        # Each term should only have one implement at this point
+        needToCover.append(m.implements[0])
+
+    with timedPhase(stats, "qmColumns"):
+        primeImplicants = findPrimeImplicants(currentBatch, debug=debug, pool=pool, memoryBudget=memoryBudget,
+                                              budget=budget, stats=stats)
+
+    # Gather our prime implicants and find minimum cover.
+    if debug:
         print("Finding decent cover using {} prime implicants.".format(len(primeImplicants)))
         for prime in primeImplicants:
             print(prime)
 
-        if debug:
-            print("Coverage map:")
-            coverageMap = {}
-            for prime in primeImplicants:
-                for i in prime.implements:
-                    if i not in coverageMap:
-                        coverageMap[i] = []
-                    coverageMap[i].append(prime)
-
-            for k in coverageMap:
-                print("{} is covered by {}".format(k, len(coverageMap[k])))
-
-        chosenPrimeImplicants = []
-
-        # We need to make sure that we cover all the minterms in needToCover
-        while len(needToCover) > 0:
-            mintermNum = needToCover[0]
-
-            # Find a prime implicant that covers this.
-            for prime in primeImplicants:
-                if mintermNum in prime.implements:
-                    chosenPrimeImplicants.append(prime)
-                    # Remove all the minterm numbers that this prime
-                    #  implicant covers
-                    for implement in prime.implements:
-                        if implement in needToCover:
-                            needToCover.remove(implement)
-
-                    mintermNum = None
-                    break
+        print("Coverage map:")
+        coverageMap = {}
+        for prime in primeImplicants:
+            for i in prime.minterms():
+                if i not in coverageMap:
+                    coverageMap[i] = []
+                coverageMap[i].append(prime)
+
+        for k in coverageMap:
+            print("{} is covered by {}".format(k, len(coverageMap[k])))
+
+    # We need to make sure that we cover all the minterms in needToCover
+    with timedPhase(stats, "cover"):
+        chosenPrimeImplicants = findMinimumCover(primeImplicants, needToCover, timeLimit=coverTimeLimit, debug=debug,
+                                                 budget=budget, stats=stats)
 
-            if mintermNum is not None:
-                raise Exception("Couldn't find a prime implicant to cover minterm {}.".format(mintermNum))
+    if stats is not None:
+        stats.count("terms", len(currentBatch))
+        stats.count("primes", len(primeImplicants))
+        stats.count("cover", len(chosenPrimeImplicants))
 
+    if debug:
         print("")
-        print("Found a combination of {}/{} prime implicants that covers everything.".format(len(chosenPrimeImplicants),
-                                                                                             len(primeImplicants)))
+        print("Found a combination of {}/{} prime implicants that covers everything.".format(
+            len(chosenPrimeImplicants), len(primeImplicants)))
 
         for p in chosenPrimeImplicants:
             print(p)
 
+    return Minterm.getRowsFromMinterms(chosenPrimeImplicants)
+
+# Minimizes tables that have the same inputs together. Every minterm is
+#  tagged with the outputs it's in, so the primes of all the tables come
+#  out of one run through the columns, and the cover is picked for the
+#  whole group so that a term can be shared by several outputs.
+# Returns the rows of the new cover for each table.
+def quineMcCluskeyMultiOutput(tables, debug=False, coverTimeLimit=None, pool=None, memoryBudget=None,
+                              budget=None, stats=None):
+    width = tables[0].width()
+    full = (1 << width) - 1
+
+    tags = {}
+    for output, tt in enumerate(tables):
+        # Tables that only list their "0" rows are covered by the complement
+        for value in mintermValues(originalCover(tt), width):
+            tags[value] = tags.get(value, 0) | (1 << output)
+    if len(tags) == 0:
+        return [[] for tt in tables]
+
+    currentBatch = [Minterm.fromCube(value, full, width, [value], tag) for value, tag in tags.items()]
+    needToCover = []
+    for value, tag in tags.items():
+        for output in iterBits(tag):
+            needToCover.append((value, output))
+
+    with timedPhase(stats, "qmColumns"):
+        primeImplicants = findPrimeImplicants(currentBatch, debug=debug, pool=pool, memoryBudget=memoryBudget,
+                                              budget=budget, stats=stats)
+    with timedPhase(stats, "cover"):
+        chosenPrimeImplicants = findMultiOutputCover(primeImplicants, needToCover, timeLimit=coverTimeLimit,
+                                                     debug=debug, budget=budget, stats=stats)
+
+    if stats is not None:
+        stats.count("terms", len(currentBatch))
+        stats.count("primes", len(primeImplicants))
+        stats.count("cover", len(chosenPrimeImplicants))
+
+    if debug:
+        print("Found {} shared terms out of {} prime implicants for {} outputs.".format(
+            len(chosenPrimeImplicants), len(primeImplicants), len(tables)))
+
+    # Each output only keeps the chosen terms it needs
+    rows = []
+    for output in range(0, len(tables)):
+        bit = 1 << output
+        minterms = [value for value, tag in tags.items() if tag & bit]
+        if len(minterms) == 0:
+            rows.append([])
+            continue
+        candidates = [p for p in chosenPrimeImplicants if p.tag & bit]
+        rows.append(Minterm.getRowsFromMinterms(findMinimumCover(candidates, minterms, timeLimit=coverTimeLimit,
+                                                                 budget=budget)))
+    return rows
+
+# Minimizes a single truth table with the chosen engine and returns the
+#  rows of the new cover. If a budget is given (see budget.py) the engine
+#  checks it as it goes, and raises BudgetExceeded if it runs out before
+#  there's a cover to return. If stats are given (see stats.py) the
+#  engine's phases and counters go into them.
+def optimizeTruthTable(tt, debug=False, coverTimeLimit=None, engine="qm", pool=None, memoryBudget=None, budget=None,
+                       stats=None):
+    if debug:
+        print("Performing optimization on {}".format(tt))
+        print(tt.ttString())
+
+    if engine == "espresso":
+        with timedPhase(stats, "espresso"):
+            rows = espressoTruthTable(tt, debug=debug, budget=budget)
+        if stats is not None:
+            stats.count("cover", len(rows))
+        return rows
+    elif engine == "qm":
+        return quineMcCluskey(tt, debug=debug, coverTimeLimit=coverTimeLimit, pool=pool, memoryBudget=memoryBudget,
+                              budget=budget, stats=stats)
+    elif engine == "cofactor":
+        # Split the table into cofactors until they are small enough for QM
+        leafSolver = lambda leaf: quineMcCluskey(leaf, debug=debug, coverTimeLimit=coverTimeLimit,
+                                                 memoryBudget=memoryBudget, budget=budget, stats=stats)
+        with timedPhase(stats, "cofactor"):
+            rows = cofactorTruthTable(tt, leafSolver, debug=debug, budget=budget, stats=stats)
+        if stats is not None:
+            stats.count("cofactorCover", len(rows))
+        return rows
+    else:
+        raise Exception("Unknown optimization engine {}.".format(engine))
+
+# Truth tables are sent to worker processes as plain tuples of names and
+#  packed cubes, which are much smaller to pickle than TruthTable objects
+#  holding lists of characters (and a reference to the whole BLIF).
+def packTruthTable(tt):
+    return list(tt.names), tt.ones, tt.zeros
+
+def unpackRows(names, ones, zeros):
+    width = len(names) - 1
+    rows = []
+    for value, mask in ones:
+        rows.append([cubeToRow(value, mask, width), "1"])
+    for value, mask in zeros:
+        rows.append([cubeToRow(value, mask, width), "0"])
+    return rows
+
+# The table's own cubes as an ON-set cover, which is what a table keeps
+#  when its budget runs out before there is anything better
+def originalCover(tt):
+    if len(tt.ones) == 0 and len(tt.zeros) > 0:
+        return complementCubes(tt.zeros)
+    return list(tt.ones)
+
+# Minimizes a list of tables that have the same inputs. Only
+#  Quine-McCluskey has a multi-output mode; other engines do the tables
+#  one at a time.
+# Every table (or the whole group in multi-output mode) gets a Budget of
+#  timeLimit seconds and memLimit bytes, cut off at runDeadline (a
+#  time.time()). Returns the rows of each table's new cover, and for each
+#  table the limit that cut it short or None.
+# If stats are given (see stats.py) every table's phases and counters
+#  are added to them.
+def optimizeGroup(tables, debug=False, coverTimeLimit=None, engine="qm", pool=None, memoryBudget=None,
+                  timeLimit=None, memLimit=None, runDeadline=None, stats=None):
+    if len(tables) > 1 and engine == "qm":
+        started = stats.start() if stats is not None else None
+        budget = Budget(timeLimit, memLimit, runDeadline)
+        try:
+            budget.check()
+            rows = quineMcCluskeyMultiOutput(tables, debug=debug, coverTimeLimit=coverTimeLimit, pool=pool,
+                                             memoryBudget=memoryBudget, budget=budget, stats=stats)
+        except BudgetExceeded:
+            rows = [unpackRows(tt.names, originalCover(tt), []) for tt in tables]
+        if stats is not None:
+            stats.stop("optimize", started)
+            if budget.exceeded is not None:
+                stats.count("cutShort")
+        return rows, [budget.exceeded] * len(tables)
+
+    rows = []
+    exceeded = []
+    for tt in tables:
+        started = stats.start() if stats is not None else None
+        budget = Budget(timeLimit, memLimit, runDeadline)
+        try:
+            budget.check()
+            rows.append(optimizeTruthTable(tt, debug=debug, coverTimeLimit=coverTimeLimit, engine=engine, pool=pool,
+                                           memoryBudget=memoryBudget, budget=budget, stats=stats))
+        except BudgetExceeded:
+            rows.append(unpackRows(tt.names, originalCover(tt), []))
+        if stats is not None:
+            stats.stop("optimize", started)
+            if budget.exceeded is not None:
+                stats.count("cutShort")
+        exceeded.append(budget.exceeded)
+    return rows, exceeded
+
+# Runs in a worker process. Returns the new covers as packed cubes, which
+#  tables were cut short and, if collectStats is set, the group's Stats.
+def optimizePackedGroup(packedTables, options, collectStats=False):
+    tables = [TruthTable.fromCubes(names, ones, zeros) for names, ones, zeros in packedTables]
+    stats = Stats() if collectStats else None
+    rows, exceeded = optimizeGroup(tables, stats=stats, **options)
+    return [[rowToCube(row) for row, output in tableRows] for tableRows in rows], exceeded, stats
+
+# Tables with the same inputs in the same order, in groups of two or more
+def groupBySupport(tables):
+    groups = {}
+    for key, tt in tables.items():
+        if tt.width() > 0:
+            groups.setdefault(tuple(tt.names[:-1]), []).append(key)
+    return [keys for keys in groups.values() if len(keys) > 1]
+
+# The name a unit of work goes by in the stats: its output names, or for
+#  an NPN class its width and canonical function
+def unitName(keys):
+    names = []
+    for key in keys:
+        if isinstance(key, tuple):
+            kind, width, canonical, phase = key
+            names.append("{}{}:{:x}{}".format(kind, width, canonical, "'" if phase else ""))
+        else:
+            names.append(key)
+    return "+".join(names)
+
+# If a ResultCache is given, tables that were optimized before (with the
+#  same options) are taken from it instead, and new results are added.
+# Tables with up to npnMaxInputs inputs are grouped by NPN class first
+#  (see npn.py) and each class is only minimized once. 0 turns it off.
+# With multiOutput, tables that have the same inputs are minimized
+#  together and can share terms (see quineMcCluskeyMultiOutput). Those
+#  tables are left out of the NPN classes.
+# memoryBudget (bytes) lets QM keep columns that wouldn't fit in it on
+#  disk (see spill.py). Each worker process gets the whole budget.
+# timeLimit (seconds) and memLimit (bytes) cap each table, and
+#  runTimeLimit (seconds) caps the whole run. A table that hits one of
+#  them keeps the best cover found by then, or its own cubes.
+# If stats are given (see stats.py) every unit of work gets its own
+#  Stats in stats.tables, named after its output(s).
+# Returns a dict of output name -> "time" or "memory" for the tables that
+#  were cut short.
+def optimzieBLIF(blif, debug=False, coverTimeLimit=None, engine="qm", jobs=1, cache=None,
+                 npnMaxInputs=NPN_MAX_INPUTS, multiOutput=False, memoryBudget=None,
+                 timeLimit=None, memLimit=None, runTimeLimit=None, stats=None):
+    # Clear the old tt rows
+    blifTTLookup = blif.ttLookup
+    blif.ttLookup = {}
+
+    options = {"debug": debug, "coverTimeLimit": coverTimeLimit, "engine": engine, "memoryBudget": memoryBudget}
+
+    runDeadline = None
+    if runTimeLimit is not None:
+        runDeadline = time.time() + runTimeLimit
+    # The limits don't change what a finished cover looks like, so they
+    #  stay out of the options the cache sees
+    workOptions = dict(options, timeLimit=timeLimit, memLimit=memLimit, runDeadline=runDeadline)
+
+    groups = []
+    ungrouped = blifTTLookup
+    if multiOutput and engine == "qm":
+        groups = groupBySupport(blifTTLookup)
+        grouped = set(key for keys in groups for key in keys)
+        ungrouped = dict((key, tt) for key, tt in blifTTLookup.items() if key not in grouped)
+        if debug:
+            print("{} tables fell into {} multi-output groups.".format(len(grouped), len(groups)))
+
+    mapping = {}
+    origTTLookup = dict(ungrouped)
+    if npnMaxInputs > 0:
+        with timedPhase(stats, "npnReduce"):
+            origTTLookup, mapping = npnReduce(ungrouped, npnMaxInputs)
+        if debug or stats is not None:
+            classes = set(workKey for workKey, transform in mapping.values())
+        if debug:
+            print("{} tables fell into {} NPN classes.".format(len(mapping), len(classes)))
+        if stats is not None:
+            stats.count("npnTables", len(mapping))
+            stats.count("npnClasses", len(classes))
+
+    # Each unit of work is a list of keys that are minimized together
+    units = [[key] for key in origTTLookup] + groups
+    for keys in groups:
+        for key in keys:
+            origTTLookup[key] = blifTTLookup[key]
+
+    # Covers from a group depend on the rest of the group, so they are
+    #  kept apart in the cache by the group's own key
+    unitOptions = {}
+    if cache is not None:
+        for keys in units:
+            if len(keys) > 1:
+                unitOptions[keys[0]] = dict(options, multiOutput=True,
+                                            group=groupKey([origTTLookup[key] for key in keys]))
+            else:
+                unitOptions[keys[0]] = options
+
+    results = {}
+    exceeded = {}
+    pending = []
+    for keys in units:
+        covers = {}
+        if cache is not None:
+            for key in keys:
+                cover = cache.lookup(origTTLookup[key], unitOptions[keys[0]])
+                if cover is None:
+                    break
+                covers[key] = cover
+        # A group is only taken from the cache if every table in it is
+        if len(covers) < len(keys):
+            pending.append(keys)
+            continue
+        for key, cover in covers.items():
+            results[key] = unpackRows(origTTLookup[key].names, cover, [])
+            if stats is not None:
+                stats.count("cacheHits")
+
+    started = stats.start() if stats is not None else None
+
+    if jobs > 1 and len(pending) > 0:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            if len(pending) > 1:
+                # Every unit is independent, so farm them out to the pool.
+                # The biggest ones go first so that one huge table doesn't end up
+                #  running by itself at the end.
+                order = sorted(pending, key=lambda keys: -sum(
+                    len(origTTLookup[k].ones) * len(origTTLookup[k].names) for k in keys))
+                futures = []
+                for keys in order:
+                    packed = [packTruthTable(origTTLookup[key]) for key in keys]
+                    futures.append(pool.submit(optimizePackedGroup, packed, workOptions, stats is not None))
+                for keys, future in zip(order, futures):
+                    covers, reasons, unitStats = future.result()
+                    for key, cover in zip(keys, covers):
+                        results[key] = unpackRows(origTTLookup[key].names, cover, [])
+                    exceeded.update(zip(keys, reasons))
+                    if stats is not None:
+                        stats.table(unitName(keys)).merge(unitStats)
+            else:
+                # A single unit can still use the pool for its QM columns
+                keys = pending[0]
+                unitStats = stats.table(unitName(keys)) if stats is not None else None
+                covers, reasons = optimizeGroup([origTTLookup[key] for key in keys], pool=pool, stats=unitStats,
+                                                **workOptions)
+                results.update(zip(keys, covers))
+                exceeded.update(zip(keys, reasons))
+    else:
+        for keys in pending:
+            unitStats = stats.table(unitName(keys)) if stats is not None else None
+            covers, reasons = optimizeGroup([origTTLookup[key] for key in keys], stats=unitStats, **workOptions)
+            results.update(zip(keys, covers))
+            exceeded.update(zip(keys, reasons))
+
+    if stats is not None:
+        stats.stop("optimizeTables", started)
+
+    if cache is not None:
+        for keys in pending:
+            for key in keys:
+                # Covers from a table that was cut short aren't worth keeping
+                if exceeded[key] is not None:
+                    continue
+                cache.store(origTTLookup[key], unitOptions[keys[0]], [rowToCube(row) for row, output in results[key]])
+
+    # Map the class results back onto the tables they stand for
+    for key, (workKey, transform) in mapping.items():
+        tt = blifTTLookup[key]
+        cover = npnMapCover([rowToCube(row) for row, output in results[workKey]], tt.width(), transform)
+        results[key] = unpackRows(tt.names, cover, [])
+        exceeded[key] = exceeded.get(workKey)
+
+    cutShort = {}
+
+    # Put the results back in the original order
+    for key in blifTTLookup:
+        tt = blifTTLookup[key]
+
         # Create a replacement truth table
-        primeTT = TruthTable(tt.names, Minterm.getRowsFromMinterms(chosenPrimeImplicants), blif=blif)
+        primeTT = TruthTable(tt.names, results[key], blif=blif)
 
         # Replace the inputs with the new prime implicants
-        blif.ttLookup[tt.getOutputName()] = primeTT
\ No newline at end of file
+        blif.ttLookup[tt.getOutputName()] = primeTT
+
+        if exceeded.get(key) is not None:
+            cutShort[tt.getOutputName()] = exceeded[key]
+
+    return cutShort
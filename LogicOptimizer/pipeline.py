@@ -0,0 +1,61 @@
+from blif import *
+from optimize import *
+from simulate import *
+from bdd import *
+from sat import *
+from stats import *
+
+# What main.py does to one file, for code that wants to optimize BLIFs
+#  without going through the command line (testAll.py and so on).
+
+# Checks the optimized BLIF against the original multi-level network:
+#  bit-parallel simulation (sim), a BDD proof (bdd) or a SAT miter (sat).
+# Returns (counterexample, how): the counterexample is None if they match
+#  (see findCounterexample in simulate.py), and how says what was checked.
+def verifyOptimized(original, optimized, engine="sim", reorder=False):
+    if engine == "bdd":
+        return bddCounterexample(original, optimized, reorder=reorder), "Proved equivalent with BDDs."
+    elif engine == "sat":
+        return satCounterexample(original, optimized), "Proved equivalent with a SAT miter."
+    elif engine == "sim":
+        counterexample, checked, exhaustive = findCounterexample(original, optimized)
+        if exhaustive:
+            return counterexample, "Checked all {} input patterns.".format(checked)
+        return counterexample, "Checked {} random input patterns.".format(checked)
+    else:
+        raise Exception("Unknown verification engine {}.".format(engine))
+
+# Reads, optimizes and writes one BLIF. The files can be paths or open
+#  files. options are passed on to optimzieBLIF.
+# If verifyEngine is given the result is checked against the input with
+#  verifyOptimized. If stats are given (see stats.py) reading, writing and
+#  checking are timed along with the optimizer's own phases.
+# Returns a dict with the output names that were cut short (see
+#  optimzieBLIF), the rows of the collapsed tables before and after
+#  optimizing, and, if it was verified, the counterexample (None if it
+#  matched) and how it was checked.
+def optimizeFile(inputFile, outputFile, debug=False, verifyEngine=None, bddReorder=False, stats=None, **options):
+    blif = read_blif(inputFile, createTopLevelMerged=True, debug=debug, stats=stats)
+    # Tables that only list their "0" rows are counted by those
+    rowsBefore = sum(len(tt.ones) if len(tt.ones) > 0 else len(tt.zeros) for tt in blif.ttLookup.values())
+
+    cutShort = optimzieBLIF(blif, debug=debug, stats=stats, **options)
+    result = {
+        "cutShort": cutShort,
+        "rowsBefore": rowsBefore,
+        "rowsAfter": sum(len(tt.ones) for tt in blif.ttLookup.values()),
+    }
+
+    with timedPhase(stats, "write_blif"):
+        if isinstance(outputFile, str):
+            with open(outputFile, "w") as f:
+                write_blif(blif, f)
+        else:
+            write_blif(blif, outputFile)
+
+    if verifyEngine is not None:
+        with timedPhase(stats, "verify"):
+            original = read_blif(inputFile, createTopLevelMerged=False, debug=debug)
+            result["counterexample"], result["verified"] = verifyOptimized(original, blif, engine=verifyEngine,
+                                                                          reorder=bddReorder)
+    return result
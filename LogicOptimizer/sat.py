@@ -0,0 +1,539 @@
+import heapq
+from cube import *
+
+# Conflicts before the first restart. Later restarts follow the Luby
+#  sequence times this.
+RESTART_BASE = 100
+# How much variable activity decays after every conflict
+ACTIVITY_DECAY = 0.95
+
+# A small CDCL SAT solver: two watched literals per clause, first-UIP
+#  clause learning, VSIDS-style variable activity with phase saving, and
+#  Luby restarts.
+#
+# Variables are numbered from 1 and clauses are given DIMACS style, as
+#  lists of ints where -v is the negation of v. Inside the solver a
+#  literal is 2 * v for v and 2 * v + 1 for -v, so lit ^ 1 negates it.
+class Solver:
+    def __init__(self):
+        self.varCount = 0
+        # Per literal: 1 if true, 0 if false, -1 if unassigned
+        self.values = [-1, -1]
+        # Per literal: clauses that are watching it
+        self.watches = [[], []]
+        # Per literal: (other literal, clause) for each two literal clause.
+        #  These don't need watching; when one literal goes false the
+        #  other is implied straight away.
+        self.binary = [[], []]
+        # Per variable
+        self.levels = [0]
+        self.reasons = [None]
+        self.activity = [0.0]
+        self.polarity = [1]
+
+        self.trail = []
+        self.trailLimits = []
+        self.queueHead = 0
+        self.heap = []
+        self.bump = 1.0
+        self.unsatisfiable = False
+
+        self.conflicts = 0
+        self.decisions = 0
+        self.propagations = 0
+
+    def newVar(self):
+        self.varCount += 1
+        self.values.extend([-1, -1])
+        self.watches.extend([[], []])
+        self.binary.extend([[], []])
+        self.levels.append(0)
+        self.reasons.append(None)
+        self.activity.append(0.0)
+        # Prefer false first, which suits Tseitin encodings
+        self.polarity.append(1)
+        heapq.heappush(self.heap, (0.0, self.varCount))
+        return self.varCount
+
+    def decisionLevel(self):
+        return len(self.trailLimits)
+
+    def addClause(self, clause):
+        if self.unsatisfiable:
+            return False
+
+        lits = set()
+        for x in clause:
+            lit = 2 * x if x > 0 else -2 * x + 1
+            if lit ^ 1 in lits:
+                # Always true
+                return True
+            lits.add(lit)
+
+        # Clauses are only added at level 0, so anything already false
+        #  there can be dropped
+        lits = [lit for lit in lits if self.values[lit] != 0]
+        if any(self.values[lit] == 1 for lit in lits):
+            return True
+
+        if len(lits) == 0:
+            self.unsatisfiable = True
+            return False
+        if len(lits) == 1:
+            self.enqueue(lits[0], None)
+            if self.propagate() is not None:
+                self.unsatisfiable = True
+                return False
+            return True
+
+        self.attach(lits)
+        return True
+
+    def attach(self, clause):
+        if len(clause) == 2:
+            a, b = clause
+            # The implied literal has to be first when used as a reason
+            self.binary[a].append((b, [b, a]))
+            self.binary[b].append((a, [a, b]))
+        else:
+            self.watches[clause[0]].append(clause)
+            self.watches[clause[1]].append(clause)
+
+    def enqueue(self, lit, reason):
+        self.values[lit] = 1
+        self.values[lit ^ 1] = 0
+        v = lit >> 1
+        self.levels[v] = self.decisionLevel()
+        self.reasons[v] = reason
+        self.trail.append(lit)
+
+    # Unit propagation. Returns a conflicting clause, or None.
+    def propagate(self):
+        values = self.values
+        watches = self.watches
+        while self.queueHead < len(self.trail):
+            falseLit = self.trail[self.queueHead] ^ 1
+            self.queueHead += 1
+            self.propagations += 1
+
+            for other, clause in self.binary[falseLit]:
+                value = values[other]
+                if value == 0:
+                    return clause
+                if value == -1:
+                    self.enqueue(other, clause)
+
+            watching = watches[falseLit]
+            kept = []
+            conflict = None
+            i = 0
+            while i < len(watching):
+                clause = watching[i]
+                i += 1
+
+                # Keep the false literal in slot 1
+                if clause[0] == falseLit:
+                    clause[0] = clause[1]
+                    clause[1] = falseLit
+
+                if values[clause[0]] == 1:
+                    kept.append(clause)
+                    continue
+
+                # Look for another literal to watch
+                moved = False
+                for k in range(2, len(clause)):
+                    if values[clause[k]] != 0:
+                        clause[1] = clause[k]
+                        clause[k] = falseLit
+                        watches[clause[1]].append(clause)
+                        moved = True
+                        break
+                if moved:
+                    continue
+
+                kept.append(clause)
+                if values[clause[0]] == 0:
+                    conflict = clause
+                    kept.extend(watching[i:])
+                    break
+                self.enqueue(clause[0], clause)
+
+            watches[falseLit] = kept
+            if conflict is not None:
+                return conflict
+        return None
+
+    # First-UIP conflict analysis. Returns the learnt clause (asserting
+    #  literal first) and the level to go back to.
+    def analyze(self, conflict):
+        seen = set()
+        learnt = [None]
+        counter = 0
+        lit = None
+        index = len(self.trail) - 1
+        clause = conflict
+        level = self.decisionLevel()
+
+        while True:
+            start = 0 if lit is None else 1
+            for k in range(start, len(clause)):
+                q = clause[k]
+                v = q >> 1
+                if v not in seen and self.levels[v] > 0:
+                    seen.add(v)
+                    self.bumpActivity(v)
+                    if self.levels[v] == level:
+                        counter += 1
+                    else:
+                        learnt.append(q)
+
+            # The most recent literal on the trail that is part of this
+            while (self.trail[index] >> 1) not in seen:
+                index -= 1
+            lit = self.trail[index]
+            index -= 1
+            v = lit >> 1
+            seen.discard(v)
+            counter -= 1
+            if counter == 0:
+                break
+            clause = self.reasons[v]
+
+        learnt[0] = lit ^ 1
+
+        # Wide OR gates can make the first-UIP clause huge. The negated
+        #  decisions are always a valid clause too, so use them when they
+        #  are shorter.
+        if len(learnt) <= 4 * level:
+            learnt = self.minimize(learnt, seen)
+        if len(learnt) > level:
+            learnt = [self.trail[self.trailLimits[k]] ^ 1 for k in range(level - 1, -1, -1)]
+
+        backLevel = 0
+        if len(learnt) > 1:
+            # Watch the literal from the highest remaining level
+            best = 1
+            for k in range(2, len(learnt)):
+                if self.levels[learnt[k] >> 1] > self.levels[learnt[best] >> 1]:
+                    best = k
+            learnt[1], learnt[best] = learnt[best], learnt[1]
+            backLevel = self.levels[learnt[1] >> 1]
+
+        return learnt, backLevel
+
+    # Drops literals from a learnt clause that are implied by the others:
+    #  a literal is redundant when every literal of its reason is in the
+    #  clause, from level 0, or redundant itself.
+    def minimize(self, learnt, seen):
+        for q in learnt[1:]:
+            seen.add(q >> 1)
+
+        # Per variable: True if redundant, False if not
+        known = {}
+
+        def redundant(v):
+            stack = [v]
+            while len(stack) > 0:
+                u = stack[-1]
+                if u in known:
+                    stack.pop()
+                    continue
+
+                reason = self.reasons[u]
+                if reason is None:
+                    known[u] = False
+                    stack.pop()
+                    continue
+
+                pending = False
+                result = True
+                for k in range(1, len(reason)):
+                    w = reason[k] >> 1
+                    if w in seen or self.levels[w] == 0:
+                        continue
+                    if w not in known:
+                        stack.append(w)
+                        pending = True
+                    elif not known[w]:
+                        result = False
+                        break
+
+                if not result:
+                    known[u] = False
+                    stack.pop()
+                elif not pending:
+                    known[u] = True
+                    stack.pop()
+            return known[v]
+
+        minimized = [learnt[0]]
+        for q in learnt[1:]:
+            if self.reasons[q >> 1] is None or not redundant(q >> 1):
+                minimized.append(q)
+        return minimized
+
+    # Gives the variables a head start in the branching order
+    def prefer(self, variables):
+        for v in variables:
+            self.bumpActivity(v)
+
+    def bumpActivity(self, v):
+        self.activity[v] += self.bump
+        if self.activity[v] > 1e100:
+            for u in range(1, self.varCount + 1):
+                self.activity[u] *= 1e-100
+            self.bump *= 1e-100
+            self.heap = [(-self.activity[u], u) for u in range(1, self.varCount + 1)]
+            heapq.heapify(self.heap)
+        else:
+            heapq.heappush(self.heap, (-self.activity[v], v))
+
+    def backtrack(self, level):
+        if self.decisionLevel() <= level:
+            return
+        limit = self.trailLimits[level]
+        for k in range(len(self.trail) - 1, limit - 1, -1):
+            lit = self.trail[k]
+            v = lit >> 1
+            self.values[lit] = -1
+            self.values[lit ^ 1] = -1
+            self.reasons[v] = None
+            self.polarity[v] = lit & 1
+            heapq.heappush(self.heap, (-self.activity[v], v))
+        del self.trail[limit:]
+        del self.trailLimits[level:]
+        self.queueHead = len(self.trail)
+
+    # Most active unassigned variable, or None if all are assigned
+    def pickBranchVar(self):
+        while len(self.heap) > 0:
+            activity, v = heapq.heappop(self.heap)
+            if self.values[2 * v] == -1 and -activity == self.activity[v]:
+                return v
+        for v in range(1, self.varCount + 1):
+            if self.values[2 * v] == -1:
+                return v
+        return None
+
+    # Returns True if satisfiable, False if not, or None if conflictLimit
+    #  conflicts went by without an answer.
+    def solve(self, conflictLimit=None):
+        if self.unsatisfiable:
+            return False
+        if self.propagate() is not None:
+            self.unsatisfiable = True
+            return False
+
+        restart = 1
+        untilRestart = RESTART_BASE * luby(restart)
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                if self.decisionLevel() == 0:
+                    self.unsatisfiable = True
+                    return False
+
+                learnt, backLevel = self.analyze(conflict)
+                self.backtrack(backLevel)
+                if len(learnt) == 1:
+                    self.enqueue(learnt[0], None)
+                else:
+                    self.attach(learnt)
+                    self.enqueue(learnt[0], learnt)
+                self.bump /= ACTIVITY_DECAY
+
+                if conflictLimit is not None and self.conflicts >= conflictLimit:
+                    self.backtrack(0)
+                    return None
+
+                untilRestart -= 1
+                if untilRestart <= 0:
+                    self.backtrack(0)
+                    restart += 1
+                    untilRestart = RESTART_BASE * luby(restart)
+                continue
+
+            v = self.pickBranchVar()
+            if v is None:
+                return True
+            self.decisions += 1
+            self.trailLimits.append(len(self.trail))
+            self.enqueue(2 * v + self.polarity[v], None)
+
+    # Value of a variable in the model after solve() returned True
+    def value(self, v):
+        return self.values[2 * v]
+
+# The Luby restart sequence: 1 1 2 1 1 2 4 1 1 2 1 1 2 4 8 ...
+def luby(i):
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while i != (1 << k) - 1:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+# Adds clauses for every node of a BLIF network that the outputs depend
+#  on, one Tseitin variable per signal, working straight from the
+#  network's truth tables.
+# inputVars maps input names to solver variables and is shared between
+#  networks so they see the same inputs, as is structure (see
+#  encodeTruthTable). Returns a dict of output name -> literal.
+def encodeBLIF(solver, blif, inputVars, structure=None):
+    if structure is None:
+        structure = {}
+
+    for name in blif.inputNames:
+        if name not in inputVars:
+            inputVars[name] = solver.newVar()
+
+    signals = dict(inputVars)
+    expanded = set()
+    for output in blif.outputNames:
+        stack = [output]
+        while len(stack) > 0:
+            name = stack[-1]
+            if name in signals:
+                stack.pop()
+                continue
+
+            tt = blif.ttLookup.get(name)
+            if tt is None:
+                raise Exception("Signal {} is never driven.".format(name))
+
+            missing = [n for n in tt.getInputNames() if n not in signals]
+            if len(missing) > 0:
+                if name in expanded:
+                    raise Exception("Combinational loop through {}.".format(name))
+                expanded.add(name)
+                stack.extend(missing)
+                continue
+
+            signals[name] = encodeTruthTable(solver, tt, [signals[n] for n in tt.getInputNames()], structure)
+            stack.pop()
+
+    outputs = {}
+    for output in blif.outputNames:
+        outputs[output] = signals[output]
+    return outputs
+
+# Returns a literal that is equal to the truth table's output.
+# Tables with the same rows over the same input literals share one
+#  variable (structural hashing, through the shared structure dict), so
+#  the parts of two networks that weren't changed are the same variables
+#  and drop out of the miter.
+def encodeTruthTable(solver, tt, inputs, structure):
+    if len(tt.ones) > 0 or len(tt.zeros) == 0:
+        cubes = tt.ones
+        sign = 1
+    else:
+        # Only the OFF-set is listed
+        cubes = tt.zeros
+        sign = -1
+
+    key = (tuple(sorted(cubes)), tuple(inputs))
+    out = structure.get(key)
+    if out is None:
+        out = encodeCubes(solver, cubes, inputs)
+        structure[key] = out
+    return sign * out
+
+# inputs[0] is the highest bit of each cube
+def encodeCubes(solver, cubes, inputs):
+    top = len(inputs) - 1
+    out = solver.newVar()
+
+    terms = []
+    for value, mask in cubes:
+        literals = []
+        for bit in iterBits(mask):
+            if value >> bit & 1:
+                literals.append(inputs[top - bit])
+            else:
+                literals.append(-inputs[top - bit])
+
+        if len(literals) == 0:
+            # The row covers everything
+            solver.addClause([out])
+            return out
+        if len(literals) == 1:
+            terms.append(literals[0])
+            continue
+
+        # term <-> AND(literals)
+        term = solver.newVar()
+        for lit in literals:
+            solver.addClause([-term, lit])
+        solver.addClause([term] + [-lit for lit in literals])
+        terms.append(term)
+
+    # out <-> OR(terms)
+    solver.addClause([-out] + terms)
+    for term in terms:
+        solver.addClause([out, -term])
+    return out
+
+# Proves two BLIF networks equivalent with a SAT miter: the solver looks
+#  for inputs where some pair of outputs differ. Neither network is
+#  collapsed, so the problem grows with the netlists instead of with
+#  2^inputs.
+# Returns None if they are equivalent, otherwise a counterexample in the
+#  same form as simulate.findCounterexample.
+def satCounterexample(original, optimized, conflictLimit=None):
+    if sorted(original.outputNames) != sorted(optimized.outputNames):
+        raise Exception("The BLIFs have different outputs.")
+
+    solver = Solver()
+    inputVars = {}
+    structure = {}
+    originalOutputs = encodeBLIF(solver, original, inputVars, structure)
+    optimizedOutputs = encodeBLIF(solver, optimized, inputVars, structure)
+
+    # Every other signal follows from the inputs, so start by branching
+    #  on those. Learnt clauses soon move the search onto internal
+    #  signals, which matters when the two networks are built differently.
+    solver.prefer(inputVars.values())
+
+    differences = []
+    for output in original.outputNames:
+        a = originalOutputs[output]
+        b = optimizedOutputs[output]
+        if a == b:
+            continue
+        # d -> (a xor b)
+        d = solver.newVar()
+        solver.addClause([-d, a, b])
+        solver.addClause([-d, -a, -b])
+        differences.append(d)
+    solver.addClause(differences)
+
+    result = solver.solve(conflictLimit=conflictLimit)
+    if result is None:
+        raise Exception("SAT check gave up after {} conflicts.".format(conflictLimit))
+    if result is False:
+        return None
+
+    def literalValue(lit):
+        if lit > 0:
+            return solver.value(lit)
+        return 1 - solver.value(-lit)
+
+    inputs = {}
+    for name in original.inputNames:
+        inputs[name] = solver.value(inputVars[name])
+    for output in original.outputNames:
+        a = literalValue(originalOutputs[output])
+        b = literalValue(optimizedOutputs[output])
+        if a != b:
+            return {
+                "output": output,
+                "inputs": inputs,
+                "original": a,
+                "optimized": b,
+            }
+    raise Exception("SAT solver returned a model that doesn't differ.")
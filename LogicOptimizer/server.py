@@ -0,0 +1,274 @@
+from argparse import *
+import asyncio
+import io
+import itertools
+import json
+import os
+import signal
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pipeline import *
+
+# A long running optimizer that takes requests over a Unix domain socket,
+#  so a flow that optimizes thousands of small BLIFs only pays for
+#  starting Python and importing everything once. client.py is the
+#  command line side of it.
+#
+# Requests and responses are JSON objects, one per line. A request is
+#
+#   {"op": "optimize", "id": "...", "input": "/path/in.blif", "output": "/path/out.blif", "verify": true, ...}
+#
+#  where "blif" (the text of a BLIF) can stand in for "input", and
+#  without "output" the optimized BLIF comes back as "blif" in the
+#  response. The optimizer options in REQUEST_OPTIONS can be set too.
+#  Responses carry the request's id and a status of "ok", "error" or
+#  "cancelled". The other ops are "cancel" (with the id of a job),
+#  "status" and "ping".
+#
+# Jobs wait in a queue of --queue-size and run on a pool of -j worker
+#  processes. When the queue is full the server stops reading from the
+#  connection that wants to add more until there is room. Each worker
+#  keeps a MemoryCache (see cache.py) of the tables it has optimized for
+#  as long as it runs.
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "logicopt-{}.sock".format(os.getuid()))
+DEFAULT_QUEUE_SIZE = 64
+# Longest request line (a BLIF sent as text) the server will read
+MAX_REQUEST_BYTES = 256 * 1024 * 1024
+
+# optimzieBLIF options a request may set. The rest are the server's.
+REQUEST_OPTIONS = ["engine", "coverTimeLimit", "npnMaxInputs", "multiOutput", "memoryBudget", "timeLimit", "memLimit",
+                   "runTimeLimit"]
+
+# The cache of the worker process this is running in
+workerCache = None
+
+def startWorker(cacheEntries, cacheDir, cacheBytes):
+    global workerCache
+    backing = None
+    if cacheDir is not None:
+        backing = ResultCache(cacheDir, maxBytes=cacheBytes)
+    workerCache = MemoryCache(cacheEntries, backing=backing)
+
+# Runs in a worker process. Returns the response to an optimize request.
+def runRequest(request):
+    started = time.perf_counter()
+    options = dict((name, request[name]) for name in REQUEST_OPTIONS if name in request)
+
+    if "blif" in request:
+        inputFile = io.BytesIO(request["blif"].encode())
+    elif "input" in request:
+        inputFile = request["input"]
+    else:
+        raise Exception("The request has neither a blif nor an input file.")
+    outputFile = request.get("output")
+    if outputFile is None:
+        outputFile = io.StringIO()
+
+    verifyEngine = None
+    if request.get("verify"):
+        verifyEngine = request.get("verifyEngine", "sim")
+
+    result = optimizeFile(inputFile, outputFile, verifyEngine=verifyEngine, cache=workerCache, **options)
+
+    response = {
+        "status": "ok",
+        "cutShort": result["cutShort"],
+        "rowsBefore": result["rowsBefore"],
+        "rowsAfter": result["rowsAfter"],
+    }
+    if isinstance(outputFile, io.StringIO):
+        response["blif"] = outputFile.getvalue()
+    if verifyEngine is not None:
+        response["counterexample"] = result["counterexample"]
+        response["verified"] = result["verified"]
+    response["seconds"] = time.perf_counter() - started
+    return response
+
+class Job:
+    def __init__(self, jobId, request, connection):
+        self.id = jobId
+        self.request = request
+        self.connection = connection
+        self.running = False
+        self.cancelled = False
+
+# One client connection. Responses to its jobs can be ready in any
+#  order, so writes go through a lock.
+class Connection:
+    def __init__(self, writer):
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        self.jobs = set()
+        self.closed = False
+
+    async def send(self, response):
+        if self.closed:
+            return
+        async with self.lock:
+            try:
+                self.writer.write(json.dumps(response).encode() + b"\n")
+                await self.writer.drain()
+            except (ConnectionError, OSError):
+                self.closed = True
+
+class OptimizerServer:
+    def __init__(self, socketPath=DEFAULT_SOCKET, jobs=1, queueSize=DEFAULT_QUEUE_SIZE,
+                 cacheEntries=DEFAULT_MEMORY_CACHE_ENTRIES, cacheDir=None, cacheBytes=DEFAULT_CACHE_BYTES):
+        self.socketPath = socketPath
+        self.workers = jobs
+        self.queueSize = queueSize
+        self.poolArgs = (cacheEntries, cacheDir, cacheBytes)
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def newPool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=startWorker, initargs=self.poolArgs)
+
+    async def serve(self):
+        self.queue = asyncio.Queue(maxsize=self.queueSize)
+        self.pool = self.newPool()
+        self.stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stopping.set)
+
+        if os.path.exists(self.socketPath):
+            os.remove(self.socketPath)
+        server = await asyncio.start_unix_server(self.handle, path=self.socketPath, limit=MAX_REQUEST_BYTES)
+        workers = [asyncio.create_task(self.work()) for i in range(0, self.workers)]
+        print("Listening on {} with {} workers.".format(self.socketPath, self.workers))
+        try:
+            async with server:
+                await self.stopping.wait()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            if os.path.exists(self.socketPath):
+                os.remove(self.socketPath)
+        print("Stopped after {} jobs ({} failed, {} cancelled).".format(self.completed, self.failed, self.cancelled))
+
+    async def handle(self, reader, writer):
+        connection = Connection(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError) as e:
+                    # ValueError is a line longer than MAX_REQUEST_BYTES
+                    await connection.send({"status": "error", "message": str(e)})
+                    break
+                if len(line) == 0:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request must be a JSON object.")
+                except ValueError as e:
+                    await connection.send({"status": "error", "message": "Bad request: {}".format(e)})
+                    continue
+                await self.dispatch(request, connection)
+        finally:
+            connection.closed = True
+            # Nobody is left to hear about the jobs from this connection
+            for job in list(connection.jobs):
+                self.cancel(job)
+            writer.close()
+
+    async def dispatch(self, request, connection):
+        op = request.get("op", "optimize")
+        if op == "optimize":
+            jobId = str(request.get("id", "job{}".format(next(self.ids))))
+            if jobId in self.jobs:
+                await connection.send({"id": jobId, "status": "error", "message": "Job {} already exists.".format(jobId)})
+                return
+            job = Job(jobId, request, connection)
+            self.jobs[jobId] = job
+            connection.jobs.add(job)
+            # Waits here while the queue is full, which stops this
+            #  connection's requests from being read
+            await self.queue.put(job)
+        elif op == "cancel":
+            job = self.jobs.get(str(request.get("id")))
+            if job is None:
+                await connection.send({"id": request.get("id"), "status": "error", "message": "No such job."})
+                return
+            self.cancel(job)
+            await job.connection.send({"id": job.id, "status": "cancelled"})
+            if job.connection is not connection:
+                await connection.send({"id": job.id, "status": "cancelled"})
+        elif op == "status":
+            await connection.send({"status": "ok", "queued": self.queue.qsize(), "queueSize": self.queueSize,
+                                   "running": sum(1 for job in self.jobs.values() if job.running),
+                                   "workers": self.workers, "completed": self.completed, "failed": self.failed,
+                                   "cancelled": self.cancelled})
+        elif op == "ping":
+            await connection.send({"status": "ok"})
+        else:
+            await connection.send({"status": "error", "message": "Unknown op {}.".format(op)})
+
+    # A queued job is dropped when a worker gets to it. A running one can't
+    #  be stopped inside the pool, so it finishes and its result is thrown
+    #  away.
+    def cancel(self, job):
+        if not job.cancelled:
+            job.cancelled = True
+            self.cancelled += 1
+        self.jobs.pop(job.id, None)
+        job.connection.jobs.discard(job)
+
+    async def work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.cancelled:
+                    continue
+                job.running = True
+                pool = self.pool
+                try:
+                    response = await loop.run_in_executor(pool, runRequest, job.request)
+                except BrokenProcessPool:
+                    # A worker died (killed for using too much memory, say)
+                    #  and took the pool with it
+                    if self.pool is pool:
+                        self.pool = self.newPool()
+                    response = {"status": "error", "message": "The worker process running the job died."}
+                except Exception as e:
+                    response = {"status": "error",
+                                "message": "".join(traceback.format_exception_only(type(e), e)).strip()}
+                job.running = False
+
+                if job.cancelled:
+                    continue
+                self.jobs.pop(job.id, None)
+                job.connection.jobs.discard(job)
+                if response["status"] == "ok":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                response["id"] = job.id
+                await job.connection.send(response)
+            finally:
+                self.queue.task_done()
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Run the optimizer as a server on a Unix domain socket (see client.py).")
+    parser.add_argument("--socket", dest="socketPath", help="Path of the socket to listen on.", default=DEFAULT_SOCKET)
+    parser.add_argument("-j", dest="jobs", help="Number of worker processes.", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--queue-size", dest="queueSize", help="Jobs that may wait for a worker before clients have to wait to send more.", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--cache-entries", dest="cacheEntries", help="Covers each worker keeps in memory.", type=int, default=DEFAULT_MEMORY_CACHE_ENTRIES)
+    parser.add_argument("--cache-dir", dest="cacheDir", help="Directory of a result cache on disk, shared by the workers and other runs.", default=None)
+    parser.add_argument("--cache-size", dest="cacheSize", help="Megabytes the result cache on disk may use.", type=float, default=DEFAULT_CACHE_BYTES / (1024 * 1024))
+    args = parser.parse_args()
+
+    server = OptimizerServer(args.socketPath, jobs=args.jobs, queueSize=args.queueSize, cacheEntries=args.cacheEntries,
+                             cacheDir=args.cacheDir, cacheBytes=int(args.cacheSize * 1024 * 1024))
+    asyncio.run(server.serve())
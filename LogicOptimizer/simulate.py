@@ -0,0 +1,228 @@
+import random
+from cube import *
+
+# NumPy is optional. Without it the same bit-parallel simulation runs on
+#  Python ints, which is slower for big batches but still exact.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Networks with this many inputs or fewer are checked on every input pattern
+EXHAUSTIVE_MAX_INPUTS = 20
+# Otherwise this many batches of random patterns are simulated
+RANDOM_BATCHES = 16
+# 64 patterns per word
+WORDS_PER_BATCH = 1024
+
+# Bit patterns for the first 6 inputs within one 64-bit word when
+#  enumerating every input pattern.
+WORD_PATTERNS = [
+    0xAAAAAAAAAAAAAAAA,
+    0xCCCCCCCCCCCCCCCC,
+    0xF0F0F0F0F0F0F0F0,
+    0xFF00FF00FF00FF00,
+    0xFFFF0000FFFF0000,
+    0xFFFFFFFF00000000,
+]
+ALL_ONES = 0xFFFFFFFFFFFFFFFF
+
+# Probability of an input being 1 for each random batch, cycled through
+#  so that functions which are almost always 0 or 1 get exercised too.
+BATCH_WEIGHTS = [0.5, 0.25, 0.75, 0.125, 0.875]
+
+# Simulates every node of a BLIF network at once on many input patterns.
+#
+# inputs maps each input name to a word vector (a NumPy uint64 array, or a
+#  Python int used as a bit vector) with one bit per pattern, and ones is
+#  the all-ones vector of the same size. Returns a dict of name -> vector
+#  for every signal that was needed to compute the outputs.
+def simulateBLIF(blif, inputs, ones):
+    values = dict(inputs)
+    expanded = set()
+
+    for output in blif.outputNames:
+        # Depth first walk without recursion so deep networks are fine
+        stack = [output]
+        while len(stack) > 0:
+            name = stack[-1]
+            if name in values:
+                stack.pop()
+                continue
+
+            tt = blif.ttLookup.get(name)
+            if tt is None:
+                raise Exception("Signal {} is never driven.".format(name))
+
+            missing = [n for n in tt.getInputNames() if n not in values]
+            if len(missing) > 0:
+                if name in expanded:
+                    raise Exception("Combinational loop through {}.".format(name))
+                expanded.add(name)
+                stack.extend(missing)
+                continue
+
+            values[name] = simulateTruthTable(tt, [values[n] for n in tt.getInputNames()], ones)
+            stack.pop()
+
+    return values
+
+# The ON rows of a table are ORed together. A table with only "0" rows
+#  lists its OFF-set, so the result is inverted.
+def simulateTruthTable(tt, inputs, ones):
+    if len(tt.ones) > 0 or len(tt.zeros) == 0:
+        return simulateCubes(tt.ones, inputs, ones)
+    return simulateCubes(tt.zeros, inputs, ones) ^ ones
+
+# inputs[0] is the left most column of the table, which is the highest
+#  bit of each cube
+def simulateCubes(cubes, inputs, ones):
+    top = len(inputs) - 1
+    result = ones ^ ones
+    for value, mask in cubes:
+        term = ones
+        for bit in iterBits(mask):
+            if value >> bit & 1:
+                term = term & inputs[top - bit]
+            else:
+                term = term & (inputs[top - bit] ^ ones)
+        result = result | term
+    return result
+
+# Every input pattern, 64 per word. Pattern p sets input k to bit k of p.
+def exhaustivePatterns(inputNames):
+    count = len(inputNames)
+    if numpy is not None:
+        words = 1 << (count - 6) if count > 6 else 1
+        index = numpy.arange(words, dtype=numpy.uint64)
+        patterns = {}
+        for k, name in enumerate(inputNames):
+            if k < 6:
+                patterns[name] = numpy.full(words, WORD_PATTERNS[k], dtype=numpy.uint64)
+            else:
+                bit = (index >> numpy.uint64(k - 6)) & numpy.uint64(1)
+                patterns[name] = bit * numpy.uint64(ALL_ONES)
+            if count < 6:
+                patterns[name] &= numpy.uint64((1 << (1 << count)) - 1)
+        ones = numpy.full(words, ALL_ONES if count >= 6 else (1 << (1 << count)) - 1, dtype=numpy.uint64)
+        return patterns, ones, 1 << count
+
+    size = 1 << count
+    patterns = {}
+    for k, name in enumerate(inputNames):
+        # Blocks of 2^k zeros followed by 2^k ones
+        word = ((1 << (1 << k)) - 1) << (1 << k)
+        period = 1 << (k + 1)
+        while period < size:
+            word |= word << period
+            period <<= 1
+        patterns[name] = word
+    return patterns, (1 << size) - 1, size
+
+# A batch of random patterns where each input is 1 with probability weight
+#  (rounded to a multiple of 1/8).
+def randomPatterns(inputNames, weight, rng, words=WORDS_PER_BATCH):
+    # ANDing random words lowers the probability of a 1, ORing raises it
+    steps = []
+    w = weight
+    for i in range(0, 3):
+        if abs(w - 0.5) < 1e-9:
+            break
+        if w < 0.5:
+            steps.append("and")
+            w *= 2
+        else:
+            steps.append("or")
+            w = 2 * w - 1
+
+    if numpy is not None:
+        def word():
+            return rng.integers(0, ALL_ONES, size=words, dtype=numpy.uint64, endpoint=True)
+        ones = numpy.full(words, ALL_ONES, dtype=numpy.uint64)
+    else:
+        def word():
+            return rng.getrandbits(64 * words)
+        ones = (1 << (64 * words)) - 1
+
+    patterns = {}
+    for name in inputNames:
+        bits = word()
+        # Apply the steps in reverse so the first one is the outermost
+        for step in reversed(steps):
+            if step == "and":
+                bits = bits & word()
+            else:
+                bits = bits | word()
+        patterns[name] = bits
+    return patterns, ones, 64 * words
+
+# Returns the index of the lowest set bit of a word vector, or None
+def firstSetBit(vector):
+    if numpy is not None and isinstance(vector, numpy.ndarray):
+        nonzero = numpy.flatnonzero(vector)
+        if len(nonzero) == 0:
+            return None
+        w = int(nonzero[0])
+        word = int(vector[w])
+        return w * 64 + (word & -word).bit_length() - 1
+
+    if vector == 0:
+        return None
+    return (vector & -vector).bit_length() - 1
+
+def bitAt(vector, index):
+    if numpy is not None and isinstance(vector, numpy.ndarray):
+        return (int(vector[index // 64]) >> (index % 64)) & 1
+    return (vector >> index) & 1
+
+# Simulates both networks on the same patterns and looks for an output
+#  that differs. Returns None if there is none, otherwise a dict with
+#  the output name and the input values that show the difference.
+def compareOnPatterns(original, optimized, patterns, ones):
+    originalValues = simulateBLIF(original, patterns, ones)
+    optimizedValues = simulateBLIF(optimized, patterns, ones)
+
+    for output in original.outputNames:
+        index = firstSetBit(originalValues[output] ^ optimizedValues[output])
+        if index is not None:
+            inputs = {}
+            for name in original.inputNames:
+                inputs[name] = bitAt(patterns[name], index)
+            return {
+                "output": output,
+                "inputs": inputs,
+                "original": bitAt(originalValues[output], index),
+                "optimized": bitAt(optimizedValues[output], index),
+            }
+    return None
+
+# Checks that two BLIF networks compute the same outputs. Small networks
+#  are checked on every input pattern, larger ones on batches of random
+#  patterns with a range of input weights.
+# Returns (counterexample, patternsChecked, exhaustive) where
+#  counterexample is None when no difference was found.
+def findCounterexample(original, optimized, exhaustiveMaxInputs=EXHAUSTIVE_MAX_INPUTS,
+                       batches=RANDOM_BATCHES, seed=None):
+    if sorted(original.outputNames) != sorted(optimized.outputNames):
+        raise Exception("The BLIFs have different outputs.")
+
+    inputNames = original.inputNames
+    if len(inputNames) <= exhaustiveMaxInputs:
+        patterns, ones, count = exhaustivePatterns(inputNames)
+        return compareOnPatterns(original, optimized, patterns, ones), count, True
+
+    if numpy is not None:
+        rng = numpy.random.default_rng(seed)
+    else:
+        rng = random.Random(seed)
+
+    checked = 0
+    for b in range(0, batches):
+        weight = BATCH_WEIGHTS[b % len(BATCH_WEIGHTS)]
+        patterns, ones, count = randomPatterns(inputNames, weight, rng)
+        counterexample = compareOnPatterns(original, optimized, patterns, ones)
+        checked += count
+        if counterexample is not None:
+            return counterexample, checked, False
+
+    return None, checked, False
@@ -0,0 +1,261 @@
+import heapq
+import os
+import shutil
+import tempfile
+from cube import *
+
+# The out-of-core mode needs NumPy for its memory-mapped columns
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Terms are packed like in kernel.py: mask << 32 | value, next to a
+#  uint64 of output tags, so each record is 16 bytes.
+SPILL_MAX_WIDTH = 32
+SPILL_MAX_OUTPUTS = 64
+MASK_SHIFT = 32
+RECORD_BYTES = 16
+# Later columns can hold many times as many terms as the first one, so a
+#  table is spilled once its first column takes more than this fraction
+#  of the budget.
+SPILL_HEADROOM = 16
+# Working copies made while starring a chunk (candidates, partners,
+#  merged terms, ...) take about this many times the chunk itself
+CHUNK_OVERHEAD = 8
+MIN_CHUNK_RECORDS = 1024
+
+# Should the star phase for this batch run out of core?
+def spillNeeded(width, terms, maxTag, memoryBudget):
+    if memoryBudget is None or width > SPILL_MAX_WIDTH or maxTag >= (1 << SPILL_MAX_OUTPUTS):
+        return False
+    return terms * RECORD_BYTES * SPILL_HEADROOM > memoryBudget
+
+# One QM column on disk. Terms are partitioned by the number of ones in
+#  their value, and each partition is a sorted file of unique packed
+#  terms with a parallel file of tags. Both are memory-mapped when read,
+#  so the OS only keeps the pages that are being probed.
+class SpilledColumn:
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.sizes = {}
+        self.pending = {}
+
+    def path(self, ones, kind):
+        return os.path.join(self.directory, "{}-{}.{}".format(self.name, ones, kind))
+
+    def keys(self, ones, mode="r"):
+        return self.map(ones, "keys", mode)
+
+    def tags(self, ones, mode="r"):
+        return self.map(ones, "tags", mode)
+
+    def map(self, ones, kind, mode):
+        size = self.sizes.get(ones, 0)
+        if size == 0:
+            return numpy.zeros(0, dtype=numpy.uint64)
+        return numpy.memmap(self.path(ones, kind), dtype=numpy.uint64, mode=mode, shape=(size,))
+
+    def partitions(self):
+        return sorted(ones for ones, size in self.sizes.items() if size > 0)
+
+    def count(self):
+        return sum(self.sizes.values())
+
+    # Appends unsorted terms to a partition. finish() sorts them.
+    def append(self, ones, keys, tags):
+        if len(keys) == 0:
+            return
+        with open(self.path(ones, "keys.raw"), "ab") as f:
+            keys.tofile(f)
+        with open(self.path(ones, "tags.raw"), "ab") as f:
+            tags.tofile(f)
+        self.pending[ones] = self.pending.get(ones, 0) + len(keys)
+
+    # Sorts and deduplicates every partition that was appended to
+    def finish(self, chunkRecords):
+        for ones, size in self.pending.items():
+            keysPath = self.path(ones, "keys.raw")
+            tagsPath = self.path(ones, "tags.raw")
+            if size <= chunkRecords:
+                keys, first = numpy.unique(numpy.fromfile(keysPath, dtype=numpy.uint64), return_index=True)
+                tags = numpy.fromfile(tagsPath, dtype=numpy.uint64)[first]
+                keys.tofile(self.path(ones, "keys"))
+                tags.tofile(self.path(ones, "tags"))
+                self.sizes[ones] = len(keys)
+            else:
+                self.sizes[ones] = externalUnique(keysPath, tagsPath, size, chunkRecords,
+                                                  self.path(ones, "keys"), self.path(ones, "tags"))
+            os.remove(keysPath)
+            os.remove(tagsPath)
+        self.pending = {}
+
+    def remove(self):
+        for ones in list(self.sizes):
+            for kind in ("keys", "tags", "used"):
+                path = self.path(ones, kind)
+                if os.path.exists(path):
+                    os.remove(path)
+        self.sizes = {}
+
+# Sorts a partition that doesn't fit in the budget: each chunk is sorted
+#  into its own run, then the runs are merged, keeping the first copy of
+#  every term. Returns how many terms are left.
+def externalUnique(keysPath, tagsPath, size, chunkRecords, outKeysPath, outTagsPath):
+    keys = numpy.memmap(keysPath, dtype=numpy.uint64, mode="r", shape=(size,))
+    tags = numpy.memmap(tagsPath, dtype=numpy.uint64, mode="r", shape=(size,))
+    runs = []
+    for start in range(0, size, chunkRecords):
+        runKeys, first = numpy.unique(numpy.array(keys[start:start + chunkRecords]), return_index=True)
+        runTags = numpy.array(tags[start:start + chunkRecords])[first]
+        path = "{}.run{}".format(keysPath, len(runs))
+        numpy.stack([runKeys, runTags], axis=1).tofile(path)
+        runs.append((path, len(runKeys)))
+    del keys, tags
+
+    def readRun(path, count):
+        records = numpy.memmap(path, dtype=numpy.uint64, mode="r", shape=(count, 2))
+        for start in range(0, count, chunkRecords):
+            for key, tag in records[start:start + chunkRecords].tolist():
+                yield key, tag
+
+    written = 0
+    last = None
+    outKeys = []
+    outTags = []
+    with open(outKeysPath, "wb") as keysFile, open(outTagsPath, "wb") as tagsFile:
+        for key, tag in heapq.merge(*[readRun(path, count) for path, count in runs]):
+            if key == last:
+                continue
+            last = key
+            outKeys.append(key)
+            outTags.append(tag)
+            if len(outKeys) >= chunkRecords:
+                numpy.array(outKeys, dtype=numpy.uint64).tofile(keysFile)
+                numpy.array(outTags, dtype=numpy.uint64).tofile(tagsFile)
+                written += len(outKeys)
+                outKeys = []
+                outTags = []
+        numpy.array(outKeys, dtype=numpy.uint64).tofile(keysFile)
+        numpy.array(outTags, dtype=numpy.uint64).tofile(tagsFile)
+        written += len(outKeys)
+
+    for path, count in runs:
+        os.remove(path)
+    return written
+
+# Quine-McCluskey's star phase with the columns kept on disk, for tables
+#  whose columns don't fit in memoryBudget bytes.
+#
+# It works like starColumnsVectorized (kernel.py), except only one chunk
+#  of the lesser partition is in memory at a time. Its partners are
+#  found with a binary search over the memory-mapped partition with one
+#  more 1, and the merged terms are streamed to the next column's files.
+#
+# Takes the values and tags of the minterms, and returns every prime
+#  implicant as (value, mask, tag). If stats are given (see stats.py)
+#  every column's size and star attempts are added to them.
+def starColumnsOutOfCore(values, tags, width, memoryBudget, debug=False, budget=None, stats=None):
+    if numpy is None:
+        raise Exception("The out-of-core QM mode needs NumPy.")
+
+    chunkRecords = max(MIN_CHUNK_RECORDS, memoryBudget // (RECORD_BYTES * CHUNK_OVERHEAD))
+    full = (1 << width) - 1
+    zero = numpy.uint64(0)
+
+    directory = tempfile.mkdtemp(prefix="qm-columns-")
+    try:
+        column = SpilledColumn(directory, "c0")
+        values = numpy.array(values, dtype=numpy.uint64)
+        tags = numpy.array(tags, dtype=numpy.uint64)
+        ones = popcounts(values, width)
+        for k in numpy.unique(ones).tolist():
+            selected = ones == k
+            column.append(k, values[selected] | numpy.uint64(full << MASK_SHIFT), tags[selected])
+        del values, tags, ones
+        column.finish(chunkRecords)
+
+        primes = []
+        number = 0
+        while column.count() > 0:
+            if debug:
+                print("Starring {} terms out of core.".format(column.count()))
+
+            number += 1
+            nextColumn = SpilledColumn(directory, "c{}".format(number))
+            attempts = 0
+            successes = 0
+            used = {}
+            for k in column.partitions():
+                used[k] = numpy.memmap(column.path(k, "used"), dtype=numpy.uint8, mode="w+",
+                                       shape=(column.sizes[k],))
+
+            for k in column.partitions():
+                if column.sizes.get(k + 1, 0) == 0:
+                    continue
+                lesserKeys = column.keys(k)
+                lesserTags = column.tags(k)
+                greaterKeys = column.keys(k + 1)
+                greaterTags = column.tags(k + 1)
+                last = len(greaterKeys) - 1
+
+                for start in range(0, len(lesserKeys), chunkRecords):
+                    if budget is not None:
+                        budget.check()
+                    chunkKeys = numpy.array(lesserKeys[start:start + chunkRecords])
+                    chunkTags = numpy.array(lesserTags[start:start + chunkRecords])
+                    for i in range(0, width):
+                        bit = numpy.uint64(1 << i)
+                        maskBit = numpy.uint64(1 << (i + MASK_SHIFT))
+
+                        lesser = numpy.nonzero(((chunkKeys & maskBit) != zero) & ((chunkKeys & bit) == zero))[0]
+                        if len(lesser) == 0:
+                            continue
+                        attempts += len(lesser)
+                        partners = chunkKeys[lesser] | bit
+                        greater = numpy.minimum(numpy.searchsorted(greaterKeys, partners), last)
+                        found = numpy.asarray(greaterKeys[greater]) == partners
+                        lesser = lesser[found]
+                        greater = greater[found]
+
+                        merged = chunkTags[lesser] & numpy.asarray(greaterTags[greater])
+                        shares = merged != zero
+                        lesser = lesser[shares]
+                        greater = greater[shares]
+                        merged = merged[shares]
+                        successes += len(lesser)
+
+                        used[k][start + lesser[merged == chunkTags[lesser]]] = 1
+                        used[k + 1][greater[merged == numpy.asarray(greaterTags[greater])]] = 1
+                        nextColumn.append(k, chunkKeys[lesser] & ~maskBit, merged)
+
+            if stats is not None:
+                stats.column(number - 1, column.count(), attempts, successes)
+
+            # Anything that never merged is a prime implicant
+            for k in column.partitions():
+                keys = column.keys(k)
+                tags = column.tags(k)
+                for start in range(0, len(keys), chunkRecords):
+                    unused = numpy.asarray(used[k][start:start + chunkRecords]) == 0
+                    for key, tag in zip(numpy.asarray(keys[start:start + chunkRecords])[unused].tolist(),
+                                        numpy.asarray(tags[start:start + chunkRecords])[unused].tolist()):
+                        primes.append((key & full, key >> MASK_SHIFT, tag))
+                del keys, tags
+
+            used = None
+            column.remove()
+            nextColumn.finish(chunkRecords)
+            column = nextColumn
+
+        return primes
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+# Number of ones in each value of a uint64 array
+def popcounts(values, width):
+    counts = numpy.zeros(len(values), dtype=numpy.int64)
+    for i in range(0, width):
+        counts += ((values >> numpy.uint64(i)) & numpy.uint64(1)).astype(numpy.int64)
+    return counts
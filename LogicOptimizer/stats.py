@@ -0,0 +1,179 @@
+import cProfile
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Wall and CPU time of the phases of a run, and counters of what they
+#  did. A run has one Stats, and every table (or multi-output group, or
+#  NPN class) it optimizes gets one of its own from table().
+#
+# Everything that takes a stats argument does nothing extra when it is
+#  None, which is the default, so a run without --stats only pays for a
+#  few "is not None" checks.
+class Stats:
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        # Quine-McCluskey's columns, added up over every run through them
+        #  (cofactor leaves and so on), indexed by column number
+        self.columns = []
+        self.tables = {}
+
+    # For phases that don't sit nicely in a with block: pass what start()
+    #  returned to stop() when the phase is over
+    def start(self):
+        return time.perf_counter(), time.process_time()
+
+    def stop(self, name, started):
+        wall, cpu = started
+        phase = self.phases.setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+        phase["wall"] += time.perf_counter() - wall
+        phase["cpu"] += time.process_time() - cpu
+        phase["calls"] += 1
+
+    @contextmanager
+    def phase(self, name):
+        started = self.start()
+        try:
+            yield
+        finally:
+            self.stop(name, started)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    # terms is the size of the column, attempts is how many partners were
+    #  looked for and successes how many of them starred
+    def column(self, number, terms, attempts, successes):
+        while len(self.columns) <= number:
+            self.columns.append({"terms": 0, "attempts": 0, "successes": 0})
+        column = self.columns[number]
+        column["terms"] += terms
+        column["attempts"] += attempts
+        column["successes"] += successes
+
+    def table(self, name):
+        if name not in self.tables:
+            self.tables[name] = Stats()
+        return self.tables[name]
+
+    # Adds everything other has recorded (from a worker process, say)
+    def merge(self, other):
+        for name, phase in other.phases.items():
+            mine = self.phases.setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+            for k in mine:
+                mine[k] += phase[k]
+        for name, n in other.counters.items():
+            self.count(name, n)
+        for number, column in enumerate(other.columns):
+            self.column(number, column["terms"], column["attempts"], column["successes"])
+        for name, table in other.tables.items():
+            self.table(name).merge(table)
+
+    # The counters of every table added together
+    def tableTotals(self):
+        totals = Stats()
+        for table in self.tables.values():
+            totals.merge(table)
+        return totals
+
+    def toDict(self):
+        result = {"phases": self.phases, "counters": self.counters}
+        if len(self.columns) > 0:
+            result["columns"] = self.columns
+        if len(self.tables) > 0:
+            totals = self.tableTotals()
+            result["tableTotals"] = {"phases": totals.phases, "counters": totals.counters, "columns": totals.columns}
+            result["tables"] = dict((name, table.toDict()) for name, table in self.tables.items())
+        return result
+
+    def toJSON(self):
+        return json.dumps(self.toDict(), indent=2, sort_keys=True)
+
+    def summary(self):
+        lines = []
+        for name, phase in self.phases.items():
+            lines.append("{}: {:.3f}s wall, {:.3f}s CPU ({} calls)".format(name, phase["wall"], phase["cpu"],
+                                                                          phase["calls"]))
+        totals = self.tableTotals()
+        for name, phase in sorted(totals.phases.items()):
+            lines.append("  {} (all tables): {:.3f}s wall, {:.3f}s CPU".format(name, phase["wall"], phase["cpu"]))
+        counters = dict(self.counters)
+        for name, n in totals.counters.items():
+            counters[name] = counters.get(name, 0) + n
+        for name in sorted(counters):
+            lines.append("{}: {}".format(name, counters[name]))
+        for number, column in enumerate(totals.columns):
+            lines.append("Column {}: {} terms, {} of {} star attempts merged".format(
+                number, column["terms"], column["successes"], column["attempts"]))
+
+        # The slowest tables are the interesting ones
+        slowest = sorted(self.tables.items(), key=lambda item: -item[1].phases.get("optimize", {}).get("wall", 0))
+        for name, table in slowest[:10]:
+            if "optimize" in table.phases:
+                lines.append("Table {}: {:.3f}s wall, {:.3f}s CPU".format(
+                    name, table.phases["optimize"]["wall"], table.phases["optimize"]["cpu"]))
+        return "\n".join(lines)
+
+# stats.phase(name), or a block that does nothing when stats is None
+def timedPhase(stats, name):
+    if stats is None:
+        return nullcontext()
+    return stats.phase(name)
+
+# cProfile between start() and stop(). write() saves the profile for
+#  pstats or snakeviz. Only this process is profiled, not -j workers.
+class Profiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+# Looks at the stack of the thread that made it every interval seconds
+#  while it runs. Much cheaper than cProfile on long runs, since nothing
+#  happens between samples. Like Profiler, only this process is sampled.
+#
+# write() saves the samples as collapsed stacks ("outer;inner count" per
+#  line), which flamegraph.pl and speedscope read.
+class Sampler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = {}
+        self.threadId = threading.get_ident()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.threadId)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("{}:{}".format(code.co_filename.split("/")[-1], code.co_name))
+                frame = frame.f_back
+            if len(stack) > 0:
+                key = ";".join(reversed(stack))
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, n in sorted(self.samples.items()):
+                f.write("{} {}\n".format(stack, n))
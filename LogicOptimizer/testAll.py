@@ -1,46 +1,180 @@
-import sys
+from argparse import *
+import json
+import multiprocessing
+import multiprocessing.connection
 import os
-import subprocess
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+from contextlib import redirect_stdout
+from pipeline import *
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Optimizes and verifies every BLIF in a directory.
+#
+# Each file runs in a worker process of its own (forked from this one, so
+#  the library is only imported once), jobs of them at a time. A file
+#  that takes more than --timeout seconds is killed, and one that goes
+#  over --mem-limit runs out of memory in its own process. The BLIF
+#  import/export round-trip test runs once, before the files.
+#
+# Results go in the output directory: <name>Out.blif and <name>.txt (the
+#  console output) for every file, and results.json with the status and
+#  timings of each one.
+
+SUCCESS = "pass"
+
+# Runs in the worker process. Sends back a dict with the file's status
+#  ("pass", "fail", "error" or "memory") and what optimizeFile returned.
+def testFile(path, outputDirectory, memLimit, options, sender):
+    name = os.path.splitext(os.path.basename(path))[0]
+    result = {"file": path, "output": os.path.join(outputDirectory, "{}Out.blif".format(name))}
+    started = time.perf_counter()
+    try:
+        if memLimit is not None and resource is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (memLimit, memLimit))
+        with open(os.path.join(outputDirectory, "{}.txt".format(name)), "w") as log, redirect_stdout(log):
+            stats = Stats()
+            outcome = optimizeFile(path, result["output"], stats=stats, **options)
+            result["status"] = SUCCESS if outcome["counterexample"] is None else "fail"
+            result["cutShort"] = outcome["cutShort"]
+            result["rowsBefore"] = outcome["rowsBefore"]
+            result["rowsAfter"] = outcome["rowsAfter"]
+            result["phases"] = dict((phase, timing["wall"]) for phase, timing in stats.phases.items())
+            if outcome["counterexample"] is not None:
+                result["message"] = "Output {} differs.".format(outcome["counterexample"]["output"])
+    except MemoryError:
+        result["status"] = "memory"
+    except Exception as e:
+        result["status"] = "error"
+        result["message"] = "".join(traceback.format_exception_only(type(e), e)).strip()
+    result["seconds"] = time.perf_counter() - started
+    sender.send(result)
+    sender.close()
+
+# Runs the files in up to jobs worker processes at a time. The biggest
+#  files start first so one slow file doesn't hold up the end of the run.
+# Returns the result of every file, in the order they finished.
+def runFiles(paths, outputDirectory, jobs=1, timeout=None, memLimit=None, options=None, verbose=True):
+    pending = sorted(paths, key=lambda path: -os.path.getsize(path))
+    running = {}
+    results = []
+    while len(pending) > 0 or len(running) > 0:
+        while len(pending) > 0 and len(running) < jobs:
+            path = pending.pop(0)
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=testFile,
+                                              args=(path, outputDirectory, memLimit, options or {}, sender))
+            process.start()
+            sender.close()
+            running[process] = (path, time.perf_counter(), receiver)
+
+        waitFor = [process.sentinel for process in running] + [receiver for path, started, receiver in running.values()]
+        multiprocessing.connection.wait(waitFor, timeout=0.1)
 
-def runTestWithBlifAtPath(path):
-    filename = (path.split(".")[-2]).split("/")[-1]
+        for process, (path, started, receiver) in list(running.items()):
+            result = None
+            if receiver.poll():
+                try:
+                    result = receiver.recv()
+                except EOFError:
+                    pass
+            if result is None and not process.is_alive():
+                # Killed before it could send anything (out of memory, say)
+                result = {"file": path, "status": "crashed", "seconds": time.perf_counter() - started,
+                          "message": "Exit code {}.".format(process.exitcode)}
+            if result is None and timeout is not None and time.perf_counter() - started > timeout:
+                process.terminate()
+                result = {"file": path, "status": "timeout", "seconds": time.perf_counter() - started}
+            if result is None:
+                continue
 
-    with open("../TestOut/{}.txt".format(filename), "w") as f:
-        testProcess = subprocess.Popen(["python", "main.py", "-t", "-v", "-i", path, "-o", "../TestOut/{}Out.blif".format(filename)],
-                                stdout=f)#subprocess.PIPE
-        testProcess.wait()
-        output, error = testProcess.communicate()
+            process.join()
+            receiver.close()
+            del running[process]
+            results.append(result)
+            if verbose:
+                print("{}: {} in {:.2f}s{}".format(path, result["status"], result["seconds"],
+                                                   " ({})".format(result["message"]) if "message" in result else ""))
+    return results
 
-    with open("../TestOut/{}.txt".format(filename), "r") as f:
-        for line in f:
-            if "The logic-optimized BLIF is identical to the original when expanded!" in line:
-                return True
+# Runs runBLIFTests in a scratch directory. Returns whether it passed and
+#  how long it took.
+def runSelfTest(outputDirectory):
+    directory = tempfile.mkdtemp(prefix="blif-tests-")
+    started = time.perf_counter()
+    stdout = sys.stdout
+    try:
+        with open(os.path.join(outputDirectory, "selfTest.txt"), "w") as log:
+            sys.stdout = log
+            passed = runBLIFTests(directory)
+    finally:
+        sys.stdout = stdout
+        shutil.rmtree(directory, ignore_errors=True)
+    return {"status": SUCCESS if passed else "fail", "seconds": time.perf_counter() - started}
 
-    return False
+def findTestFiles(directory):
+    paths = []
+    for testFile in sorted(os.listdir(directory)):
+        if testFile.endswith(".v") or testFile.startswith("."):
+            continue
+        path = os.path.join(directory, testFile)
+        if os.path.isfile(path):
+            paths.append(path)
+    return paths
 
-print("Running all tests.")
-print("All test results go into the \"TestOut\" folder.")
-print("Each optimized BLIF file has the suffix \"Out.blif\"")
-print("Console output from each test is \"<TestBlifName>.txt\"")
-print("")
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Optimize and verify every BLIF in a directory.")
+    parser.add_argument("directory", help="Directory of BLIFs to test.", nargs="?", default="../TestFiles")
+    parser.add_argument("-o", dest="outputDirectory", help="Where the optimized BLIFs, logs and results go.", default="../TestOut")
+    parser.add_argument("-j", dest="jobs", help="Number of files to run at once.", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", dest="timeout", help="Seconds a file may take before it is killed.", type=float, default=None)
+    parser.add_argument("--mem-limit", dest="memLimit", help="Megabytes of memory each file may use.", type=float, default=None)
+    parser.add_argument("--results", dest="resultsFile", help="Where to write the results (JSON). Defaults to results.json in the output directory.", default=None)
+    parser.add_argument("--no-self-test", dest="selfTest", help="Skip the BLIF import/export round-trip test.", action='store_const', default=True, const=False)
+    parser.add_argument("--engine", dest="engine", choices=["qm", "espresso", "cofactor"], default="qm")
+    parser.add_argument("--verify-engine", dest="verifyEngine", choices=["sim", "bdd", "sat"], default="sim")
+    parser.add_argument("--cover-time", dest="coverTimeLimit", type=float, default=10.0)
+    args = parser.parse_args()
 
-testFiles = os.listdir("../TestFiles")
-testFiles.sort()
+    if not os.path.isdir(args.outputDirectory):
+        os.makedirs(args.outputDirectory)
+    resultsFile = args.resultsFile
+    if resultsFile is None:
+        resultsFile = os.path.join(args.outputDirectory, "results.json")
 
-for testFile in testFiles:
-    if testFile.endswith(".v") or testFile.startswith("."):
-        continue
+    started = time.perf_counter()
+    results = {}
+    if args.selfTest:
+        results["selfTest"] = runSelfTest(args.outputDirectory)
+        print("BLIF import/export test: {} in {:.2f}s".format(results["selfTest"]["status"],
+                                                             results["selfTest"]["seconds"]))
 
-    testFilePath = "../TestFiles/" + testFile
+    options = {"verifyEngine": args.verifyEngine, "engine": args.engine, "coverTimeLimit": args.coverTimeLimit}
+    files = runFiles(findTestFiles(args.directory), args.outputDirectory, jobs=args.jobs, timeout=args.timeout,
+                     memLimit=None if args.memLimit is None else int(args.memLimit * 1024 * 1024), options=options)
+    results["files"] = sorted(files, key=lambda result: result["file"])
 
-    print("Optimizing BLIF file: {}".format(testFilePath))
-    passed = runTestWithBlifAtPath(testFilePath)
+    counts = {}
+    for result in files:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    results["counts"] = counts
+    results["seconds"] = time.perf_counter() - started
 
-    if passed:
-        print("Success.")
-    else:
-        print("Failed...")
+    with open(resultsFile, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
 
+    print("")
+    print("{} files: {}".format(len(files), ", ".join("{} {}".format(counts[status], status) for status in sorted(counts))))
+    print("Results written to {}.".format(resultsFile))
 
-print("")
-print("Done.")
\ No newline at end of file
+    failed = any(result["status"] != SUCCESS for result in files)
+    if "selfTest" in results and results["selfTest"]["status"] != SUCCESS:
+        failed = True
+    sys.exit(1 if failed else 0)